@@ -1,3 +1,20 @@
 from django.contrib import admin
+from .models import AnalysisReport, RiskPrediction, RiskModel
 
-# Register your models here.
+@admin.register(AnalysisReport)
+class AnalysisReportAdmin(admin.ModelAdmin):
+    list_display = ['title', 'report_type', 'format', 'generated_by', 'file_size', 'generated_at']
+    list_filter = ['report_type', 'format', 'generated_at']
+    search_fields = ['title']
+
+@admin.register(RiskPrediction)
+class RiskPredictionAdmin(admin.ModelAdmin):
+    list_display = ['region', 'prediction_date', 'risk_score', 'confidence']
+    list_filter = ['prediction_date', 'region']
+
+@admin.register(RiskModel)
+class RiskModelAdmin(admin.ModelAdmin):
+    list_display = ['version', 'is_active', 'horizon_days', 'alpha', 'training_samples', 'trained_at']
+    list_filter = ['is_active']
+    readonly_fields = ['version', 'artifact', 'features', 'horizon_days', 'alpha', 'training_samples',
+                       'training_start', 'training_end', 'metrics', 'is_active', 'trained_at']
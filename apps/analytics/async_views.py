@@ -0,0 +1,45 @@
+"""
+ASGI-native variants of the read-heavy analytics endpoints. See
+apps.monitoring.async_views for the shared helpers.
+"""
+from django.http import JsonResponse
+
+from apps.monitoring.async_views import async_api_view, gather_queries, paginated_response
+from apps.monitoring.models import Region, EnvironmentalData, EnvironmentalAggregate
+from apps.monitoring.retention import combined_statistics
+from .models import AnalysisReport, RiskPrediction
+from .serializers import AnalysisReportSerializer, RiskPredictionSerializer
+from .views import HIGH_RISK
+
+
+@async_api_view()
+async def dashboard_stats(request):
+    # The aggregates are independent, so they run concurrently.
+    total_regions, latest_date, combined, high_risk_regions = await gather_queries(
+        Region.objects.count,
+        lambda: EnvironmentalData.objects.order_by('-timestamp').values_list('date', flat=True).first(),
+        lambda: combined_statistics(EnvironmentalData.objects.all(), EnvironmentalAggregate.objects.all()),
+        lambda: Region.objects.filter(HIGH_RISK).distinct().count(),
+    )
+    return JsonResponse({
+        'total_regions': total_regions,
+        'total_data_points': combined['data_points'],
+        'average_risk': combined['avg_degradation'] or 0,
+        'latest_data_date': latest_date,
+        'high_risk_regions': high_risk_regions,
+    })
+
+
+@async_api_view()
+async def report_list(request):
+    queryset = AnalysisReport.objects.select_related('region', 'generated_by')
+    if not request.user.is_admin():
+        queryset = queryset.filter(generated_by=request.user)
+    return await paginated_response(request, queryset, AnalysisReportSerializer)
+
+
+@async_api_view()
+async def prediction_list(request):
+    return await paginated_response(
+        request, RiskPrediction.objects.select_related('region'), RiskPredictionSerializer
+    )
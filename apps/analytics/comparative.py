@@ -0,0 +1,182 @@
+"""
+Comparative analysis: every region against every other over a window.
+
+One grouped query produces per-region sums and counts for each metric. Those
+become a (regions x metrics) matrix of means, and NumPy derives everything
+else from it:
+
+* ranks and percentiles per metric;
+* z-scores per metric;
+* the correlation between metrics across regions;
+* the regions whose z-score profile is most similar to each region.
+
+Results are cached per (window, metrics, regions). The key includes the data
+versions of those regions, so new readings for any of them invalidate it.
+"""
+import hashlib
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from apps.monitoring.data_versions import versions_token
+from apps.monitoring.models import Region, EnvironmentalData, EnvironmentalAggregate
+
+COMPARATIVE_METRICS = ('land_degradation_index', 'vegetation_index', 'soil_moisture', 'rainfall')
+SIMILAR_REGIONS = 5
+CACHE_PREFIX = 'comparative:'
+
+
+def region_metric_matrix(start_date, end_date, metrics, region_ids):
+    """Return (means, counts) arrays of shape (regions, metrics); NaN where no data."""
+    row_of = {region_id: i for i, region_id in enumerate(region_ids)}
+    sums = np.zeros((len(region_ids), len(metrics)))
+    counts = np.zeros_like(sums)
+
+    rows = (
+        EnvironmentalData.objects
+        .filter(region_id__in=region_ids, date__gte=start_date, date__lte=end_date)
+        .values('region_id')
+        .annotate(**{f'{metric}__sum': Sum(metric) for metric in metrics},
+                  **{f'{metric}__count': Count(metric) for metric in metrics})
+        .order_by()
+    )
+    for row in rows:
+        i = row_of[row['region_id']]
+        for j, metric in enumerate(metrics):
+            if row[f'{metric}__count']:
+                sums[i, j] += row[f'{metric}__sum']
+                counts[i, j] += row[f'{metric}__count']
+
+    # Compacted periods only survive as retention aggregates.
+    tz = timezone.get_current_timezone()
+    window_start = timezone.make_aware(datetime.combine(start_date, dt_time.min), tz)
+    window_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), dt_time.min), tz)
+    aggregates = EnvironmentalAggregate.objects.filter(
+        region_id__in=region_ids, period_start__gte=window_start, period_start__lt=window_end,
+    ).values_list('region_id', 'stats')
+    for region_id, stats in aggregates.iterator(chunk_size=5000):
+        i = row_of[region_id]
+        for j, metric in enumerate(metrics):
+            entry = stats.get(metric)
+            if entry and entry.get('count'):
+                sums[i, j] += entry['sum']
+                counts[i, j] += entry['count']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return means, counts
+
+
+def _column_stats(means):
+    """Rank (1 = highest), percentile and z-score per column, ignoring NaN."""
+    valid = ~np.isnan(means)
+    n = valid.sum(axis=0)
+    # NaN sorts last, so valid values get descending ranks 1..n
+    order = np.argsort(np.where(valid, -means, np.inf), axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, means.shape[0] + 1)[:, None], axis=0)
+
+    filled = np.where(valid, means, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentiles = np.where(n > 1, (n - ranks) / (n - 1) * 100, 100.0)
+        mean = filled.sum(axis=0) / n
+        std = np.sqrt(np.where(valid, (means - mean) ** 2, 0.0).sum(axis=0) / n)
+        z = np.where(std > 0, (means - mean) / std, 0.0)
+    return np.where(valid, ranks, 0), np.where(valid, percentiles, np.nan), np.where(valid, z, np.nan)
+
+
+def _correlation(matrix):
+    """Pearson correlation between the columns of ``matrix`` over rows without NaN."""
+    complete = matrix[~np.isnan(matrix).any(axis=1)]
+    if complete.shape[0] < 2:
+        return np.full((matrix.shape[1], matrix.shape[1]), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.corrcoef(complete, rowvar=False)
+
+
+def _similar_regions(z, region_ids, limit=SIMILAR_REGIONS):
+    """For each region, the regions with the most correlated z-score profile."""
+    profiles = np.nan_to_num(z)
+    centered = profiles - profiles.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        similarity = (centered @ centered.T) / np.outer(norms, norms)
+    similarity[~np.isfinite(similarity)] = np.nan
+    np.fill_diagonal(similarity, np.nan)
+
+    limit = min(limit, max(len(region_ids) - 1, 0))
+    if not limit:
+        return [[] for _ in region_ids]
+    best = np.argsort(np.nan_to_num(-similarity, nan=np.inf), axis=1)[:, :limit]
+    return [
+        [{'region_id': region_ids[j], 'correlation': float(similarity[i, j])}
+         for j in best[i] if not np.isnan(similarity[i, j])]
+        for i in range(len(region_ids))
+    ]
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def compute_comparison(start_date, end_date, metrics=COMPARATIVE_METRICS, region_ids=None):
+    regions = Region.objects.order_by('id')
+    if region_ids is not None:
+        regions = regions.filter(id__in=region_ids)
+    regions = list(regions.values_list('id', 'name'))
+    region_ids = [region_id for region_id, _ in regions]
+
+    means, counts = region_metric_matrix(start_date, end_date, metrics, region_ids)
+    ranks, percentiles, z = _column_stats(means)
+    metric_corr = _correlation(means)
+    similar = _similar_regions(z, region_ids)
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'metrics': list(metrics),
+        'metric_correlation': {
+            metric: {other: _nullable(metric_corr[i, j]) for j, other in enumerate(metrics)}
+            for i, metric in enumerate(metrics)
+        },
+        'regions': [
+            {
+                'region_id': region_id,
+                'region_name': name,
+                'metrics': {
+                    metric: {
+                        'mean': _nullable(means[i, j]),
+                        'samples': int(counts[i, j]),
+                        'rank': int(ranks[i, j]) or None,
+                        'percentile': _nullable(percentiles[i, j]),
+                        'z_score': _nullable(z[i, j]),
+                    }
+                    for j, metric in enumerate(metrics)
+                },
+                'similar_regions': similar[i],
+            }
+            for i, (region_id, name) in enumerate(regions)
+        ],
+    }
+
+
+def comparison_cache_key(start_date, end_date, metrics, region_ids):
+    window = f'{start_date.isoformat()}:{end_date.isoformat()}:{",".join(sorted(metrics))}'
+    regions = ','.join(str(region_id) for region_id in sorted(region_ids))
+    digest = hashlib.blake2b(f'{window}|{regions}'.encode(), digest_size=10).hexdigest()
+    return f'{CACHE_PREFIX}{digest}:{versions_token(region_ids)}'
+
+
+def cached_comparison(start_date, end_date, metrics=COMPARATIVE_METRICS, region_ids=None):
+    if region_ids is None:
+        region_ids = list(Region.objects.values_list('id', flat=True))
+    key = comparison_cache_key(start_date, end_date, metrics, region_ids)
+    result = cache.get(key)
+    if result is None:
+        result = compute_comparison(start_date, end_date, metrics, region_ids)
+        cache.set(key, result, getattr(settings, 'COMPARATIVE_CACHE_TIMEOUT', 60 * 60))
+    return result
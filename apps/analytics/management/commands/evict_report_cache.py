@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.analytics.reports import evict_report_cache
+
+class Command(BaseCommand):
+    help = 'Delete cached report files beyond the REPORT_CACHE_MAX_BYTES budget, least recently used first'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, help='Override REPORT_CACHE_MAX_BYTES')
+    
+    def handle(self, *args, **options):
+        evicted, remaining = evict_report_cache(options['max_bytes'])
+        self.stdout.write(self.style.SUCCESS(f'Evicted {evicted} report files, {remaining} bytes still cached'))
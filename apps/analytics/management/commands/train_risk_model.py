@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.risk_model import train_risk_model
+
+class Command(BaseCommand):
+    help = 'Train a new risk model version from historical readings and, by default, activate it'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1825, help='Days of history to train on')
+        parser.add_argument('--horizon', type=int, default=30, help='Days ahead the risk score looks')
+        parser.add_argument('--alpha', type=float, default=1.0, help='Ridge regularization strength')
+        parser.add_argument('--no-activate', action='store_true', help='Register the version without activating it')
+    
+    def handle(self, *args, **options):
+        try:
+            model = train_risk_model(
+                days=options['days'],
+                horizon=options['horizon'],
+                alpha=options['alpha'],
+                activate=not options['no_activate'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained risk model v{model.version} on {model.training_samples} samples: {model.metrics}'
+        ))
@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from apps.monitoring.models import Region
 from apps.users.models import User
 
@@ -27,6 +28,10 @@ class AnalysisReport(models.Model):
     file = models.FileField(upload_to='reports/', blank=True, null=True)
     generated_at = models.DateTimeField(auto_now_add=True)
     is_public = models.BooleanField(default=False)
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True,
+                                 help_text="Digest of the request and data versions the file was built from")
+    file_size = models.BigIntegerField(default=0)
+    last_accessed = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-generated_at']
@@ -47,4 +52,37 @@ class RiskPrediction(models.Model):
         unique_together = ['region', 'prediction_date']
     
     def __str__(self):
-        return f"Risk Prediction - {self.region} ({self.prediction_date})"
\ No newline at end of file
+        return f"Risk Prediction - {self.region} ({self.prediction_date})"
+
+class RiskModel(models.Model):
+    """
+    A trained risk model version. ``artifact`` is the .npy parameter matrix
+    described in apps.analytics.risk_model; only one version is active.
+    """
+    ACTIVE_VERSION_KEY = 'risk-model:active-version'
+    
+    version = models.PositiveIntegerField(unique=True)
+    artifact = models.FileField(upload_to='risk_models/')
+    features = models.JSONField(default=list)
+    horizon_days = models.PositiveIntegerField(default=30)
+    alpha = models.FloatField(default=1.0, help_text="Ridge regularization strength")
+    training_samples = models.IntegerField(default=0)
+    training_start = models.DateField()
+    training_end = models.DateField()
+    metrics = models.JSONField(default=dict, blank=True)
+    is_active = models.BooleanField(default=False)
+    trained_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-version']
+    
+    def __str__(self):
+        return f"Risk model v{self.version}{' (active)' if self.is_active else ''}"
+    
+    def activate(self):
+        with transaction.atomic():
+            RiskModel.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False)
+            RiskModel.objects.filter(pk=self.pk).update(is_active=True)
+        self.is_active = True
+        # Workers pick the new version up on their next version check.
+        transaction.on_commit(lambda: cache.set(self.ACTIVE_VERSION_KEY, self.version, None))
\ No newline at end of file
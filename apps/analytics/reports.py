@@ -0,0 +1,222 @@
+"""
+Report builders. Each builder turns an AnalysisReport into a payload dict
+with the full result and a flat list of ``rows`` for CSV output.
+``build_report`` renders that payload into the report's file.
+
+``generate_report`` adds a content-addressed cache in front of that. The
+request is reduced to a canonical digest that includes the data versions of
+the regions it covers. A report whose digest matches a file that is already
+stored reuses that file, and identical requests arriving while the file is
+being built share that build through myproject.singleflight. Stored files are
+evicted least recently used first once they exceed REPORT_CACHE_MAX_BYTES.
+"""
+import csv
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.monitoring.data_versions import versions_token
+from apps.monitoring.models import Region
+from myproject.singleflight import singleflight
+from .models import AnalysisReport
+from .comparative import COMPARATIVE_METRICS, cached_comparison
+from .trends import TREND_METRICS, run_trend_analysis
+
+
+def report_region_ids(report):
+    return report.parameters.get('region_ids') or [report.region_id]
+
+
+def report_metrics(report, default):
+    requested = report.parameters.get('metrics')
+    if not requested:
+        return default
+    return tuple(metric for metric in requested if metric in default) or default
+
+
+def region_metric_rows(result):
+    """Flatten ``result['regions'][*]['metrics']`` into one CSV row per (region, metric)."""
+    return [
+        {'region_id': region['region_id'], 'region_name': region['region_name'], 'metric': metric, **stats}
+        for region in result['regions']
+        for metric, stats in region['metrics'].items()
+    ]
+
+
+def build_trend_analysis(report):
+    result = run_trend_analysis(
+        report.start_date, report.end_date,
+        metrics=report_metrics(report, TREND_METRICS),
+        region_ids=report_region_ids(report),
+    )
+    return {'result': result, 'rows': region_metric_rows(result)}
+
+
+def build_comparative(report):
+    # Without explicit region_ids a comparative report covers every region.
+    result = cached_comparison(
+        report.start_date, report.end_date,
+        metrics=report_metrics(report, COMPARATIVE_METRICS),
+        region_ids=report.parameters.get('region_ids') or None,
+    )
+    return {'result': result, 'rows': region_metric_rows(result)}
+
+
+REPORT_BUILDERS = {
+    'trend_analysis': build_trend_analysis,
+    'comparative': build_comparative,
+}
+
+
+def render_report(payload, format):
+    if format == 'csv':
+        rows = payload['rows']
+        buffer = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8'), 'csv'
+    if format == 'json':
+        return json.dumps(payload['result'], cls=DjangoJSONEncoder).encode('utf-8'), 'json'
+    # There is no PDF renderer yet; ReportRequestSerializer rejects PDF for
+    # report types that have a builder.
+    raise ValueError(f'unsupported report format "{format}"')
+
+
+def build_report(report):
+    """Run the builder for ``report.report_type`` and store its output on ``report.file``."""
+    builder = REPORT_BUILDERS.get(report.report_type)
+    if builder is None:
+        return None
+    payload = builder(report)
+    content, extension = render_report(payload, report.format)
+    name = f'{report.cache_key or slugify(report.title) + "-" + str(report.pk)}.{extension}'
+    report.file_size = len(content)
+    report.last_accessed = timezone.now()
+    report.file.save(name, ContentFile(content), save=True)
+    return payload['result']
+
+
+def covered_region_ids(report):
+    if report.report_type == 'comparative' and not report.parameters.get('region_ids'):
+        return list(Region.objects.values_list('id', flat=True))
+    return report_region_ids(report)
+
+
+def report_cache_key(report):
+    parameters = dict(report.parameters)
+    for name in ('region_ids', 'metrics'):
+        if isinstance(parameters.get(name), list):
+            parameters[name] = sorted(set(parameters[name]), key=str)
+    canonical = json.dumps({
+        'report_type': report.report_type,
+        'region': report.region_id,
+        'start_date': report.start_date,
+        'end_date': report.end_date,
+        'format': report.format,
+        'parameters': parameters,
+    }, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    versions = versions_token(covered_region_ids(report))
+    return hashlib.sha256(f'{canonical}|{versions}'.encode()).hexdigest()
+
+
+def cached_report_file(cache_key):
+    """The newest report holding a stored file for ``cache_key``, if any."""
+    source = (
+        AnalysisReport.objects
+        .filter(cache_key=cache_key, file__isnull=False)
+        .exclude(file='')
+        .order_by('-generated_at')
+        .first()
+    )
+    if source is None or not source.file.storage.exists(source.file.name):
+        return None
+    return source
+
+
+def _reuse_file(report, source):
+    now = timezone.now()
+    report.file.name = source.file.name
+    report.file_size = source.file_size
+    report.last_accessed = now
+    report.save()
+    AnalysisReport.objects.filter(cache_key=report.cache_key).update(last_accessed=now)
+    return report
+
+
+def _build_shared(report):
+    # Another worker may have finished the same report while we queued.
+    source = cached_report_file(report.cache_key)
+    if source is not None:
+        return source.pk
+    report.save()
+    build_report(report)
+    evict_report_cache()
+    return report.pk
+
+
+def generate_report(report):
+    """Save an unsaved ``report`` and give it a file, reusing a cached one when possible."""
+    if report.report_type not in REPORT_BUILDERS:
+        report.save()
+        return report
+
+    report.cache_key = report_cache_key(report)
+    source = cached_report_file(report.cache_key)
+    if source is not None:
+        return _reuse_file(report, source)
+
+    # Identical requests in flight share one build, across workers too.
+    source_pk = singleflight(
+        f'report:{report.cache_key}', lambda: _build_shared(report),
+        timeout=getattr(settings, 'REPORT_BUILD_TIMEOUT', 300), across_processes=True,
+    )
+    if report.pk == source_pk:
+        return report
+    source = AnalysisReport.objects.filter(pk=source_pk).first()
+    if source is None or not source.file:
+        # The shared build vanished (deleted or evicted); build our own.
+        report.save()
+        build_report(report)
+        return report
+    return _reuse_file(report, source)
+
+
+def evict_report_cache(max_bytes=None):
+    """
+    Delete stored report files, least recently used first, until they fit in
+    ``max_bytes``. Reports that pointed at an evicted file keep their row but
+    lose the file. Returns (files evicted, bytes still stored).
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'REPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+    files = (
+        AnalysisReport.objects
+        .filter(file__isnull=False)
+        .exclude(file='')
+        .exclude(cache_key='')
+        .values('file')
+        .annotate(size=Max('file_size'), accessed=Max(Coalesce('last_accessed', 'generated_at')))
+        .order_by('accessed')
+    )
+    files = list(files)
+    total = sum(entry['size'] for entry in files)
+    storage = AnalysisReport._meta.get_field('file').storage
+    evicted = 0
+    for entry in files:
+        if total <= max_bytes:
+            break
+        storage.delete(entry['file'])
+        AnalysisReport.objects.filter(file=entry['file']).update(file=None, cache_key='', file_size=0)
+        total -= entry['size']
+        evicted += 1
+    return evicted, total
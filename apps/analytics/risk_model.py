@@ -0,0 +1,287 @@
+"""
+Trained risk model: training, artifact storage and batch inference.
+
+The model is a ridge regression on standardized environmental features. It
+predicts the mean ``land_degradation_index`` observed over the following
+``horizon`` days. Training reads daily region means as dense
+(regions x days) arrays (see trends.daily_matrix) and solves the normal
+equations in closed form.
+
+The artifact is a single float64 ``.npy`` matrix with k features and
+k + 6 rows of k + 1 columns:
+
+* row 0: feature means (column 0 unused);
+* row 1: feature scales (column 0 unused);
+* row 2: weights, intercept first;
+* row 3: residual sigma, ridge alpha, sample count, horizon;
+* row 4: training imputation values for absent features (column 0 unused);
+* rows 5..: ``(X'X + alpha I)^-1``, for the predictive variance.
+
+Artifacts written before row 4 existed (k + 5 rows) impute with the feature
+means, which is what training substituted for missing sensor values anyway.
+
+Workers memory-map it, so processes on a host share the same pages. They
+reload it only when the active version changes, which they check at most
+every RISK_MODEL_CHECK_INTERVAL seconds. Confidence is the probability,
+under the predictive normal distribution, that the realized risk lies
+within RISK_CONFIDENCE_TOLERANCE of the prediction.
+"""
+import io
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import RiskModel, RiskPrediction
+from .trends import daily_matrix
+
+FEATURES = ('vegetation_index', 'soil_moisture', 'rainfall', 'temperature', 'wind_speed')
+TARGET = 'land_degradation_index'
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def forward_mean(values, horizon):
+    """Mean of the next ``horizon`` days (excluding the current one) per cell, NaN-aware."""
+    valid = ~np.isnan(values)
+    sums = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(np.where(valid, values, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(valid, axis=1)], axis=1)
+    days = values.shape[1]
+    start = np.arange(days) + 1
+    end = np.minimum(start + horizon, days)
+    window_sum = sums[:, end] - sums[:, start]
+    window_count = counts[:, end] - counts[:, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_count > 0, window_sum / window_count, np.nan)
+
+
+def training_set(start_date, end_date, horizon):
+    """Feature matrix, targets and the sample (region, day) index."""
+    region_ids, days, matrices = daily_matrix(start_date, end_date, FEATURES + (TARGET,))
+    target = forward_mean(matrices[TARGET], horizon)
+    features = np.stack([matrices[name] for name in FEATURES], axis=2)
+
+    # Rainfall, NDVI and soil moisture are always reported; the optional
+    # sensors are imputed with their mean.
+    required = ~np.isnan(features[..., :3]).any(axis=2)
+    usable = required & ~np.isnan(target)
+    X = features[usable]
+    present = (~np.isnan(X)).sum(axis=0)
+    column_means = np.where(present > 0, np.nansum(X, axis=0) / np.maximum(present, 1), 0.0)
+    X = np.where(np.isnan(X), column_means, X)
+    cols = np.nonzero(usable)[1]
+    return X, target[usable], cols, column_means, (region_ids, days, matrices)
+
+
+def fit_ridge(X, y, alpha):
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    design = np.column_stack([np.ones(len(X)), (X - mean) / scale])
+    penalty = alpha * np.eye(design.shape[1])
+    penalty[0, 0] = 0.0  # the intercept is not shrunk
+    inverse = np.linalg.inv(design.T @ design + penalty)
+    weights = inverse @ design.T @ y
+    residuals = y - design @ weights
+    sigma = math.sqrt(float(residuals @ residuals) / max(len(y) - design.shape[1], 1))
+    return mean, scale, weights, sigma, inverse
+
+
+def pack_artifact(mean, scale, weights, sigma, alpha, samples, horizon, inverse, impute):
+    k = len(mean)
+    artifact = np.zeros((k + 6, k + 1))
+    artifact[0, 1:] = mean
+    artifact[1, 1:] = scale
+    artifact[2] = weights
+    artifact[3, :4] = (sigma, alpha, samples, horizon)
+    artifact[4, 1:] = impute
+    artifact[5:] = inverse
+    return artifact
+
+
+class LoadedRiskModel:
+    def __init__(self, version, features, artifact):
+        self.version = version
+        self.features = tuple(features)
+        self.mean = artifact[0, 1:]
+        self.scale = artifact[1, 1:]
+        self.weights = artifact[2]
+        self.sigma = float(artifact[3, 0])
+        self.horizon = int(artifact[3, 3])
+        if artifact.shape[0] == len(self.features) + 6:
+            self.impute = artifact[4, 1:]
+            self.inverse = artifact[5:]
+        else:
+            self.impute = self.mean
+            self.inverse = artifact[4:]
+
+    def predict(self, X):
+        """
+        Vectorized inference over an (n, features) array. Returns
+        (risk_scores, confidences, contributions); contributions are the
+        per-feature terms of the linear predictor. NaN marks an absent
+        feature, which gets the value training imputed for it.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        X = np.where(np.isnan(X), self.impute, X)
+        z = (X - self.mean) / self.scale
+        design = np.column_stack([np.ones(len(X)), z])
+        raw = design @ self.weights
+        variance = self.sigma ** 2 * (1 + np.einsum('ij,jk,ik->i', design, self.inverse, design))
+        std = np.sqrt(np.maximum(variance, 1e-12))
+        tolerance = getattr(settings, 'RISK_CONFIDENCE_TOLERANCE', 0.1)
+        confidence = _erf(tolerance / (std * math.sqrt(2))).astype(float)
+        return np.clip(raw, 0.0, 1.0), confidence, z * self.weights[1:]
+
+
+class RiskModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        self._checked_at = 0.0
+
+    def _active_version(self):
+        version = cache.get(RiskModel.ACTIVE_VERSION_KEY)
+        if version is None:
+            version = RiskModel.objects.filter(is_active=True).values_list('version', flat=True).first() or 0
+            cache.set(RiskModel.ACTIVE_VERSION_KEY, version, None)
+        return version
+
+    def get(self):
+        """The active model, memory-mapped, or None when no model has been trained."""
+        interval = getattr(settings, 'RISK_MODEL_CHECK_INTERVAL', 10)
+        if time.monotonic() - self._checked_at < interval:
+            return self._model
+        with self._lock:
+            if time.monotonic() - self._checked_at < interval:
+                return self._model
+            version = self._active_version()
+            if not version:
+                self._model = None
+            elif self._model is None or self._model.version != version:
+                record = RiskModel.objects.filter(version=version).first()
+                self._model = None if record is None else LoadedRiskModel(
+                    record.version, record.features, np.load(record.artifact.path, mmap_mode='r'),
+                )
+            self._checked_at = time.monotonic()
+            return self._model
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+
+registry = RiskModelRegistry()
+
+
+def _backtest(model_predict, region_ids, days, matrices, horizon):
+    """Mean absolute error of stored RiskPredictions and of the new model against realized outcomes."""
+    row_of = {region_id: i for i, region_id in enumerate(region_ids)}
+    col_of = {day: j for j, day in enumerate(days)}
+    realized = forward_mean(matrices[TARGET], horizon)
+    stored, actual, features = [], [], []
+    for region_id, day, score in RiskPrediction.objects.filter(
+        region_id__in=region_ids, prediction_date__gte=days[0], prediction_date__lte=days[-1],
+    ).values_list('region_id', 'prediction_date', 'risk_score'):
+        i, j = row_of[region_id], col_of[day]
+        if np.isnan(realized[i, j]):
+            continue
+        stored.append(score)
+        actual.append(realized[i, j])
+        features.append([matrices[name][i, j] for name in FEATURES])
+    if not stored:
+        return {}
+    predicted = model_predict(np.array(features))
+    actual = np.array(actual)
+    return {
+        'backtest_samples': len(stored),
+        'stored_predictions_mae': float(np.abs(np.array(stored) - actual).mean()),
+        'model_mae': float(np.abs(predicted - actual).mean()),
+    }
+
+
+def train_risk_model(days=1825, horizon=30, alpha=1.0, activate=True, today=None):
+    """Fit, evaluate and register a new model version; returns the RiskModel."""
+    end_date = today or timezone.now().date()
+    start_date = end_date - timedelta(days=days)
+    X, y, cols, column_means, grid = training_set(start_date, end_date, horizon)
+    if len(y) < len(FEATURES) + 2:
+        raise ValueError(f'Only {len(y)} training samples in the window; need at least {len(FEATURES) + 2}')
+
+    # Validate on the most recent fifth of the days before fitting on everything.
+    split = np.quantile(cols, 0.8)
+    train, holdout = cols <= split, cols > split
+    metrics = {}
+    if train.sum() > len(FEATURES) + 1 and holdout.any():
+        fitted = fit_ridge(X[train], y[train], alpha)
+        check = LoadedRiskModel(0, FEATURES, pack_artifact(
+            *fitted[:4], alpha, train.sum(), horizon, fitted[4], column_means,
+        ))
+        predicted = check.predict(X[holdout])[0]
+        metrics['holdout_rmse'] = float(np.sqrt(((predicted - y[holdout]) ** 2).mean()))
+        metrics['holdout_mae'] = float(np.abs(predicted - y[holdout]).mean())
+
+    mean, scale, weights, sigma, inverse = fit_ridge(X, y, alpha)
+    artifact = pack_artifact(mean, scale, weights, sigma, alpha, len(y), horizon, inverse, column_means)
+    model = LoadedRiskModel(0, FEATURES, artifact)
+    metrics['train_rmse'] = float(np.sqrt(((model.predict(X)[0] - y) ** 2).mean()))
+    metrics['sigma'] = sigma
+    metrics.update(_backtest(lambda features: model.predict(features)[0], *grid, horizon))
+
+    buffer = io.BytesIO()
+    np.save(buffer, artifact, allow_pickle=False)
+    with transaction.atomic():
+        version = (RiskModel.objects.select_for_update().aggregate(v=Max('version'))['v'] or 0) + 1
+        record = RiskModel(
+            version=version,
+            features=list(FEATURES),
+            horizon_days=horizon,
+            alpha=alpha,
+            training_samples=len(y),
+            training_start=start_date,
+            training_end=end_date,
+            metrics=metrics,
+        )
+        record.artifact.save(f'risk-model-v{version}.npy', ContentFile(buffer.getvalue()), save=False)
+        record.save()
+        if activate:
+            record.activate()
+    return record
+
+
+def heuristic_prediction(data):
+    """The original hand-weighted score, used until a model has been trained."""
+    factors = {
+        'vegetation_impact': (1 - data['vegetation_index']) * 0.4,
+        'soil_moisture_impact': (1 - data['soil_moisture'] / 100) * 0.3,
+        'rainfall_impact': (1 - min(data['rainfall'] / 100, 1)) * 0.2,
+        'temperature_impact': (data.get('temperature', 25.0) / 50) * 0.1
+    }
+    risk_score = max(0, min(1, sum(factors.values())))
+    return risk_score, 0.85, factors
+
+
+def predict_batch(items):
+    """
+    Predict risk for a list of validated PredictionRequestSerializer payloads.
+    Returns a list of (risk_score, confidence, factors, model_version).
+    Optional sensor values that are left out are imputed by the model.
+    """
+    model = registry.get()
+    if model is None:
+        return [(*heuristic_prediction(item), None) for item in items]
+    X = np.array([[item.get(name, np.nan) for name in model.features] for item in items], dtype=float)
+    scores, confidences, contributions = model.predict(X)
+    return [
+        (float(scores[i]), float(confidences[i]),
+         {f'{name}_impact': float(contributions[i, j]) for j, name in enumerate(model.features)},
+         model.version)
+        for i in range(len(items))
+    ]
@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import AnalysisReport, RiskPrediction
+from .comparative import COMPARATIVE_METRICS
+from .reports import REPORT_BUILDERS
+from .trends import TREND_METRICS
 
 class AnalysisReportSerializer(serializers.ModelSerializer):
     region_name = serializers.CharField(source='region.name', read_only=True)
@@ -8,7 +12,7 @@ class AnalysisReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnalysisReport
         fields = '__all__'
-        read_only_fields = ['generated_by', 'generated_at', 'file']
+        read_only_fields = ['generated_by', 'generated_at', 'file', 'cache_key', 'file_size', 'last_accessed']
 
 class RiskPredictionSerializer(serializers.ModelSerializer):
     region_name = serializers.CharField(source='region.name', read_only=True)
@@ -22,13 +26,62 @@ class ReportRequestSerializer(serializers.Serializer):
     region_id = serializers.IntegerField()
     start_date = serializers.DateField()
     end_date = serializers.DateField()
-    format = serializers.ChoiceField(choices=AnalysisReport.FORMAT_CHOICES, default='pdf')
+    format = serializers.ChoiceField(choices=AnalysisReport.FORMAT_CHOICES, default='json')
     parameters = serializers.JSONField(required=False, default=dict)
+    
+    def validate(self, data):
+        # Built reports are rendered as CSV or JSON only; there is no PDF renderer yet
+        if data['format'] == 'pdf' and data['report_type'] in REPORT_BUILDERS:
+            raise serializers.ValidationError({'format': 'PDF is not available for this report type; use csv or json.'})
+        return data
 
 class PredictionRequestSerializer(serializers.Serializer):
     region_id = serializers.IntegerField()
     vegetation_index = serializers.FloatField(required=True)
     soil_moisture = serializers.FloatField(required=True)
     rainfall = serializers.FloatField(required=True)
-    temperature = serializers.FloatField(required=False, default=25.0)
-    wind_speed = serializers.FloatField(required=False, default=0.0)
\ No newline at end of file
+    # Optional sensors: a trained model imputes them with its training means
+    temperature = serializers.FloatField(required=False)
+    wind_speed = serializers.FloatField(required=False)
+
+class BatchPredictionRequestSerializer(serializers.Serializer):
+    predictions = PredictionRequestSerializer(many=True, allow_empty=False)
+    
+    def validate_predictions(self, value):
+        limit = getattr(settings, 'RISK_PREDICTION_BATCH_MAX', 1000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} predictions per request')
+        return value
+
+class TrendRequestSerializer(serializers.Serializer):
+    METRICS = TREND_METRICS
+    
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    regions = serializers.ListField(child=serializers.IntegerField(), required=False)
+    metrics = serializers.MultipleChoiceField(choices=TREND_METRICS, required=False)
+    
+    def to_internal_value(self, data):
+        if hasattr(data, 'getlist'):
+            # Accept both ?metrics=a&metrics=b and ?metrics=a,b
+            data = {
+                key: [item for value in data.getlist(key) for item in value.split(',') if item]
+                if key in ('regions', 'metrics') else data.get(key)
+                for key in data
+            }
+        return super().to_internal_value(data)
+    
+    def validate_metrics(self, value):
+        return tuple(metric for metric in self.METRICS if metric in value)
+    
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError('end_date must not be before start_date')
+        if not data.get('metrics'):
+            data['metrics'] = self.METRICS
+        return data
+
+class ComparativeRequestSerializer(TrendRequestSerializer):
+    METRICS = COMPARATIVE_METRICS
+    
+    metrics = serializers.MultipleChoiceField(choices=COMPARATIVE_METRICS, required=False)
\ No newline at end of file
@@ -1,3 +1,228 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .comparative import _column_stats, _similar_regions, comparison_cache_key, region_metric_matrix
+from .models import AnalysisReport, RiskModel
+from .reports import evict_report_cache, render_report, report_cache_key
+from .risk_model import FEATURES, LoadedRiskModel, RiskModelRegistry, fit_ridge, forward_mean, pack_artifact
+from .serializers import ReportRequestSerializer
+from .trends import downsample, mann_kendall, ols_slope, sen_slope
+
+NAN = np.nan
+
+
+class TrendStatisticsTests(SimpleTestCase):
+    def test_ols_slope_skips_missing_days(self):
+        slope = ols_slope(np.array([[1, 3, NAN, 7], [5, NAN, NAN, NAN]]))
+        self.assertAlmostEqual(slope[0], 2.0)
+        self.assertTrue(np.isnan(slope[1]))
+
+    def test_mann_kendall_on_monotonic_and_flat_series(self):
+        s, z, p = mann_kendall(np.array([np.arange(10.0), np.full(10, 2.0)]))
+        self.assertEqual(s.tolist(), [45.0, 0.0])
+        self.assertGreater(z[0], 0)
+        self.assertLess(p[0], 0.001)
+        self.assertEqual((z[1], p[1]), (0.0, 1.0))
+
+    def test_mann_kendall_ignores_gaps(self):
+        series = np.arange(10.0)[::-1].copy()
+        series[3] = NAN
+        s, z, p = mann_kendall(series[None, :])
+        self.assertEqual(s[0], -36.0)
+        self.assertLess(p[0], 0.05)
+
+    def test_sen_slope_resists_outliers(self):
+        series = np.array([[0, 1, 2, 3, 4, 5, 6, 7, 8, -50.0]])
+        self.assertAlmostEqual(sen_slope(series)[0], 1.0)
+        self.assertLess(ols_slope(series)[0], 0)
+
+    def test_downsample_block_averages(self):
+        means, block = downsample(np.arange(10.0)[None, :], max_points=4)
+        self.assertEqual(block, 3)
+        self.assertEqual(means.tolist(), [[1.0, 4.0, 7.0, 9.0]])
+
+
+class ComparativeTests(SimpleTestCase):
+    def test_matrix_merges_raw_and_compacted_samples(self):
+        raw = [{'region_id': 1, 'vegetation_index__sum': 3.0, 'vegetation_index__count': 6,
+                'rainfall__sum': None, 'rainfall__count': 0}]
+        compacted = [(1, {'vegetation_index': {'count': 2, 'sum': 1.0}}),
+                     (2, {'rainfall': {'count': 4, 'sum': 8.0}})]
+        with mock.patch('apps.analytics.comparative.EnvironmentalData') as data, \
+                mock.patch('apps.analytics.comparative.EnvironmentalAggregate') as aggregates:
+            data.objects.filter.return_value.values.return_value.annotate.return_value.order_by.return_value = raw
+            aggregates.objects.filter.return_value.values_list.return_value.iterator.return_value = compacted
+            means, counts = region_metric_matrix(
+                date(2024, 1, 1), date(2024, 1, 31), ('vegetation_index', 'rainfall'), [1, 2],
+            )
+
+        self.assertEqual(counts.tolist(), [[8, 0], [0, 4]])
+        self.assertAlmostEqual(means[0, 0], 0.5)
+        self.assertAlmostEqual(means[1, 1], 2.0)
+        self.assertTrue(np.isnan(means[0, 1]) and np.isnan(means[1, 0]))
+
+    def test_ranks_percentiles_and_z_scores_skip_missing_regions(self):
+        means = np.array([[0.2, 10], [0.8, NAN], [0.5, 30], [0.6, 20]])
+        ranks, percentiles, z = _column_stats(means)
+
+        self.assertEqual(ranks.tolist(), [[4, 3], [1, 0], [3, 1], [2, 2]])
+        self.assertEqual(percentiles[:, 1][[0, 2, 3]].tolist(), [0.0, 100.0, 50.0])
+        self.assertTrue(np.isnan(percentiles[1, 1]) and np.isnan(z[1, 1]))
+        self.assertAlmostEqual(np.nansum(z[:, 0]), 0.0)
+
+    def test_similar_regions_by_profile(self):
+        z = np.array([[1, 1, -1], [2, 2, -2], [-1, -1, 1]], dtype=float)
+        similar = _similar_regions(z, [10, 20, 30], limit=1)
+        self.assertEqual(similar[0], [{'region_id': 20, 'correlation': 1.0}])
+        self.assertEqual(similar[2][0]['correlation'], -1.0)
+
+    def test_cache_key_follows_region_data_versions(self):
+        args = (date(2024, 1, 1), date(2024, 1, 31), ('rainfall', 'soil_moisture'))
+        with mock.patch('apps.analytics.comparative.versions_token', return_value='v1'):
+            key = comparison_cache_key(*args, [2, 1])
+            self.assertEqual(key, comparison_cache_key(*args, [1, 2]))
+        with mock.patch('apps.analytics.comparative.versions_token', return_value='v2'):
+            self.assertNotEqual(key, comparison_cache_key(*args, [1, 2]))
+
+
+def trend_report(**overrides):
+    fields = dict(report_type='trend_analysis', region_id=1, start_date=date(2024, 1, 1),
+                  end_date=date(2024, 6, 30), format='csv',
+                  parameters={'region_ids': [3, 1, 2], 'metrics': ['rainfall', 'soil_moisture']})
+    fields.update(overrides)
+    return AnalysisReport(**fields)
+
+
+class ReportCacheTests(SimpleTestCase):
+    def setUp(self):
+        patch = mock.patch('apps.analytics.reports.versions_token', return_value='v1')
+        self.versions = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_cache_key_ignores_parameter_order(self):
+        reordered = trend_report(parameters={'metrics': ['soil_moisture', 'rainfall'], 'region_ids': [2, 3, 1, 1]})
+        self.assertEqual(report_cache_key(trend_report()), report_cache_key(reordered))
+
+    def test_cache_key_changes_with_format_and_data_versions(self):
+        key = report_cache_key(trend_report())
+        self.assertNotEqual(key, report_cache_key(trend_report(format='json')))
+        self.versions.return_value = 'v2'
+        self.assertNotEqual(key, report_cache_key(trend_report()))
+
+    def test_eviction_removes_least_recently_used_files_first(self):
+        files = [{'file': 'reports/a.csv', 'size': 400}, {'file': 'reports/b.csv', 'size': 300},
+                 {'file': 'reports/c.csv', 'size': 200}]
+        with mock.patch('apps.analytics.reports.AnalysisReport') as model:
+            stored = model.objects.filter.return_value.exclude.return_value.exclude.return_value
+            stored.values.return_value.annotate.return_value.order_by.return_value = files
+            evicted, total = evict_report_cache(max_bytes=600)
+
+        self.assertEqual((evicted, total), (1, 500))
+        model._meta.get_field.return_value.storage.delete.assert_called_once_with('reports/a.csv')
+        model.objects.filter.assert_any_call(file='reports/a.csv')
+        model.objects.filter.return_value.update.assert_called_once_with(file=None, cache_key='', file_size=0)
+
+    def test_pdf_is_rejected_for_built_reports(self):
+        serializer = ReportRequestSerializer(data={
+            'report_type': 'trend_analysis', 'region_id': 1, 'format': 'pdf',
+            'start_date': '2024-01-01', 'end_date': '2024-06-30',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('format', serializer.errors)
+        with self.assertRaises(ValueError):
+            render_report({'result': {}, 'rows': []}, 'pdf')
+
+
+def fitted_artifact(alpha=1e-9, impute=None):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, len(FEATURES))) * [0.2, 20, 30, 5, 2] + [0.5, 40, 50, 25, 3]
+    y = 0.1 + 0.5 * X[:, 0] - 0.002 * X[:, 1] + 0.001 * X[:, 3]
+    fitted = fit_ridge(X, y, alpha)
+    impute = fitted[0] if impute is None else impute
+    return X, y, pack_artifact(*fitted[:4], alpha, len(y), 30, fitted[4], impute)
+
+
+class RiskModelTests(SimpleTestCase):
+    def test_forward_mean_looks_ahead_and_skips_gaps(self):
+        means = forward_mean(np.array([[1, 2, 3, NAN, 5]], dtype=float), horizon=2)
+        self.assertEqual(means[0, :4].tolist(), [2.5, 3.0, 5.0, 5.0])
+        self.assertTrue(np.isnan(means[0, 4]))
+
+    def test_fit_ridge_recovers_a_linear_target(self):
+        X, y, artifact = fitted_artifact()
+        model = LoadedRiskModel(1, FEATURES, artifact)
+
+        scores, confidences, contributions = model.predict(X[:5])
+
+        np.testing.assert_allclose(scores, y[:5], atol=1e-6)
+        self.assertLess(model.sigma, 1e-6)
+        self.assertTrue(((confidences > 0.99) & (confidences <= 1)).all())
+        np.testing.assert_allclose(contributions.sum(axis=1) + model.weights[0], y[:5], atol=1e-6)
+
+    def test_ridge_penalty_shrinks_weights_but_not_the_intercept(self):
+        X, y, _ = fitted_artifact()
+        _, _, loose, _, _ = fit_ridge(X, y, 1e-9)
+        _, _, tight, _, _ = fit_ridge(X, y, 1e4)
+        self.assertLess(np.abs(tight[1:]).sum(), np.abs(loose[1:]).sum())
+        self.assertAlmostEqual(tight[0], y.mean())
+
+    def test_absent_features_use_training_imputation_values(self):
+        impute = np.array([0.5, 40, 50, 31.0, 7.0])
+        X, _, artifact = fitted_artifact(impute=impute)
+        model = LoadedRiskModel(1, FEATURES, artifact)
+        partial = X[:3].copy()
+        partial[:, 3:] = NAN
+        filled = X[:3].copy()
+        filled[:, 3:] = impute[3:]
+
+        np.testing.assert_allclose(model.predict(partial)[0], model.predict(filled)[0])
+
+    def test_artifact_round_trip_and_legacy_layout(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        X, _, artifact = fitted_artifact()
+        path = os.path.join(directory, 'model.npy')
+        np.save(path, artifact, allow_pickle=False)
+
+        loaded = LoadedRiskModel(1, FEATURES, np.load(path, mmap_mode='r'))
+        legacy = LoadedRiskModel(1, FEATURES, np.delete(artifact, 4, axis=0))
+
+        original = LoadedRiskModel(1, FEATURES, artifact)
+        np.testing.assert_allclose(loaded.predict(X[:5])[0], original.predict(X[:5])[0])
+        np.testing.assert_allclose(legacy.predict(X[:5])[1], original.predict(X[:5])[1])
+        np.testing.assert_allclose(legacy.impute, original.mean)
+
+    @override_settings(RISK_MODEL_CHECK_INTERVAL=60)
+    def test_registry_reloads_only_when_the_active_version_changes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        records = {}
+        for version in (1, 2):
+            path = os.path.join(directory, f'v{version}.npy')
+            np.save(path, fitted_artifact()[2], allow_pickle=False)
+            records[version] = SimpleNamespace(version=version, features=list(FEATURES),
+                                               artifact=SimpleNamespace(path=path))
+        registry = RiskModelRegistry()
+        cache.set(RiskModel.ACTIVE_VERSION_KEY, 1, None)
+        self.addCleanup(cache.delete, RiskModel.ACTIVE_VERSION_KEY)
+
+        with mock.patch.object(RiskModel, 'objects') as objects:
+            objects.filter.side_effect = lambda version: mock.Mock(first=lambda: records.get(version))
+            first = registry.get()
+            cache.set(RiskModel.ACTIVE_VERSION_KEY, 2, None)
+            self.assertIs(registry.get(), first)
+            registry.invalidate()
+            second = registry.get()
+            registry.invalidate()
+            self.assertIs(registry.get(), second)
+
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(objects.filter.call_count, 2)
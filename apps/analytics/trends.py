@@ -0,0 +1,178 @@
+"""
+Vectorized trend analysis across regions.
+
+Daily means are pulled for every region in one grouped query, plus the
+retention aggregates for compacted periods. They are laid out as a dense
+(regions x days) array per metric, with NaN for missing days. Long windows
+are block-averaged down to at most ``MAX_SERIES_POINTS`` points. OLS slope,
+the Mann-Kendall S statistic with its normal approximation, and Sen's slope
+are then computed for all regions at once: loops run over lags, never over
+regions.
+"""
+import math
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from apps.monitoring.models import Region, EnvironmentalData, EnvironmentalAggregate
+
+TREND_METRICS = ('land_degradation_index', 'vegetation_index', 'soil_moisture', 'rainfall')
+MAX_SERIES_POINTS = 400
+SEN_REGION_CHUNK = 64
+SIGNIFICANCE = 0.05
+
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+def daily_matrix(start_date, end_date, metrics=TREND_METRICS, region_ids=None):
+    """
+    Return ``(region_ids, days, {metric: array})`` where each array holds the
+    daily mean of a metric with shape (regions, days) and NaN for no data.
+    """
+    if region_ids is None:
+        region_ids = list(Region.objects.order_by('id').values_list('id', flat=True))
+    region_ids = list(region_ids)
+    n_days = (end_date - start_date).days + 1
+    if not region_ids or n_days <= 0:
+        return region_ids, [], {metric: np.empty((len(region_ids), 0)) for metric in metrics}
+
+    row_of = {region_id: i for i, region_id in enumerate(region_ids)}
+    sums = {metric: np.zeros((len(region_ids), n_days)) for metric in metrics}
+    counts = {metric: np.zeros((len(region_ids), n_days)) for metric in metrics}
+
+    raw = (
+        EnvironmentalData.objects
+        .filter(region_id__in=region_ids, date__gte=start_date, date__lte=end_date)
+        .values('region_id', 'date')
+        .annotate(**{f'{metric}__sum': Sum(metric) for metric in metrics},
+                  **{f'{metric}__count': Count(metric) for metric in metrics})
+        .order_by()
+    )
+    for row in raw.iterator(chunk_size=5000):
+        i, j = row_of[row['region_id']], (row['date'] - start_date).days
+        for metric in metrics:
+            if row[f'{metric}__count']:
+                sums[metric][i, j] += row[f'{metric}__sum']
+                counts[metric][i, j] += row[f'{metric}__count']
+
+    # Periods already compacted by the retention job only exist as aggregates.
+    tz = timezone.get_current_timezone()
+    window_start = timezone.make_aware(datetime.combine(start_date, dt_time.min), tz)
+    window_end = window_start + timedelta(days=n_days)
+    aggregates = EnvironmentalAggregate.objects.filter(
+        region_id__in=region_ids, period_start__gte=window_start, period_start__lt=window_end,
+    ).values_list('region_id', 'period_start', 'stats')
+    for region_id, period_start, stats in aggregates.iterator(chunk_size=5000):
+        i = row_of[region_id]
+        j = (timezone.localtime(period_start, tz).date() - start_date).days
+        for metric in metrics:
+            entry = stats.get(metric)
+            if entry and entry.get('count'):
+                sums[metric][i, j] += entry['sum']
+                counts[metric][i, j] += entry['count']
+
+    days = [start_date + timedelta(days=offset) for offset in range(n_days)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrices = {metric: np.where(counts[metric] > 0, sums[metric] / counts[metric], np.nan)
+                    for metric in metrics}
+    return region_ids, days, matrices
+
+
+def downsample(values, max_points=MAX_SERIES_POINTS):
+    """Block-average columns so a (regions, days) array has at most ``max_points`` columns."""
+    n_days = values.shape[1]
+    block = max(1, math.ceil(n_days / max_points))
+    if block == 1:
+        return values, 1
+    padded = np.full((values.shape[0], math.ceil(n_days / block) * block), np.nan)
+    padded[:, :n_days] = values
+    blocks = padded.reshape(values.shape[0], -1, block)
+    counts = (~np.isnan(blocks)).sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, np.nansum(blocks, axis=2) / np.maximum(counts, 1), np.nan)
+    return means, block
+
+
+def ols_slope(values):
+    valid = ~np.isnan(values)
+    t = np.broadcast_to(np.arange(values.shape[1], dtype=float), values.shape)
+    n = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = np.where(valid, t, 0).sum(axis=1) / n
+        y_mean = np.where(valid, values, 0).sum(axis=1) / n
+        dt = np.where(valid, t - t_mean[:, None], 0)
+        dy = np.where(valid, values - y_mean[:, None], 0)
+        slope = (dt * dy).sum(axis=1) / (dt ** 2).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def mann_kendall(values):
+    """Return (S, Z, two-sided p) per row; missing points are skipped."""
+    n_points = values.shape[1]
+    s = np.zeros(values.shape[0])
+    for lag in range(1, n_points):
+        s += np.nan_to_num(np.sign(values[:, lag:] - values[:, :-lag])).sum(axis=1)
+    n = (~np.isnan(values)).sum(axis=1).astype(float)
+    variance = n * (n - 1) * (2 * n + 5) / 18
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(variance > 0, (s - np.sign(s)) / np.sqrt(variance), 0.0)
+    p = _erfc(np.abs(z) / math.sqrt(2)).astype(float)
+    return s, z, np.where(n >= 3, p, np.nan)
+
+
+def sen_slope(values):
+    """Median of all pairwise slopes per row, computed a chunk of rows at a time."""
+    n_rows, n_points = values.shape
+    result = np.full(n_rows, np.nan)
+    for start in range(0, n_rows, SEN_REGION_CHUNK):
+        chunk = values[start:start + SEN_REGION_CHUNK]
+        slopes = np.concatenate(
+            [(chunk[:, lag:] - chunk[:, :-lag]) / lag for lag in range(1, n_points)], axis=1,
+        ) if n_points > 1 else np.full((chunk.shape[0], 1), np.nan)
+        has_pairs = (~np.isnan(slopes)).any(axis=1)
+        medians = np.full(chunk.shape[0], np.nan)
+        if has_pairs.any():
+            medians[has_pairs] = np.nanmedian(slopes[has_pairs], axis=1)
+        result[start:start + SEN_REGION_CHUNK] = medians
+    return result
+
+
+def run_trend_analysis(start_date, end_date, metrics=TREND_METRICS, region_ids=None):
+    region_ids, days, matrices = daily_matrix(start_date, end_date, metrics, region_ids)
+    names = dict(Region.objects.filter(id__in=region_ids).values_list('id', 'name'))
+    results = [{'region_id': region_id, 'region_name': names.get(region_id), 'metrics': {}}
+               for region_id in region_ids]
+
+    block = 1
+    for metric in metrics:
+        series, block = downsample(matrices[metric])
+        per_year = 365.0 / block
+        slope = ols_slope(series) * per_year
+        sen = sen_slope(series) * per_year
+        s, z, p = mann_kendall(series)
+        n_points = (~np.isnan(series)).sum(axis=1)
+
+        for i, result in enumerate(results):
+            significant = bool(p[i] < SIGNIFICANCE) if not np.isnan(p[i]) else False
+            direction = 'no trend'
+            if significant:
+                direction = 'increasing' if s[i] > 0 else 'decreasing'
+            result['metrics'][metric] = {
+                'slope_per_year': None if np.isnan(slope[i]) else float(slope[i]),
+                'sen_slope_per_year': None if np.isnan(sen[i]) else float(sen[i]),
+                'mann_kendall_s': int(s[i]),
+                'z': float(z[i]),
+                'p_value': None if np.isnan(p[i]) else float(p[i]),
+                'trend': direction,
+                'points': int(n_points[i]),
+            }
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'resolution_days': block,
+        'metrics': list(metrics),
+        'regions': results,
+    }
@@ -1,12 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'reports', views.AnalysisReportViewSet)
 router.register(r'predictions', views.RiskPredictionViewSet)
+router.register(r'analysis', views.AnalysisViewSet, basename='analysis')
 router.register(r'dashboard', views.DashboardView, basename='dashboard')
 
 urlpatterns = [
+    # ASGI-native read endpoints
+    path('async/dashboard/stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
+    path('async/reports/', async_views.report_list, name='async-report-list'),
+    path('async/predictions/', async_views.prediction_list, name='async-prediction-list'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
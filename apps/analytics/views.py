@@ -1,15 +1,23 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Avg, StdDev, Count
+from django.db.models import StdDev, Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from .models import AnalysisReport, RiskPrediction
 from .serializers import (
     AnalysisReportSerializer, RiskPredictionSerializer,
-    ReportRequestSerializer, PredictionRequestSerializer
+    ReportRequestSerializer, PredictionRequestSerializer,
+    TrendRequestSerializer, ComparativeRequestSerializer,
+    BatchPredictionRequestSerializer
 )
-from apps.monitoring.models import EnvironmentalData
+from .comparative import cached_comparison
+from .reports import generate_report
+from .risk_model import predict_batch
+from .trends import run_trend_analysis
+from apps.monitoring.models import Region, EnvironmentalData, EnvironmentalAggregate
+from apps.monitoring.retention import combined_statistics
+from myproject.singleflight import singleflight
 
 class AnalysisReportViewSet(viewsets.ModelViewSet):
     queryset = AnalysisReport.objects.all()
@@ -30,14 +38,12 @@ class AnalysisReportViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Here you would implement the actual report generation logic
-        # For now, we'll just create a placeholder report
-        from apps.monitoring.models import Region
-        
+        # Identical requests reuse the stored file; report types without a
+        # builder yet are saved without one
         try:
             region = Region.objects.get(id=serializer.validated_data['region_id'])
             
-            report = AnalysisReport.objects.create(
+            report = generate_report(AnalysisReport(
                 title=f"{serializer.validated_data['report_type']} Report for {region.name}",
                 report_type=serializer.validated_data['report_type'],
                 region=region,
@@ -46,7 +52,7 @@ class AnalysisReportViewSet(viewsets.ModelViewSet):
                 format=serializer.validated_data['format'],
                 generated_by=request.user,
                 parameters=serializer.validated_data.get('parameters', {})
-            )
+            ))
             
             return Response(AnalysisReportSerializer(report).data)
             
@@ -64,64 +70,116 @@ class RiskPredictionViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Simple risk prediction algorithm (placeholder)
         data = serializer.validated_data
         
-        # Basic risk calculation based on environmental factors
-        risk_score = (
-            (1 - data['vegetation_index']) * 0.4 +
-            (1 - data['soil_moisture'] / 100) * 0.3 +
-            (1 - min(data['rainfall'] / 100, 1)) * 0.2 +
-            (data['temperature'] / 50) * 0.1
+        try:
+            region = Region.objects.get(id=data['region_id'])
+        except Region.DoesNotExist:
+            return Response({'error': 'Region not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Trained model when one is active, otherwise the hand-weighted heuristic
+        risk_score, confidence, factors, version = predict_batch([data])[0]
+        prediction, _ = RiskPrediction.objects.update_or_create(
+            region=region,
+            prediction_date=timezone.now().date(),
+            defaults={
+                'risk_score': risk_score,
+                'confidence': confidence,
+                'factors': {**factors, 'model_version': version},
+            }
         )
         
-        risk_score = max(0, min(1, risk_score))  # Clamp between 0 and 1
+        return Response(RiskPredictionSerializer(prediction).data)
+    
+    @action(detail=False, methods=['post'])
+    def predict_batch(self, request):
+        serializer = BatchPredictionRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        from apps.monitoring.models import Region
+        items = serializer.validated_data['predictions']
+        regions = Region.objects.in_bulk({item['region_id'] for item in items})
+        missing = sorted({item['region_id'] for item in items} - set(regions))
+        if missing:
+            return Response({'error': 'Region not found', 'region_ids': missing},
+                            status=status.HTTP_404_NOT_FOUND)
         
-        try:
-            region = Region.objects.get(id=data['region_id'])
-            
-            prediction = RiskPrediction.objects.create(
-                region=region,
-                prediction_date=timezone.now().date(),
+        today = timezone.now().date()
+        predictions = [
+            RiskPrediction(
+                region=regions[item['region_id']],
+                prediction_date=today,
                 risk_score=risk_score,
-                confidence=0.85,  # Placeholder confidence
-                factors={
-                    'vegetation_impact': (1 - data['vegetation_index']) * 0.4,
-                    'soil_moisture_impact': (1 - data['soil_moisture'] / 100) * 0.3,
-                    'rainfall_impact': (1 - min(data['rainfall'] / 100, 1)) * 0.2,
-                    'temperature_impact': (data['temperature'] / 50) * 0.1
-                }
+                confidence=confidence,
+                factors={**factors, 'model_version': version}
             )
-            
-            return Response(RiskPredictionSerializer(prediction).data)
-            
-        except Region.DoesNotExist:
-            return Response({'error': 'Region not found'}, status=status.HTTP_404_NOT_FOUND)
+            for item, (risk_score, confidence, factors, version) in zip(items, predict_batch(items))
+        ]
+        RiskPrediction.objects.bulk_create(
+            predictions, update_conflicts=True,
+            unique_fields=['region', 'prediction_date'],
+            update_fields=['risk_score', 'confidence', 'factors']
+        )
+        
+        saved = RiskPrediction.objects.filter(
+            region__in=list(regions.values()), prediction_date=today
+        ).select_related('region')
+        return Response(RiskPredictionSerializer(saved, many=True).data)
+
+class AnalysisViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        serializer = TrendRequestSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        return Response(run_trend_analysis(
+            data['start_date'], data['end_date'],
+            metrics=data['metrics'],
+            region_ids=data.get('regions') or None
+        ))
+    
+    @action(detail=False, methods=['get'])
+    def comparative(self, request):
+        serializer = ComparativeRequestSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        return Response(cached_comparison(
+            data['start_date'], data['end_date'],
+            metrics=data['metrics'],
+            region_ids=data.get('regions') or None
+        ))
+
+# A region is high risk if any reading, raw or compacted, exceeds 0.7 degradation
+HIGH_RISK = (
+    Q(environmental_data__land_degradation_index__gt=0.7)
+    | Q(aggregates__stats__land_degradation_index__max__gt=0.7)
+)
 
 class DashboardView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
+        return Response(singleflight('dashboard-stats', self._compute_stats))
+    
+    def _compute_stats(self):
         # Get basic statistics for dashboard
         total_regions = Region.objects.count()
-        total_data_points = EnvironmentalData.objects.count()
         latest_data = EnvironmentalData.objects.order_by('-timestamp').first()
         
-        # Calculate average risk across regions
-        regions_with_data = Region.objects.filter(environmental_data__isnull=False).distinct()
-        avg_risk = EnvironmentalData.objects.aggregate(
-            avg_risk=Avg('land_degradation_index')
-        )['avg_risk'] or 0
+        # Totals and average risk include readings compacted into aggregates
+        combined = combined_statistics(EnvironmentalData.objects.all(), EnvironmentalAggregate.objects.all())
         
-        return Response({
+        return {
             'total_regions': total_regions,
-            'total_data_points': total_data_points,
-            'average_risk': avg_risk,
+            'total_data_points': combined['data_points'],
+            'average_risk': combined['avg_degradation'] or 0,
             'latest_data_date': latest_data.date if latest_data else None,
-            'high_risk_regions': regions_with_data.filter(
-                environmental_data__land_degradation_index__gt=0.7
-            ).count()
-        })
\ No newline at end of file
+            'high_risk_regions': Region.objects.filter(HIGH_RISK).distinct().count()
+        }
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Region, EnvironmentalData, DataUpload
+from .models import Region, EnvironmentalData, EnvironmentalAggregate, DataUpload, UploadSession, DataChange
 
 @admin.register(Region)
 class RegionAdmin(admin.ModelAdmin):
@@ -13,8 +13,27 @@ class EnvironmentalDataAdmin(admin.ModelAdmin):
     list_filter = ['region', 'source', 'date']
     search_fields = ['region__name']
 
+@admin.register(EnvironmentalAggregate)
+class EnvironmentalAggregateAdmin(admin.ModelAdmin):
+    list_display = ['region', 'source', 'resolution', 'period_start', 'sample_count']
+    list_filter = ['source', 'resolution', 'region']
+    readonly_fields = ['sample_count', 'stats', 'updated_at']
+
+@admin.register(DataChange)
+class DataChangeAdmin(admin.ModelAdmin):
+    list_display = ['seq', 'reading_id', 'op', 'changed_at']
+    list_filter = ['op']
+    search_fields = ['reading_id']
+
 @admin.register(DataUpload)
 class DataUploadAdmin(admin.ModelAdmin):
     list_display = ['region', 'file_type', 'status', 'uploaded_by', 'created_at']
     list_filter = ['status', 'file_type', 'created_at']
-    readonly_fields = ['processed_records', 'total_records', 'errors', 'created_at', 'completed_at']
\ No newline at end of file
+    readonly_fields = ['processed_records', 'total_records', 'inserted_records', 'updated_records',
+                       'skipped_records', 'errors', 'created_at', 'completed_at']
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'region', 'status', 'received_bytes', 'total_size', 'uploaded_by', 'created_at']
+    list_filter = ['status', 'file_type', 'created_at']
+    readonly_fields = ['received_ranges', 'received_bytes', 'upload', 'created_at', 'updated_at']
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+ASGI-native variants of the read-heavy monitoring endpoints.
+
+These mirror the DRF viewset actions (same filters, same payloads). The ORM
+is synchronous, so queries still run on worker threads, but no thread is
+held while a request body is read or a response is written to a slow client,
+and independent queries run concurrently through ``gather_queries``. The
+cached endpoints share one computation with the sync views through
+``singleflight``.
+"""
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import Polygon
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.users.authentication import aauthenticate
+from myproject.renderers import render_json
+from myproject.routers import replica_safe
+from myproject.singleflight import singleflight
+from .models import Region, EnvironmentalData, EnvironmentalAggregate, DataUpload
+from .serializers import (
+    RegionSerializer, EnvironmentalDataSerializer,
+    BoundingBoxSerializer, DataUploadSerializer,
+    EnvironmentalDataFilterSerializer
+)
+from .retention import combined_statistics
+from .views import time_range_start
+
+
+def async_api_view(methods=('GET',)):
+    """Authenticate with the API's JWT rules and require an active user."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                                    status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            user = await aauthenticate(request)
+            if user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                    status=status.HTTP_401_UNAUTHORIZED)
+            request.user = user
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _with_connection_cleanup(func):
+    def run():
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """
+    Run independent ORM callables concurrently and return their results.
+
+    Django's async ORM methods all go through one thread per request, so
+    awaiting several of them together still runs them one after another.
+    Here each callable gets its own worker thread and database connection.
+    """
+    return await asyncio.gather(*(
+        sync_to_async(_with_connection_cleanup(func), thread_sensitive=False)()
+        for func in funcs
+    ))
+
+
+async def paginated_response(request, queryset, serializer_class):
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * page_size
+
+    count, rows = await gather_queries(
+        queryset.count,
+        lambda: list(queryset[offset:offset + page_size]),
+    )
+    if offset and offset >= count:
+        return JsonResponse({'detail': 'Invalid page.'}, status=status.HTTP_404_NOT_FOUND)
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if offset + page_size < count else None
+    previous_url = None
+    if page > 1:
+        previous_url = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+
+    return HttpResponse(render_json({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer_class(rows, many=True).data,
+    }), content_type='application/json')
+
+
+@async_api_view()
+async def region_list(request):
+    return await paginated_response(request, Region.objects.all(), RegionSerializer)
+
+
+@async_api_view()
+async def region_statistics(request, pk):
+    time_range = request.GET.get('time_range', '30d')
+
+    def compute():
+        queryset = EnvironmentalData.objects.filter(region_id=pk)
+        aggregates = EnvironmentalAggregate.objects.filter(region_id=pk)
+        start_date = time_range_start(time_range)
+        if start_date:
+            queryset = queryset.filter(timestamp__gte=start_date)
+            aggregates = aggregates.filter(period_start__gte=start_date)
+        return combined_statistics(queryset, aggregates)
+
+    exists, stats = await gather_queries(
+        Region.objects.filter(pk=pk).exists,
+        lambda: singleflight(f'region-statistics:{pk}:{time_range}', compute),
+    )
+    if not exists:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(stats)
+
+
+def _filter_environmental_data(queryset, filters):
+    if 'region' in filters:
+        queryset = queryset.filter(region_id=filters['region'])
+    for field in ('date', 'source', 'quality_score'):
+        if field in filters:
+            queryset = queryset.filter(**{field: filters[field]})
+    if 'start_date' in filters:
+        queryset = queryset.filter(date__gte=filters['start_date'])
+    if 'end_date' in filters:
+        queryset = queryset.filter(date__lte=filters['end_date'])
+    return queryset
+
+
+@async_api_view()
+async def environmental_data_list(request):
+    # Blank parameters are ignored, as with the viewset's filter backend.
+    serializer = EnvironmentalDataFilterSerializer(
+        data={key: value for key, value in request.GET.items() if value}
+    )
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    queryset = _filter_environmental_data(
+        EnvironmentalData.objects.select_related('region'), serializer.validated_data
+    )
+    return await paginated_response(request, queryset, EnvironmentalDataSerializer)
+
+
+@async_api_view()
+async def environmental_data_latest(request):
+    def compute():
+        rows = EnvironmentalData.latest_per_region()
+        return list(EnvironmentalDataSerializer(rows, many=True).data)
+
+    data, = await gather_queries(lambda: singleflight('environmental-data-latest', compute))
+    return JsonResponse(data, safe=False)
+
+
+@replica_safe
+@async_api_view(methods=('POST',))
+async def environmental_data_within_bbox(request):
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = BoundingBoxSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    bbox = Polygon.from_bbox((
+        data['sw_lng'], data['sw_lat'],
+        data['ne_lng'], data['ne_lat']
+    ))
+    queryset = EnvironmentalData.objects.filter(location__within=bbox).select_related('region')
+    if data.get('start_date'):
+        queryset = queryset.filter(date__gte=data['start_date'])
+    if data.get('end_date'):
+        queryset = queryset.filter(date__lte=data['end_date'])
+    if data.get('sources'):
+        queryset = queryset.filter(source__in=data['sources'])
+
+    return await paginated_response(request, queryset, EnvironmentalDataSerializer)
+
+
+@async_api_view()
+async def data_upload_list(request):
+    queryset = DataUpload.objects.all()
+    if not request.user.is_admin():
+        queryset = queryset.filter(uploaded_by=request.user)
+    return await paginated_response(request, queryset, DataUploadSerializer)
@@ -0,0 +1,93 @@
+"""
+Change log for EnvironmentalData (see DataChange).
+
+Changes are written with ``transaction.on_commit``, one ``bulk_create`` per
+``record_changes`` call. Django drops the callbacks of a rolled-back
+transaction or savepoint, so a rollback leaves no entries, and the sequence
+numbers are allocated in commit order: a client reading the log never sees
+seq N+1 before seq N has been committed. Outside a transaction, entries are
+written immediately.
+
+Single-row saves and deletes are recorded through model signals (see
+signals.py). Bulk writes, which send no signals, call ``record_changes``
+directly. Retention compaction, which only moves old rows into aggregates,
+runs under ``suppress_change_log``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .models import DataChange, EnvironmentalData
+
+_suppressed = ContextVar('data_changes_suppressed', default=False)
+
+
+@contextmanager
+def suppress_change_log():
+    """Record no changes (and bump no data versions) for writes inside the block."""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def change_log_suppressed():
+    return _suppressed.get()
+
+
+def _write(reading_ids, op, using):
+    now = timezone.now()
+    DataChange.objects.using(using).bulk_create([
+        DataChange(reading_id=reading_id, op=op, changed_at=now) for reading_id in reading_ids
+    ], batch_size=1000)
+
+
+def record_changes(reading_ids, op='upsert', using=DEFAULT_DB_ALIAS):
+    if change_log_suppressed():
+        return
+    reading_ids = list(dict.fromkeys(reading_id for reading_id in reading_ids if reading_id is not None))
+    if reading_ids:
+        transaction.on_commit(lambda: _write(reading_ids, op, using), using=using)
+
+
+def current_cursor():
+    return DataChange.objects.using(DEFAULT_DB_ALIAS).order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+def changes_since(since, limit):
+    """
+    Return ``(changes, cursor, has_more)`` for entries after ``since``.
+    Within a page only the latest entry per reading is kept. Upserts come
+    with the current row, and readings that no longer exist become
+    tombstones (``data`` is None).
+    """
+    settle = getattr(settings, 'CHANGE_FEED_SETTLE_SECONDS', 1)
+    entries = list(
+        DataChange.objects.using(DEFAULT_DB_ALIAS)
+        .filter(seq__gt=since, changed_at__lte=timezone.now() - timedelta(seconds=settle))
+        .order_by('seq')
+        .values_list('seq', 'reading_id', 'op')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], since, False
+
+    latest = {}
+    for seq, reading_id, op in entries:
+        latest.pop(reading_id, None)
+        latest[reading_id] = (seq, op)
+
+    upserted = [reading_id for reading_id, (_, op) in latest.items() if op == 'upsert']
+    rows = EnvironmentalData.objects.using(DEFAULT_DB_ALIAS).filter(id__in=upserted).select_related('region').in_bulk()
+    changes = [
+        {'seq': seq, 'id': reading_id, 'op': 'upsert' if reading_id in rows else 'delete',
+         'reading': rows.get(reading_id)}
+        for reading_id, (seq, op) in latest.items()
+    ]
+    return changes, entries[-1][0], has_more
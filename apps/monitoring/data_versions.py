@@ -0,0 +1,61 @@
+"""
+Per-region data versions for cache invalidation.
+
+Every region has a counter in the cache that changes whenever its readings
+change. Derived results (comparisons, surfaces, reports) put the versions of
+the regions they cover into their cache keys. A stale entry is then simply
+never looked up again, so nothing has to be deleted explicitly.
+
+A counter starts from the current time, not zero. If it is evicted and
+recreated, it cannot repeat a value that an older cache key already used.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_PREFIX = 'data-version:region:'
+
+
+def _key(region_id):
+    return f'{VERSION_PREFIX}{region_id}'
+
+
+def _initial():
+    return time.time_ns()
+
+
+def region_versions(region_ids):
+    """Return {region_id: version} with one cache round trip in the common case."""
+    keys = {_key(region_id): region_id for region_id in set(region_ids)}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial(), None)
+        found.update(cache.get_many(missing))
+    return {region_id: found.get(key, 0) for key, region_id in keys.items()}
+
+
+def versions_token(region_ids):
+    """Short digest of the versions of ``region_ids``, for use in cache keys."""
+    versions = region_versions(region_ids)
+    payload = ','.join(f'{region_id}:{versions[region_id]}' for region_id in sorted(versions))
+    return hashlib.blake2b(payload.encode(), digest_size=10).hexdigest()
+
+
+def _bump(region_ids):
+    for region_id in set(region_ids):
+        key = _key(region_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def bump_regions(region_ids):
+    """Invalidate cached results for ``region_ids`` once the current transaction commits."""
+    region_ids = [region_id for region_id in set(region_ids) if region_id is not None]
+    if region_ids:
+        transaction.on_commit(lambda: _bump(region_ids))
@@ -0,0 +1,276 @@
+"""
+Batch ingestion of EnvironmentalData.
+
+Uploaded files are parsed into readings and written in bounded batches with
+``upsert_readings``. A reading's identity is the ``unique_together`` key
+(location, timestamp, source). Coordinates are snapped to
+``INGEST_COORD_PRECISION`` decimals, so the in-batch dedup key and the stored
+row agree. Rows already present are either kept (``ignore``) or overwritten
+by primary key (``update``) in a single statement per batch, never retried
+row by row. Stored rows are matched on their rounded coordinates, so rows
+written before snapping was introduced are updated rather than duplicated.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.gis.geos import Point, Polygon
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .changes import record_changes
+from .models import EnvironmentalData, DataUpload
+from .quality import score_readings
+from .signals import readings_ingested
+
+REQUIRED_METRICS = ('vegetation_index', 'soil_moisture', 'rainfall', 'land_degradation_index')
+OPTIONAL_METRICS = ('temperature', 'wind_speed', 'humidity', 'quality_score')
+KNOWN_COLUMNS = {'latitude', 'longitude', 'lat', 'lng', 'lon', 'timestamp', 'date', 'source',
+                 *REQUIRED_METRICS, *OPTIONAL_METRICS}
+UPDATE_FIELDS = ['region', 'date', 'uploaded_by', 'metadata', *REQUIRED_METRICS, *OPTIONAL_METRICS]
+MAX_REPORTED_ERRORS = 100
+
+
+def coord_precision():
+    return getattr(settings, 'INGEST_COORD_PRECISION', 6)
+
+
+def reading_key(reading):
+    precision = coord_precision()
+    return (
+        round(reading.location.x, precision),
+        round(reading.location.y, precision),
+        reading.timestamp,
+        reading.source,
+    )
+
+
+def _float(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number')
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = parse_datetime(str(value)) if value else None
+        if parsed is None and value:
+            day = parse_date(str(value))
+            parsed = datetime.combine(day, dt_time.min) if day else None
+    if parsed is None:
+        raise ValueError('timestamp is missing or invalid')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def build_reading(row, region, uploaded_by=None, default_source='ground'):
+    """Turn a parsed row into an unsaved EnvironmentalData, raising ValueError."""
+    precision = coord_precision()
+    lat = _float(row.get('latitude', row.get('lat')), 'latitude', required=True)
+    lng = _float(row.get('longitude', row.get('lng', row.get('lon'))), 'longitude', required=True)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('coordinates out of range')
+
+    source = row.get('source') or default_source
+    if source not in dict(EnvironmentalData.SOURCE_CHOICES):
+        raise ValueError(f'unknown source "{source}"')
+
+    timestamp = _timestamp(row.get('timestamp') or row.get('date'))
+    date = parse_date(str(row['date'])) if row.get('date') else None
+
+    reading = EnvironmentalData(
+        location=Point(round(lng, precision), round(lat, precision), srid=4326),
+        timestamp=timestamp,
+        date=date or timestamp.date(),
+        source=source,
+        region=region,
+        uploaded_by=uploaded_by,
+        metadata={key: value for key, value in row.items() if key not in KNOWN_COLUMNS},
+    )
+    for field in REQUIRED_METRICS:
+        setattr(reading, field, _float(row.get(field), field, required=True))
+    for field in OPTIONAL_METRICS:
+        value = _float(row.get(field), field)
+        if value is not None:
+            setattr(reading, field, value)
+    return reading
+
+
+def iter_rows(upload):
+    """Yield (row_number, dict) for every record in an uploaded file."""
+    with upload.file.open('rb') as handle:
+        if upload.file_type == 'geojson':
+            document = json.load(handle)
+            features = document.get('features', []) if document.get('type') == 'FeatureCollection' else [document]
+            for number, feature in enumerate(features, start=1):
+                row = dict(feature.get('properties') or {})
+                geometry = feature.get('geometry') or {}
+                if geometry.get('type') == 'Point':
+                    row['longitude'], row['latitude'] = geometry['coordinates'][:2]
+                yield number, row
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(handle, encoding='utf-8-sig', newline=''))
+            for number, row in enumerate(reader, start=2):
+                yield number, {key.strip(): value for key, value in row.items() if key}
+
+
+def _existing_keys(readings):
+    """Keys of ``readings`` that are already stored, mapped to their ids."""
+    precision = coord_precision()
+    keys = {reading_key(reading) for reading in readings}
+    # Narrow the scan to the batch's envelope, widened by half a snapping
+    # step so unsnapped legacy rows on the edge are still found.
+    margin = 0.5 * 10 ** -precision
+    envelope = Polygon.from_bbox((
+        min(key[0] for key in keys) - margin, min(key[1] for key in keys) - margin,
+        max(key[0] for key in keys) + margin, max(key[1] for key in keys) + margin,
+    ))
+    envelope.srid = 4326
+    # Always ask the primary: a lagging replica would turn updates into
+    # duplicate inserts.
+    rows = EnvironmentalData.objects.using(DEFAULT_DB_ALIAS).filter(
+        timestamp__in={key[2] for key in keys},
+        source__in={key[3] for key in keys},
+        location__intersects=envelope,
+    ).values_list('id', 'location', 'timestamp', 'source')
+    existing = {}
+    for pk, location, timestamp, source in rows:
+        key = (round(location.x, precision), round(location.y, precision), timestamp, source)
+        if key in keys:
+            existing[key] = pk
+    return existing
+
+
+def upsert_readings(readings, mode='ignore', batch_size=None, score=False):
+    """
+    Write ``readings`` with conflict-ignore or conflict-update semantics.
+
+    Returns ``(summary, written)``: ``summary`` counts inserted, updated and
+    skipped rows (in-batch duplicates count as skipped, the last one wins),
+    and ``written`` lists the inserted or updated readings with their pks set.
+
+    With ``score``, quality scores are computed for exactly the rows that get
+    written, after dedup. Only inserted rows feed the station history, so
+    duplicates, skipped rows and re-ingested data never skew it.
+    """
+    if mode not in dict(DataUpload.CONFLICT_CHOICES):
+        raise ValueError(f'unknown conflict mode "{mode}"')
+    batch_size = batch_size or getattr(settings, 'INGEST_BATCH_SIZE', 1000)
+    summary = {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    unique = {}
+    for reading in readings:
+        key = reading_key(reading)
+        if key in unique:
+            summary['skipped'] += 1
+        unique[key] = reading
+    items = list(unique.items())
+
+    written = []
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        existing = _existing_keys([reading for _, reading in chunk])
+        new = [reading for key, reading in chunk if key not in existing]
+        old = [reading for key, reading in chunk if key in existing]
+        if mode == 'update':
+            # Update by pk rather than on the unique key: a stored row's
+            # location may predate snapping and differ from the reading's.
+            for key, reading in chunk:
+                if key in existing:
+                    reading.pk = existing[key]
+        if score:
+            score_readings(new, keys=[key for key, _ in chunk if key not in existing])
+            if mode == 'update':
+                score_readings(old, keys=[key for key, _ in chunk if key in existing], update_history=False)
+
+        with transaction.atomic():
+            if new:
+                EnvironmentalData.objects.bulk_create(new, batch_size=batch_size, ignore_conflicts=True)
+            if old and mode == 'update':
+                EnvironmentalData.objects.bulk_update(old, UPDATE_FIELDS, batch_size=batch_size)
+
+        summary['inserted'] += len(new)
+        if mode == 'update':
+            summary['updated'] += len(old)
+            touched = chunk
+        else:
+            summary['skipped'] += len(old)
+            touched = [(key, reading) for key, reading in chunk if key not in existing]
+
+        # Conflict-ignoring inserts do not report primary keys; resolve them
+        # with one lookup so downstream consumers can reference the rows.
+        ids = dict(existing) if mode == 'update' else {}
+        if new:
+            ids.update(_existing_keys(new))
+        for key, reading in touched:
+            reading.pk = ids.get(key)
+            if reading.pk is not None:
+                reading._state.adding = False
+                written.append(reading)
+        # Bulk writes send no post_save, so log exactly the rows written here
+        # for the change feed; skipped rows were not touched.
+        record_changes([reading.pk for _, reading in touched if reading.pk is not None], 'upsert')
+
+    return summary, written
+
+
+def process_data_upload(upload, batch_size=None):
+    """Parse, validate and upsert an uploaded file, recording progress on it."""
+    batch_size = batch_size or getattr(settings, 'INGEST_BATCH_SIZE', 1000)
+    upload.status = 'processing'
+    upload.errors = []
+    upload.save(update_fields=['status', 'errors'])
+
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    errors = []
+    total = 0
+    batch = []
+
+    def flush():
+        summary, written = upsert_readings(batch, mode=upload.conflict_mode, batch_size=batch_size, score=True)
+        for key in counts:
+            counts[key] += summary[key]
+        batch.clear()
+        if written:
+            readings_ingested.send(sender=EnvironmentalData, readings=written)
+        upload.processed_records = sum(counts.values())
+        upload.save(update_fields=['processed_records'])
+
+    try:
+        for number, row in iter_rows(upload):
+            total += 1
+            try:
+                batch.append(build_reading(row, upload.region, upload.uploaded_by))
+            except ValueError as exc:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': number, 'error': str(exc)})
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except Exception as exc:
+        upload.status = 'failed'
+        errors.append({'row': None, 'error': str(exc)})
+    else:
+        upload.status = 'completed'
+
+    upload.total_records = total
+    upload.inserted_records = counts['inserted']
+    upload.updated_records = counts['updated']
+    upload.skipped_records = counts['skipped']
+    upload.processed_records = sum(counts.values())
+    upload.errors = errors
+    upload.completed_at = timezone.now()
+    upload.save()
+    return upload
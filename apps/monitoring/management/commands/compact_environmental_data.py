@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from apps.monitoring.retention import run_compaction
+
+class Command(BaseCommand):
+    help = 'Compact raw environmental readings into hourly/daily aggregates according to DATA_RETENTION'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', dest='sources',
+                            help='Only compact this source (may be repeated)')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Seconds to sleep between batches')
+    
+    def handle(self, *args, **options):
+        summary = run_compaction(
+            sources=options['sources'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            log=self.stdout.write,
+        )
+        for source, counts in summary.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{source}: raw={counts['raw']} hourly={counts['hourly']} daily={counts['daily']}"
+            ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from apps.monitoring.uploads import prune_upload_sessions
+
+class Command(BaseCommand):
+    help = 'Abort expired chunked upload sessions and delete their part files'
+    
+    def handle(self, *args, **options):
+        aborted = prune_upload_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Aborted {aborted} expired upload sessions'))
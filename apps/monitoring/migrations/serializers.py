@@ -1,6 +1,10 @@
+import json
 from rest_framework import serializers
-from django.contrib.gis.geos import Point
-from .models import Region, EnvironmentalData, DataUpload
+from django.conf import settings
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Point
+from .models import Region, EnvironmentalData, DataUpload, UploadSession
+from .quality import score_readings
+from .surface import SURFACE_METRICS, ENCODINGS, MAX_RESOLUTION
 
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,6 +30,11 @@ class EnvironmentalDataSerializer(serializers.ModelSerializer):
         # Set uploaded_by from request user
         validated_data['uploaded_by'] = self.context['request'].user
         
+        # Score against the station's recent history before saving
+        reading = EnvironmentalData(**validated_data)
+        score_readings([reading])
+        validated_data['quality_score'] = reading.quality_score
+        
         return super().create(validated_data)
     
     def to_representation(self, instance):
@@ -47,13 +56,68 @@ class BoundingBoxSerializer(serializers.Serializer):
         required=False
     )
 
+class EnvironmentalDataFilterSerializer(serializers.Serializer):
+    region = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    source = serializers.ChoiceField(choices=EnvironmentalData.SOURCE_CHOICES, required=False)
+    quality_score = serializers.FloatField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+class PolygonQuerySerializer(serializers.Serializer):
+    geometry = serializers.JSONField(help_text="GeoJSON Polygon or MultiPolygon (or a Feature holding one)")
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    sources = serializers.ListField(
+        child=serializers.ChoiceField(choices=EnvironmentalData.SOURCE_CHOICES),
+        required=False
+    )
+    
+    def validate_geometry(self, value):
+        if isinstance(value, dict) and value.get('type') == 'Feature':
+            value = value.get('geometry')
+        if not isinstance(value, dict) or value.get('type') not in ('Polygon', 'MultiPolygon'):
+            raise serializers.ValidationError('Expected a GeoJSON Polygon or MultiPolygon')
+        try:
+            geometry = GEOSGeometry(json.dumps(value), srid=4326)
+        except (GEOSException, ValueError):
+            raise serializers.ValidationError('Invalid GeoJSON geometry')
+        if not geometry.valid:
+            raise serializers.ValidationError(f'Invalid polygon: {geometry.valid_reason}')
+        return geometry
+
+class SurfaceRequestSerializer(serializers.Serializer):
+    metric = serializers.ChoiceField(choices=SURFACE_METRICS, default='land_degradation_index')
+    days = serializers.IntegerField(min_value=1, max_value=3650, default=30)
+    resolution = serializers.IntegerField(min_value=8, max_value=MAX_RESOLUTION, default=256)
+    encoding = serializers.ChoiceField(choices=tuple(ENCODINGS), default='png')
+
 class DataUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = DataUpload
         fields = '__all__'
         read_only_fields = ['status', 'processed_records', 'total_records', 
+                           'inserted_records', 'updated_records', 'skipped_records',
                            'errors', 'uploaded_by', 'created_at', 'completed_at']
     
     def create(self, validated_data):
         validated_data['uploaded_by'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    missing_ranges = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = '__all__'
+        read_only_fields = ['received_ranges', 'received_bytes', 'status', 'upload',
+                           'uploaded_by', 'created_at', 'updated_at', 'expires_at']
+    
+    def get_missing_ranges(self, obj):
+        return obj.missing_ranges()
+    
+    def validate_total_size(self, value):
+        max_size = getattr(settings, 'UPLOAD_SESSION_MAX_SIZE', 20 * 1024 ** 3)
+        if value <= 0 or value > max_size:
+            raise serializers.ValidationError(f'total_size must be between 1 and {max_size} bytes')
+        return value
\ No newline at end of file
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'regions', views.RegionViewSet)
@@ -8,5 +8,14 @@ router.register(r'environmental-data', views.EnvironmentalDataViewSet)
 router.register(r'data-uploads', views.DataUploadViewSet)
 
 urlpatterns = [
+    path('stream/', views.reading_stream, name='reading-stream'),
+    
+    # ASGI-native read endpoints
+    path('async/regions/', async_views.region_list, name='async-region-list'),
+    path('async/regions/<int:pk>/statistics/', async_views.region_statistics, name='async-region-statistics'),
+    path('async/environmental-data/', async_views.environmental_data_list, name='async-environmental-data-list'),
+    path('async/environmental-data/latest/', async_views.environmental_data_latest, name='async-environmental-data-latest'),
+    path('async/environmental-data/within_bbox/', async_views.environmental_data_within_bbox, name='async-environmental-data-within-bbox'),
+    path('async/data-uploads/', async_views.data_upload_list, name='async-data-upload-list'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
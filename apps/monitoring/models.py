@@ -1,5 +1,8 @@
+import uuid
+
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 from apps.users.models import User
 
@@ -59,6 +62,82 @@ class EnvironmentalData(models.Model):
         if not self.timestamp:
             self.timestamp = timezone.now()
         super().save(*args, **kwargs)
+    
+    @classmethod
+    def latest_per_region(cls):
+        """The newest reading of every region, via one correlated subquery."""
+        latest_ids = (
+            Region.objects
+            .annotate(latest_id=Subquery(
+                cls.objects.filter(region=OuterRef('pk')).order_by('-timestamp').values('id')[:1]
+            ))
+            .exclude(latest_id=None)
+            .values_list('latest_id', flat=True)
+        )
+        return cls.objects.filter(id__in=Subquery(latest_ids)).select_related('region').order_by('region__name')
+
+class EnvironmentalAggregate(models.Model):
+    """
+    Downsampled readings produced by the retention job. ``stats`` maps each
+    metric to its ``count``/``sum``/``min``/``max`` so buckets can be merged
+    additively when more raw rows (or finer buckets) are compacted into them.
+    """
+    RESOLUTION_CHOICES = (
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    )
+    
+    METRICS = (
+        'vegetation_index', 'soil_moisture', 'rainfall', 'land_degradation_index',
+        'temperature', 'wind_speed', 'humidity',
+    )
+    
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='aggregates')
+    source = models.CharField(max_length=20, choices=EnvironmentalData.SOURCE_CHOICES)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    period_start = models.DateTimeField()
+    sample_count = models.IntegerField(default=0)
+    stats = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-period_start']
+        indexes = [
+            models.Index(fields=['source', 'resolution', 'period_start']),
+        ]
+        unique_together = ['region', 'source', 'resolution', 'period_start']
+    
+    def __str__(self):
+        return f"{self.region} - {self.source} {self.resolution} {self.period_start:%Y-%m-%d %H:%M}"
+    
+    def average(self, metric):
+        entry = self.stats.get(metric)
+        if not entry or not entry['count']:
+            return None
+        return entry['sum'] / entry['count']
+
+class DataChange(models.Model):
+    """
+    Append-only log of EnvironmentalData changes for incremental sync.
+    ``seq`` only grows, so clients keep the last one they saw as a cursor.
+    Rows are written just after the changing transaction commits (see
+    apps.monitoring.changes), which keeps ``seq`` in commit order.
+    """
+    OP_CHOICES = (
+        ('upsert', 'Insert or update'),
+        ('delete', 'Delete'),
+    )
+    
+    seq = models.BigAutoField(primary_key=True)
+    reading_id = models.BigIntegerField(db_index=True)
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['seq']
+    
+    def __str__(self):
+        return f"#{self.seq} {self.op} reading {self.reading_id}"
 
 class DataUpload(models.Model):
     STATUS_CHOICES = (
@@ -68,6 +147,11 @@ class DataUpload(models.Model):
         ('failed', 'Failed'),
     )
     
+    CONFLICT_CHOICES = (
+        ('ignore', 'Keep existing readings'),
+        ('update', 'Overwrite existing readings'),
+    )
+    
     file = models.FileField(upload_to='data_uploads/')
     file_type = models.CharField(max_length=10, choices=(('csv', 'CSV'), ('geojson', 'GeoJSON')))
     region = models.ForeignKey(Region, on_delete=models.CASCADE)
@@ -75,6 +159,11 @@ class DataUpload(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     processed_records = models.IntegerField(default=0)
     total_records = models.IntegerField(default=0)
+    conflict_mode = models.CharField(max_length=10, choices=CONFLICT_CHOICES, default='ignore',
+                                     help_text="What to do with readings that already exist")
+    inserted_records = models.IntegerField(default=0)
+    updated_records = models.IntegerField(default=0)
+    skipped_records = models.IntegerField(default=0)
     errors = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -83,4 +172,53 @@ class DataUpload(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Upload {self.id} - {self.region} ({self.status})"
\ No newline at end of file
+        return f"Upload {self.id} - {self.region} ({self.status})"
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload. Chunks are written straight into a
+    preallocated part file; ``received_ranges`` holds the merged
+    ``[start, end)`` byte ranges verified so far. Once every byte has arrived,
+    the part file is moved into place and a DataUpload is created from it.
+    """
+    STATUS_CHOICES = (
+        ('active', 'Receiving chunks'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10, choices=(('csv', 'CSV'), ('geojson', 'GeoJSON')))
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    conflict_mode = models.CharField(max_length=10, choices=DataUpload.CONFLICT_CHOICES, default='ignore')
+    total_size = models.BigIntegerField()
+    received_ranges = models.JSONField(default=list, blank=True)
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    upload = models.OneToOneField(DataUpload, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Upload session {self.id} - {self.file_name} ({self.received_bytes}/{self.total_size})"
+    
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+    
+    def missing_ranges(self):
+        missing, position = [], 0
+        for start, end in self.received_ranges:
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+        if position < self.total_size:
+            missing.append([position, self.total_size])
+        return missing
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Vectorized data-quality scoring for incoming readings.
+
+A batch is scored in a handful of NumPy passes over a (readings x metrics)
+matrix:
+
+* range checks per metric (``METRIC_RANGES``);
+* z-score outliers against each station's recent history, kept in the cache
+  as a running mean/variance capped at ``QUALITY_STATION_WINDOW`` samples;
+* isolated spikes (a jump away from and back to the neighbours);
+* flatlines (the same value repeated ``FLATLINE_RUN`` times or more).
+
+A station is a (rounded location, source) pair. Station windows are read and
+written with one ``get_many``/``set_many`` each per batch.
+"""
+import hashlib
+from operator import attrgetter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+METRIC_RANGES = {
+    'vegetation_index': (-1.0, 1.0),
+    'soil_moisture': (0.0, 100.0),
+    'rainfall': (0.0, 500.0),
+    'land_degradation_index': (0.0, 1.0),
+    'temperature': (-60.0, 60.0),
+    'wind_speed': (0.0, 75.0),
+    'humidity': (0.0, 100.0),
+}
+METRICS = tuple(METRIC_RANGES)
+
+# Zero rainfall for days on end is normal, so it is not checked for flatlines.
+FLATLINE_METRICS = np.array([metric != 'rainfall' for metric in METRICS])
+
+Z_THRESHOLD = 4.0
+SPIKE_THRESHOLD = 4.0
+FLATLINE_RUN = 6
+MIN_HISTORY = 10
+
+# Fraction of the score each failed check can take away (per flagged metric share).
+PENALTIES = {
+    'outlier': 0.5,
+    'spike': 0.4,
+    'flatline': 0.3,
+}
+
+CACHE_PREFIX = 'quality:station:'
+
+
+def _window():
+    return getattr(settings, 'QUALITY_STATION_WINDOW', 500)
+
+
+def _cache_key(station):
+    return CACHE_PREFIX + hashlib.blake2b(repr(station).encode(), digest_size=12).hexdigest()
+
+
+def _empty_state():
+    nan = [float('nan')] * len(METRICS)
+    return {'n': [0.0] * len(METRICS), 'mean': [0.0] * len(METRICS),
+            'var': [0.0] * len(METRICS), 'last': nan, 'run': [0] * len(METRICS)}
+
+
+def _load_states(stations):
+    keys = [_cache_key(station) for station in stations]
+    cached = cache.get_many(keys)
+    states = [cached.get(key) or _empty_state() for key in keys]
+    return keys, {
+        field: np.array([state[field] for state in states], dtype=float)
+        for field in ('n', 'mean', 'var', 'last', 'run')
+    }
+
+
+def _save_states(keys, states):
+    timeout = getattr(settings, 'QUALITY_STATION_TTL', 60 * 60 * 24 * 30)
+    cache.set_many({
+        key: {field: states[field][i].tolist() for field in states}
+        for i, key in enumerate(keys)
+    }, timeout)
+
+
+def _group_stats(station_idx, values, valid, n_stations):
+    """Per-station count, mean and variance of the valid values of each metric."""
+    counts = np.zeros((n_stations, values.shape[1]))
+    sums = np.zeros_like(counts)
+    squares = np.zeros_like(counts)
+    filled = np.where(valid, values, 0.0)
+    np.add.at(counts, station_idx, valid)
+    np.add.at(sums, station_idx, filled)
+    np.add.at(squares, station_idx, filled ** 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, 0.0)
+        variances = np.where(counts > 1, squares / counts - means ** 2, 0.0)
+    return counts, means, np.maximum(variances, 0.0)
+
+
+def score_matrix(values, station_idx, order, states):
+    """
+    Score a (n, metrics) float matrix. ``order`` sorts the rows by station
+    then time; ``states`` holds per-station history arrays and is updated in
+    place. Returns scores in the original row order.
+    """
+    n, m = values.shape
+    n_stations = states['n'].shape[0]
+    low = np.array([METRIC_RANGES[metric][0] for metric in METRICS])
+    high = np.array([METRIC_RANGES[metric][1] for metric in METRICS])
+
+    present = ~np.isnan(values)
+    in_range = present & (values >= low) & (values <= high)
+    range_score = np.where(present.any(axis=1),
+                           in_range.sum(axis=1) / np.maximum(present.sum(axis=1), 1), 0.0)
+
+    # Z-scores against history, falling back to the batch itself for new stations.
+    batch_n, batch_mean, batch_var = _group_stats(station_idx, values, in_range, n_stations)
+    use_history = states['n'] >= MIN_HISTORY
+    ref_mean = np.where(use_history, states['mean'], batch_mean)
+    ref_std = np.sqrt(np.where(use_history, states['var'], batch_var))
+    enough = (use_history | (batch_n >= MIN_HISTORY))[station_idx]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(values - ref_mean[station_idx]) / ref_std[station_idx]
+    outlier = in_range & enough & (ref_std[station_idx] > 0) & (z > Z_THRESHOLD)
+
+    # Spikes and flatlines need time order within each station.
+    sorted_values = values[order]
+    sorted_station = station_idx[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_station[1:] != sorted_station[:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = sorted_station[1:] != sorted_station[:-1]
+
+    previous = np.empty_like(sorted_values)
+    previous[1:] = sorted_values[:-1]
+    previous[first] = states['last'][sorted_station[first]]
+    following = np.empty_like(sorted_values)
+    following[:-1] = sorted_values[1:]
+    following[last] = np.nan
+
+    std_sorted = ref_std[sorted_station]
+    with np.errstate(invalid='ignore'):
+        jump_in = np.abs(sorted_values - previous) > SPIKE_THRESHOLD * std_sorted
+        jump_out = np.abs(sorted_values - following) > SPIKE_THRESHOLD * std_sorted
+        reverses = np.sign(sorted_values - previous) == np.sign(sorted_values - following)
+    spike_sorted = jump_in & jump_out & reverses & (std_sorted > 0) & in_range[order]
+
+    # Run length of identical consecutive values; a run that continues the
+    # station's previous batch starts from the length carried in its window.
+    same = sorted_values == previous
+    starts = ~same | first[:, None]
+    run = np.zeros((n, m))
+    positions = np.arange(n)
+    for column in range(m):
+        group = np.cumsum(starts[:, column]) - 1
+        start_pos = np.flatnonzero(starts[:, column])
+        carried = np.where(
+            first[start_pos] & same[start_pos, column],
+            states['run'][sorted_station[start_pos], column], 0,
+        )
+        run[:, column] = positions - start_pos[group] + 1 + carried[group]
+    flat_sorted = (run >= FLATLINE_RUN) & FLATLINE_METRICS & in_range[order]
+
+    spike = np.zeros_like(spike_sorted)
+    spike[order] = spike_sorted
+    flat = np.zeros_like(flat_sorted)
+    flat[order] = flat_sorted
+
+    checked = np.maximum(present.sum(axis=1), 1)
+    score = range_score
+    score = score * (1 - PENALTIES['outlier'] * outlier.sum(axis=1) / checked)
+    score = score * (1 - PENALTIES['spike'] * spike.sum(axis=1) / checked)
+    score = score * (1 - PENALTIES['flatline'] * flat.sum(axis=1) / checked)
+
+    # Fold this batch into each station's window; bad readings are left out.
+    good = in_range & ~outlier & ~spike
+    add_n, add_mean, add_var = _group_stats(station_idx, values, good, n_stations)
+    window = _window()
+    old_n = np.minimum(states['n'], window - np.minimum(add_n, window - 1))
+    total = old_n + add_n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = add_mean - states['mean']
+        new_mean = np.where(total > 0, states['mean'] + delta * add_n / total, states['mean'])
+        new_var = np.where(
+            total > 0,
+            (old_n * states['var'] + add_n * add_var + delta ** 2 * old_n * add_n / total) / total,
+            states['var'],
+        )
+    states['n'] = np.minimum(total, window)
+    states['mean'] = new_mean
+    states['var'] = new_var
+
+    last_rows = np.flatnonzero(last)
+    last_values = sorted_values[last_rows]
+    has_value = ~np.isnan(last_values)
+    stations_last = sorted_station[last_rows]
+    states['last'][stations_last] = np.where(has_value, last_values, states['last'][stations_last])
+    states['run'][stations_last] = run[last_rows]
+
+    return np.clip(score, 0.0, 1.0)
+
+
+def _station_indices(keys):
+    """Map reading keys ``(x, y, timestamp, source)`` to station indices and station tuples."""
+    stations = {}
+    lookup = {}
+    station_idx = np.empty(len(keys), dtype=np.intp)
+    for i, (x, y, _, source) in enumerate(keys):
+        index = lookup.get((x, y, source))
+        if index is None:
+            # Distinct locations are few, so rounding happens once per location.
+            station = (round(x, 4), round(y, 4), source)
+            index = lookup[(x, y, source)] = stations.setdefault(station, len(stations))
+        station_idx[i] = index
+    return station_idx, list(stations)
+
+
+def score_readings(readings, keys=None, update_history=True):
+    """
+    Compute quality scores for a batch of EnvironmentalData instances and
+    store them on ``quality_score`` (multiplied with the score the source
+    supplied, which is remembered so scoring a reading twice never
+    compounds). Returns the score array.
+
+    ``keys`` are the readings' ``(x, y, timestamp, source)`` identity tuples
+    when the caller already has them (see ingest.reading_key), which saves
+    reading coordinates back out of GEOS. With ``update_history=False`` the
+    batch is scored against the station windows without being folded into
+    them, for rows that were seen before.
+    """
+    readings = list(readings)
+    if not readings:
+        return np.empty(0)
+    if keys is None:
+        keys = [(reading.location.x, reading.location.y, reading.timestamp, reading.source)
+                for reading in readings]
+
+    station_idx, stations = _station_indices(keys)
+    columns = np.array([attrgetter(*METRICS)(reading) for reading in readings], dtype=object)
+    values = np.where(np.equal(columns, None), np.nan, columns).astype(float)
+    timestamps = np.array([key[2].timestamp() for key in keys])
+    order = np.lexsort((timestamps, station_idx))
+
+    cache_keys, states = _load_states(stations)
+    scores = score_matrix(values, station_idx, order, states)
+    if update_history:
+        _save_states(cache_keys, states)
+
+    supplied = np.array([
+        reading.__dict__.setdefault('_supplied_quality_score', reading.quality_score) for reading in readings
+    ], dtype=object)
+    supplied = np.clip(np.where(np.equal(supplied, None), 1.0, supplied).astype(float), 0.0, 1.0)
+    for reading, value in zip(readings, np.round(scores * supplied, 4).tolist()):
+        reading.quality_score = value
+    return scores
@@ -0,0 +1,275 @@
+"""
+Retention and compaction of environmental readings.
+
+Policies come from ``settings.DATA_RETENTION`` and are keyed by source::
+
+    DATA_RETENTION = {
+        'satellite': {'raw_days': 90, 'hourly_days': 365, 'daily_days': None},
+    }
+
+Raw rows older than ``raw_days`` are folded into hourly aggregates, hourly
+aggregates older than ``hourly_days`` into daily ones, and daily aggregates
+older than ``daily_days`` are dropped (``None`` keeps a tier forever).
+
+Every batch is a single transaction that merges into the coarser tier and
+deletes the rows it consumed, so an interrupted run leaves no partial batch
+behind and re-running the job simply picks up where it stopped.
+
+Queries spanning more than the raw window must read both tiers;
+``combined_statistics`` does so for the summary statistics endpoints.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, FloatField, Max, Min, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, TruncHour
+from django.utils import timezone
+
+from .changes import suppress_change_log
+from .data_versions import bump_regions
+from .models import EnvironmentalAggregate, EnvironmentalData
+
+METRICS = EnvironmentalAggregate.METRICS
+AVERAGED = (
+    ('avg_vegetation', 'vegetation_index'),
+    ('avg_soil_moisture', 'soil_moisture'),
+    ('avg_rainfall', 'rainfall'),
+    ('avg_degradation', 'land_degradation_index'),
+)
+DEGRADATION = 'land_degradation_index'
+
+
+def get_policies():
+    return getattr(settings, 'DATA_RETENTION', {})
+
+
+def merge_stats(target, other):
+    # Combine two ``stats`` dicts in place; both sides are additive summaries.
+    for metric, entry in other.items():
+        if not entry or not entry.get('count'):
+            continue
+        current = target.get(metric)
+        if not current or not current.get('count'):
+            target[metric] = dict(entry)
+            continue
+        current['count'] += entry['count']
+        current['sum'] += entry['sum']
+        current['min'] = min(current['min'], entry['min'])
+        current['max'] = max(current['max'], entry['max'])
+    return target
+
+
+def _stat(metric, field):
+    return Cast(KT(f'stats__{metric}__{field}'), FloatField())
+
+
+def _statistics_expressions():
+    raw = {'data_points': Count('id'), 'low': Min(DEGRADATION), 'high': Max(DEGRADATION)}
+    compacted = {
+        'data_points': Coalesce(Sum('sample_count'), 0),
+        'low': Min(_stat(DEGRADATION, 'min')),
+        'high': Max(_stat(DEGRADATION, 'max')),
+    }
+    for name, metric in AVERAGED:
+        raw[f'{name}_count'] = Count(metric)
+        raw[f'{name}_sum'] = Sum(metric)
+        compacted[f'{name}_count'] = Sum(_stat(metric, 'count'))
+        compacted[f'{name}_sum'] = Sum(_stat(metric, 'sum'))
+    return raw, compacted
+
+
+def _combine_statistics(parts):
+    stats = {'data_points': sum(int(part['data_points'] or 0) for part in parts)}
+    for name, _ in AVERAGED:
+        count = sum(part[f'{name}_count'] or 0 for part in parts)
+        stats[name] = sum(part[f'{name}_sum'] or 0 for part in parts) / count if count else None
+    highs = [part['high'] for part in parts if part['high'] is not None]
+    lows = [part['low'] for part in parts if part['low'] is not None]
+    stats['max_degradation'] = max(highs) if highs else None
+    stats['min_degradation'] = min(lows) if lows else None
+    return stats
+
+
+def combined_statistics(readings, aggregates):
+    """
+    The RegionViewSet.statistics summary over raw ``readings`` plus the
+    compacted ``aggregates`` that replaced older ones, both reduced in SQL.
+    """
+    raw, compacted = _statistics_expressions()
+    return _combine_statistics([readings.aggregate(**raw), aggregates.aggregate(**compacted)])
+
+
+def _write_buckets(buckets, resolution):
+    """
+    Merge ``{(region_id, source, period_start): (sample_count, stats)}`` into
+    the aggregate table. Must run inside the caller's transaction.
+    """
+    if not buckets:
+        return
+    region_ids = {key[0] for key in buckets}
+    sources = {key[1] for key in buckets}
+    periods = {key[2] for key in buckets}
+    existing = {
+        (agg.region_id, agg.source, agg.period_start): agg
+        for agg in EnvironmentalAggregate.objects.select_for_update().filter(
+            resolution=resolution,
+            region_id__in=region_ids,
+            source__in=sources,
+            period_start__in=periods,
+        )
+    }
+
+    to_create, to_update = [], []
+    for key, (count, stats) in buckets.items():
+        agg = existing.get(key)
+        if agg is None:
+            region_id, source, period_start = key
+            to_create.append(EnvironmentalAggregate(
+                region_id=region_id, source=source, resolution=resolution,
+                period_start=period_start, sample_count=count, stats=stats,
+            ))
+        else:
+            agg.sample_count += count
+            agg.stats = merge_stats(agg.stats, stats)
+            agg.updated_at = timezone.now()
+            to_update.append(agg)
+
+    EnvironmentalAggregate.objects.bulk_create(to_create)
+    EnvironmentalAggregate.objects.bulk_update(to_update, ['sample_count', 'stats', 'updated_at'])
+
+
+def _compact_raw_batch(source, cutoff, batch_size):
+    with transaction.atomic():
+        ids = list(
+            EnvironmentalData.objects
+            .filter(source=source, timestamp__lt=cutoff)
+            .order_by('timestamp')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        aggregates = {}
+        for metric in METRICS:
+            aggregates[f'{metric}__count'] = Count(metric)
+            aggregates[f'{metric}__sum'] = Sum(metric)
+            aggregates[f'{metric}__min'] = Min(metric)
+            aggregates[f'{metric}__max'] = Max(metric)
+
+        rows = (
+            EnvironmentalData.objects
+            .filter(id__in=ids)
+            .annotate(period=TruncHour('timestamp'))
+            .values('region_id', 'period')
+            .annotate(n=Count('id'), **aggregates)
+            .order_by()
+        )
+
+        buckets = {}
+        for row in rows:
+            stats = {}
+            for metric in METRICS:
+                count = row[f'{metric}__count']
+                if count:
+                    stats[metric] = {
+                        'count': count,
+                        'sum': row[f'{metric}__sum'],
+                        'min': row[f'{metric}__min'],
+                        'max': row[f'{metric}__max'],
+                    }
+            buckets[(row['region_id'], source, row['period'])] = (row['n'], stats)
+
+        _write_buckets(buckets, 'hour')
+        # The readings live on in the aggregates: no per-row tombstones or
+        # version bumps, one bump per region instead.
+        with suppress_change_log():
+            EnvironmentalData.objects.filter(id__in=ids).delete()
+        bump_regions(region_id for region_id, _, _ in buckets)
+        return len(ids)
+
+
+def _start_of_day(value):
+    tz = timezone.get_current_timezone() if timezone.is_aware(value) else None
+    day = value.astimezone(tz).date() if tz else value.date()
+    start = datetime.combine(day, dt_time.min)
+    return timezone.make_aware(start, tz) if tz else start
+
+
+def _compact_hourly_batch(source, cutoff, batch_size):
+    with transaction.atomic():
+        hourly = list(
+            EnvironmentalAggregate.objects
+            .filter(source=source, resolution='hour', period_start__lt=cutoff)
+            .order_by('period_start')[:batch_size]
+        )
+        if not hourly:
+            return 0
+
+        buckets = defaultdict(lambda: [0, {}])
+        for agg in hourly:
+            bucket = buckets[(agg.region_id, source, _start_of_day(agg.period_start))]
+            bucket[0] += agg.sample_count
+            merge_stats(bucket[1], agg.stats)
+
+        _write_buckets({key: tuple(value) for key, value in buckets.items()}, 'day')
+        EnvironmentalAggregate.objects.filter(id__in=[agg.id for agg in hourly]).delete()
+        return len(hourly)
+
+
+def _expire_daily_batch(source, cutoff, batch_size):
+    with transaction.atomic():
+        ids = list(
+            EnvironmentalAggregate.objects
+            .filter(source=source, resolution='day', period_start__lt=cutoff)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            EnvironmentalAggregate.objects.filter(id__in=ids).delete()
+        return len(ids)
+
+
+def run_compaction(sources=None, batch_size=None, pause=None, now=None, log=None):
+    """
+    Apply every configured retention policy. Work is done in batches of at
+    most ``batch_size`` rows with ``pause`` seconds between them so the job
+    never holds long write locks against foreground traffic.
+
+    Returns ``{source: {'raw': n, 'hourly': n, 'daily': n}}`` with the number
+    of rows consumed in each tier.
+    """
+    batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 5000)
+    pause = getattr(settings, 'RETENTION_BATCH_PAUSE', 0.5) if pause is None else pause
+    now = now or timezone.now()
+
+    tiers = (
+        ('raw', 'raw_days', _compact_raw_batch),
+        ('hourly', 'hourly_days', _compact_hourly_batch),
+        ('daily', 'daily_days', _expire_daily_batch),
+    )
+
+    summary = {}
+    for source, policy in get_policies().items():
+        if sources and source not in sources:
+            continue
+        summary[source] = {tier: 0 for tier, _, _ in tiers}
+        for tier, key, step in tiers:
+            days = policy.get(key)
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            while True:
+                processed = step(source, cutoff, batch_size)
+                if not processed:
+                    break
+                summary[source][tier] += processed
+                if log:
+                    log(f'{source}: compacted {processed} {tier} rows')
+                if processed < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+    return summary
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .changes import change_log_suppressed, record_changes
+from .data_versions import bump_regions
+from .models import EnvironmentalData
+
+# Sent once per batch of newly written EnvironmentalData rows, whatever the
+# ingest path (API create, file upload, ...). Receivers get ``readings``, a
+# list of EnvironmentalData instances, so they can process the whole batch in
+# one pass instead of hooking post_save row by row.
+readings_ingested = Signal()
+
+
+@receiver(readings_ingested)
+def publish_live_feed(sender, readings, **kwargs):
+    from .streaming import publish_readings
+    publish_readings(readings)
+
+
+@receiver(readings_ingested)
+def bump_ingested_versions(sender, readings, **kwargs):
+    bump_regions(reading.region_id for reading in readings)
+
+
+@receiver([post_save, post_delete], sender=EnvironmentalData)
+def bump_reading_version(sender, instance, **kwargs):
+    if not change_log_suppressed():
+        bump_regions([instance.region_id])
+
+
+@receiver(post_save, sender=EnvironmentalData)
+def record_reading_saved(sender, instance, using, **kwargs):
+    record_changes([instance.pk], 'upsert', using=using)
+
+
+@receiver(post_delete, sender=EnvironmentalData)
+def record_reading_deleted(sender, instance, using, **kwargs):
+    record_changes([instance.pk], 'delete', using=using)
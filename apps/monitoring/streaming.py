@@ -0,0 +1,229 @@
+"""
+Live feed of new readings.
+
+Every ingested batch is serialized once and handed to a broker. The broker
+delivers it to the ``FeedHub`` of each web process, and the hub fans it out
+to the matching subscribers. Each subscriber has a bounded queue: a consumer
+that falls behind loses its oldest messages and is told how many it missed
+(``lagged`` event), so one slow client can never hold up ingestion or grow
+memory without bound.
+
+The broker is chosen with ``settings.LIVE_FEED_BROKER``. ``LocalBroker``
+keeps everything inside the process, so it only works when ingestion runs in
+the web process (eager Celery). ``RedisBroker`` relays batches over Redis
+pub/sub so every worker process sees every write, including those made by
+Celery workers.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = (
+    'vegetation_index', 'soil_moisture', 'rainfall', 'land_degradation_index',
+    'temperature', 'wind_speed', 'humidity', 'quality_score',
+)
+
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+
+def serialize_reading(reading):
+    message = {
+        'id': reading.pk,
+        'region': reading.region_id,
+        'source': reading.source,
+        'timestamp': reading.timestamp.isoformat() if reading.timestamp else None,
+        'latitude': reading.location.y,
+        'longitude': reading.location.x,
+    }
+    for field in METRIC_FIELDS:
+        message[field] = getattr(reading, field)
+    return message
+
+
+class Subscription:
+    def __init__(self, region_ids=None, bbox=None, maxsize=None):
+        self.region_ids = set(region_ids or ())
+        self.bbox = bbox
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize or getattr(settings, 'LIVE_FEED_QUEUE_SIZE', 1000))
+        self.dropped = 0
+
+    def matches(self, message):
+        if self.region_ids and message['region'] not in self.region_ids:
+            return False
+        if self.bbox:
+            min_lng, min_lat, max_lng, max_lat = self.bbox
+            return (min_lng <= message['longitude'] <= max_lng
+                    and min_lat <= message['latitude'] <= max_lat)
+        return True
+
+    def offer(self, messages):
+        # Runs on the subscriber's event loop.
+        for message in messages:
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(message)
+
+    async def batches(self, max_batch, linger, heartbeat):
+        """Yield lists of messages; an empty list means the heartbeat expired."""
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield []
+                continue
+            if linger:
+                await asyncio.sleep(linger)
+            batch = [first]
+            while len(batch) < max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            yield batch
+
+
+class FeedHub:
+    def __init__(self, broker):
+        self._lock = threading.Lock()
+        self._by_region = defaultdict(set)
+        self._unscoped = set()
+        self.broker = broker
+        broker.attach(self)
+
+    def subscribe(self, region_ids=None, bbox=None):
+        subscription = Subscription(region_ids, bbox)
+        with self._lock:
+            if subscription.region_ids:
+                for region_id in subscription.region_ids:
+                    self._by_region[region_id].add(subscription)
+            else:
+                self._unscoped.add(subscription)
+        self.broker.on_subscribe()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._unscoped.discard(subscription)
+            for region_id in subscription.region_ids:
+                subscribers = self._by_region.get(region_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_region[region_id]
+
+    def publish(self, messages):
+        if messages:
+            self.broker.publish(messages)
+
+    def dispatch(self, messages):
+        """Fan a batch out to local subscribers; safe to call from any thread."""
+        pending = defaultdict(list)
+        with self._lock:
+            for message in messages:
+                candidates = self._by_region.get(message['region'], ())
+                for subscription in (*candidates, *self._unscoped):
+                    if subscription.matches(message):
+                        pending[subscription].append(message)
+        for subscription, batch in pending.items():
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, batch)
+            except RuntimeError:
+                # The subscriber's loop is closed; it will be unsubscribed
+                # when its response generator is torn down.
+                pass
+
+
+class LocalBroker:
+    """Delivers batches to subscribers in the current process only."""
+
+    def attach(self, hub):
+        self.hub = hub
+
+    def on_subscribe(self):
+        pass
+
+    def publish(self, messages):
+        self.hub.dispatch(messages)
+
+
+class RedisBroker:
+    """Relays batches over Redis pub/sub so every process sees every write."""
+
+    def __init__(self, url=None, channel=None):
+        import redis
+
+        self.url = url or getattr(settings, 'LIVE_FEED_REDIS_URL', settings.CELERY_BROKER_URL)
+        self.channel = channel or getattr(settings, 'LIVE_FEED_CHANNEL', 'dmas:readings')
+        self.client = redis.Redis.from_url(self.url)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def attach(self, hub):
+        self.hub = hub
+
+    def on_subscribe(self):
+        # Only processes that actually serve streams need a listener thread.
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='live-feed-redis', daemon=True)
+                self._listener.start()
+
+    def publish(self, messages):
+        try:
+            self.client.publish(self.channel, json.dumps(messages))
+        except Exception:
+            logger.exception('Failed to publish %d readings to the live feed', len(messages))
+
+    def _listen(self):
+        # Reconnect with backoff if Redis restarts or the connection drops;
+        # batches published while disconnected are lost, as with any pub/sub.
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                delay = RECONNECT_MIN_DELAY
+                for item in pubsub.listen():
+                    try:
+                        self.hub.dispatch(json.loads(item['data']))
+                    except Exception:
+                        logger.exception('Dropping malformed live feed message')
+            except Exception:
+                logger.warning('Live feed lost its Redis connection; retrying in %.0fs', delay, exc_info=True)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                broker_path = getattr(settings, 'LIVE_FEED_BROKER', 'apps.monitoring.streaming.LocalBroker')
+                _hub = FeedHub(import_string(broker_path)())
+    return _hub
+
+
+def publish_readings(readings):
+    get_hub().publish([serialize_reading(reading) for reading in readings if reading.location is not None])
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
@@ -0,0 +1,241 @@
+"""
+Interpolated metric surfaces for a region.
+
+A region's recent readings are averaged per location. A regular grid over
+the region's extent is filled by inverse-distance weighting, using the
+``SURFACE_NEIGHBOURS`` nearest readings of each cell, and masked to
+``Region.boundary``. Neighbours come from scipy's KD-tree when scipy is
+installed, or from a chunked brute-force search otherwise.
+
+Rasters are encoded once, as an RGBA PNG or a float32 ``.npy`` array, and
+cached by (region, metric, window, resolution, encoding). The key includes
+the region's data version, so new readings produce a fresh surface, and the
+window start rounded down to ``SURFACE_TIME_BUCKET`` seconds, so readings
+also age out of the window.
+"""
+import hashlib
+import io
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .data_versions import region_versions
+from .models import EnvironmentalData
+from .quality import METRIC_RANGES
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # pragma: no cover - optional dependency
+    cKDTree = None
+
+SURFACE_METRICS = ('land_degradation_index', 'vegetation_index', 'soil_moisture', 'rainfall',
+                   'temperature', 'humidity')
+ENCODINGS = {'png': 'image/png', 'npy': 'application/octet-stream'}
+SURFACE_NEIGHBOURS = 12
+SURFACE_POWER = 2.0
+MAX_RESOLUTION = 1024
+BRUTE_FORCE_CHUNK = 2048
+MASK_BLOCK = 4 * 1024 * 1024
+CACHE_PREFIX = 'surface:'
+
+# Colour ramp for PNG output: low values green, high values red.
+RAMP = np.array([
+    [26, 150, 65],
+    [166, 217, 106],
+    [255, 255, 191],
+    [253, 174, 97],
+    [215, 25, 28],
+], dtype=float)
+
+
+def station_values(region, metric, since):
+    """Mean of ``metric`` per reading location as (xy, values) arrays."""
+    rows = (
+        EnvironmentalData.objects
+        .filter(region=region, timestamp__gte=since)
+        .exclude(**{f'{metric}__isnull': True})
+        .values_list('location', metric)
+    )
+    points, values = [], []
+    for location, value in rows.iterator(chunk_size=5000):
+        points.append((location.x, location.y))
+        values.append(value)
+    if not points:
+        return np.empty((0, 2)), np.empty(0)
+
+    points = np.round(np.array(points), 6)
+    unique, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    sums = np.bincount(inverse, weights=np.array(values, dtype=float))
+    counts = np.bincount(inverse)
+    return unique, sums / counts
+
+
+def polygon_mask(xs, ys, polygon):
+    """
+    Even-odd test of grid cell centres against a polygon and its holes.
+
+    ``xs``/``ys`` come from ``np.meshgrid``, so every row shares one y. For a
+    block of rows, the x where each edge crosses the row is computed in one
+    broadcast; a cell is inside when an odd number of crossings lies at or
+    left of it, which is one ``searchsorted`` per row.
+    """
+    edges = []
+    for ring in polygon:
+        coords = np.asarray(ring.coords, dtype=float)
+        edges.append(np.column_stack([coords[:-1], coords[1:]]))
+    edges = np.concatenate(edges)
+    edges = edges[edges[:, 1] != edges[:, 3]]
+    ax, ay, bx, by = edges.T
+    slope = (bx - ax) / (by - ay)
+
+    row_ys, col_xs = ys[:, 0], xs[0, :]
+    inside = np.zeros(xs.shape, dtype=bool)
+    block = max(1, MASK_BLOCK // max(len(edges), 1))
+    for start in range(0, len(row_ys), block):
+        y = row_ys[start:start + block, None]
+        crosses = (ay > y) != (by > y)
+        x_cross = np.where(crosses, ax + (y - ay) * slope, np.inf)
+        x_cross.sort(axis=1)
+        for offset, crossings in enumerate(x_cross):
+            inside[start + offset] = np.searchsorted(crossings, col_xs, side='right') % 2 == 1
+    return inside
+
+
+def _nearest(points, queries, k):
+    if cKDTree is not None:
+        distances, indices = cKDTree(points).query(queries, k=k)
+        return distances.reshape(len(queries), k), indices.reshape(len(queries), k)
+
+    distances = np.empty((len(queries), k))
+    indices = np.empty((len(queries), k), dtype=np.intp)
+    for start in range(0, len(queries), BRUTE_FORCE_CHUNK):
+        chunk = queries[start:start + BRUTE_FORCE_CHUNK]
+        squared = ((chunk[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k] if k < len(points) else \
+            np.broadcast_to(np.arange(len(points)), (len(chunk), len(points)))
+        distances[start:start + len(chunk)] = np.sqrt(np.take_along_axis(squared, nearest, axis=1))
+        indices[start:start + len(chunk)] = nearest
+    return distances, indices
+
+
+def idw(points, values, queries, k=SURFACE_NEIGHBOURS, power=SURFACE_POWER):
+    k = min(k, len(points))
+    distances, indices = _nearest(points, queries, k)
+    exact = distances == 0
+    with np.errstate(divide='ignore'):
+        weights = np.where(exact, 0.0, 1.0 / distances ** power)
+    result = (weights * values[indices]).sum(axis=1) / weights.sum(axis=1)
+    # A cell centre that sits on a reading takes its value.
+    hit = exact.any(axis=1)
+    result[hit] = values[indices[hit, exact[hit].argmax(axis=1)]]
+    return result
+
+
+def window_start(days):
+    """Start of a ``days`` window, floored to the time bucket so it is stable between requests."""
+    bucket = getattr(settings, 'SURFACE_TIME_BUCKET', 60 * 60)
+    now = int(timezone.now().timestamp())
+    return datetime.fromtimestamp(now - now % bucket, tz=dt_timezone.utc) - timedelta(days=days)
+
+
+def build_surface(region, metric, since, resolution):
+    """
+    Return ``(grid, bounds)``. ``grid`` is a float32 (rows, cols) array, north
+    row first, with NaN outside the boundary or when there is no data.
+    ``bounds`` is (west, south, east, north).
+    """
+    points, values = station_values(region, metric, since)
+    if region.boundary is not None:
+        west, south, east, north = region.boundary.extent
+    elif len(points):
+        (west, south), (east, north) = points.min(axis=0), points.max(axis=0)
+    else:
+        return np.full((1, 1), np.nan, dtype=np.float32), (0.0, 0.0, 0.0, 0.0)
+
+    cell = max(east - west, north - south, 1e-9) / resolution
+    cols = max(int(np.ceil((east - west) / cell)), 1)
+    rows = max(int(np.ceil((north - south) / cell)), 1)
+    xs, ys = np.meshgrid(west + (np.arange(cols) + 0.5) * cell,
+                         north - (np.arange(rows) + 0.5) * cell)
+
+    mask = polygon_mask(xs, ys, region.boundary) if region.boundary is not None else np.ones(xs.shape, bool)
+    grid = np.full(xs.shape, np.nan, dtype=np.float32)
+    if len(points) and mask.any():
+        # Scale longitude so distances are roughly isotropic at this latitude.
+        scale = np.array([np.cos(np.radians((north + south) / 2)), 1.0])
+        queries = np.column_stack([xs[mask], ys[mask]]) * scale
+        grid[mask] = idw(points * scale, values, queries)
+    return grid, (west, south, west + cols * cell, north)
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+
+def encode_png(grid, value_range):
+    """RGBA PNG with cells outside the surface fully transparent."""
+    low, high = value_range
+    valid = ~np.isnan(grid)
+    scaled = np.clip((np.nan_to_num(grid, nan=low) - low) / ((high - low) or 1.0), 0.0, 1.0)
+    position = scaled * (len(RAMP) - 1)
+    lower = np.minimum(position.astype(int), len(RAMP) - 2)
+    fraction = (position - lower)[..., None]
+    rgb = RAMP[lower] * (1 - fraction) + RAMP[lower + 1] * fraction
+
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.round(rgb)
+    rgba[..., 3] = np.where(valid, 255, 0)
+
+    height, width = grid.shape
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)], axis=1)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def encode_npy(grid):
+    buffer = io.BytesIO()
+    np.save(buffer, grid, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def surface_cache_key(region, metric, since, resolution, encoding):
+    version = region_versions([region.pk])[region.pk]
+    return f'{CACHE_PREFIX}{region.pk}:{metric}:{int(since.timestamp())}:{resolution}:{encoding}:{version}'
+
+
+def region_surface(region, metric, days, resolution, encoding='png'):
+    """
+    Return a dict with the encoded raster (``content``), its ``content_type``,
+    ``bounds``, value range and an ``etag``. It is built at most once per data
+    version and time bucket.
+    """
+    since = window_start(days)
+    key = surface_cache_key(region, metric, since, resolution, encoding)
+    surface = cache.get(key)
+    if surface is not None:
+        return surface
+
+    grid, bounds = build_surface(region, metric, since, resolution)
+    value_range = METRIC_RANGES[metric]
+    content = encode_png(grid, value_range) if encoding == 'png' else encode_npy(grid)
+    surface = {
+        'content': content,
+        'content_type': ENCODINGS[encoding],
+        'bounds': bounds,
+        'value_range': value_range,
+        'shape': grid.shape,
+        'etag': hashlib.blake2b(key.encode(), digest_size=12).hexdigest(),
+    }
+    cache.set(key, surface, getattr(settings, 'SURFACE_CACHE_TIMEOUT', 60 * 60 * 24))
+    return surface
@@ -0,0 +1,20 @@
+from celery import shared_task
+from .ingest import process_data_upload as ingest_upload
+from .models import DataUpload
+from .retention import run_compaction
+
+@shared_task
+def compact_environmental_data():
+    # Scheduled through django_celery_beat; safe to re-run after a crash.
+    return run_compaction()
+
+@shared_task
+def process_data_upload(upload_id):
+    upload = DataUpload.objects.select_related('region', 'uploaded_by').get(id=upload_id)
+    ingest_upload(upload)
+    return {
+        'status': upload.status,
+        'inserted': upload.inserted_records,
+        'updated': upload.updated_records,
+        'skipped': upload.skipped_records,
+    }
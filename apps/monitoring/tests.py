@@ -1,3 +1,436 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.gis.geos import Point, Polygon
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .changes import record_changes, suppress_change_log
+from .ingest import _existing_keys, reading_key, upsert_readings
+from .models import EnvironmentalData, Region, UploadSession
+from .quality import METRICS, _load_states, score_readings
+from .retention import _combine_statistics, merge_stats, run_compaction
+from .serializers import PolygonQuerySerializer
+from .streaming import RedisBroker
+from .surface import encode_png, idw, polygon_mask, surface_cache_key, window_start
+from .uploads import ChunkError, part_path, write_chunk
+from .views import EnvironmentalDataViewSet
+
+START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+STATION = (36.8219, -1.2921, 'ground')
+
+
+def make_reading(hour, vegetation=0.5):
+    return EnvironmentalData(
+        location=Point(36.8219, -1.2921, srid=4326),
+        timestamp=START + timedelta(hours=hour),
+        date=START.date(),
+        source='ground',
+        region=Region(id=1, name='Nairobi', code='NBO'),
+        vegetation_index=vegetation,
+        soil_moisture=40.0,
+        rainfall=5.0,
+        land_degradation_index=0.3,
+    )
+
+
+class UpsertQualityScoringTests(SimpleTestCase):
+    """upsert_readings(score=True) against a fake table, so only scoring is exercised."""
+
+    def setUp(self):
+        cache.clear()
+        self.stored = {}
+        patches = [
+            mock.patch('apps.monitoring.ingest._existing_keys', side_effect=self.existing_keys),
+            mock.patch.object(EnvironmentalData.objects, 'bulk_create', side_effect=self.bulk_create),
+            mock.patch.object(EnvironmentalData.objects, 'bulk_update', side_effect=self.bulk_update),
+            mock.patch('apps.monitoring.ingest.record_changes'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def existing_keys(self, readings):
+        keys = {reading_key(reading) for reading in readings}
+        return {key: pk for key, pk in self.stored.items() if key in keys}
+
+    def bulk_create(self, readings, **kwargs):
+        for reading in readings:
+            self.stored.setdefault(reading_key(reading), len(self.stored) + 1)
+        return readings
+
+    def bulk_update(self, readings, fields, **kwargs):
+        for reading in readings:
+            self.assertEqual(self.stored[reading_key(reading)], reading.pk)
+        return len(readings)
+
+    def history_count(self):
+        _, states = _load_states([STATION])
+        return states['n'][0][METRICS.index('vegetation_index')]
+
+    def test_duplicates_feed_station_history_once(self):
+        readings = [make_reading(hour, 0.4 + hour / 100) for hour in range(12)]
+        duplicates = [make_reading(hour, 0.4 + hour / 100) for hour in range(12)]
+
+        summary, written = upsert_readings(readings + duplicates, score=True)
+
+        self.assertEqual(summary['inserted'], 12)
+        self.assertEqual(summary['skipped'], 12)
+        self.assertEqual(self.history_count(), 12)
+        self.assertEqual(len(written), 12)
+
+    def test_skipped_rows_are_not_scored(self):
+        upsert_readings([make_reading(hour) for hour in range(12)], score=True)
+        again = [make_reading(hour) for hour in range(12)]
+
+        summary, _ = upsert_readings(again, mode='ignore', score=True)
+
+        self.assertEqual(summary['skipped'], 12)
+        self.assertEqual(self.history_count(), 12)
+        self.assertTrue(all(reading.quality_score == 1.0 for reading in again))
+
+    def test_reingested_rows_do_not_grow_history(self):
+        upsert_readings([make_reading(hour, 0.4 + hour / 100) for hour in range(12)], score=True)
+
+        summary, written = upsert_readings(
+            [make_reading(hour, 0.4 + hour / 100) for hour in range(12)], mode='update', score=True
+        )
+
+        self.assertEqual(summary['updated'], 12)
+        self.assertEqual(len(written), 12)
+        self.assertEqual(self.history_count(), 12)
+
+    def test_rescoring_does_not_compound_supplied_score(self):
+        reading = make_reading(0)
+        reading.quality_score = 0.5
+        score_readings([reading], update_history=False)
+        first = reading.quality_score
+        score_readings([reading], update_history=False)
+        self.assertEqual(reading.quality_score, first)
+
+
+class ExistingKeysTests(SimpleTestCase):
+    def test_unsnapped_rows_match_and_other_stations_are_dropped(self):
+        reading = make_reading(0)
+        rows = [
+            (7, Point(36.82190004, -1.29209996, srid=4326), reading.timestamp, 'ground'),
+            (8, Point(36.9, -1.3, srid=4326), reading.timestamp, 'ground'),
+        ]
+        with mock.patch.object(EnvironmentalData.objects, 'using') as using:
+            using.return_value.filter.return_value.values_list.return_value = rows
+            existing = _existing_keys([reading])
+
+        self.assertEqual(existing, {reading_key(reading): 7})
+        self.assertIn('location__intersects', using.return_value.filter.call_args.kwargs)
+
+
+class UpsertChangeLogTests(SimpleTestCase):
+    """Only rows upsert_readings actually writes reach the change feed."""
+
+    def setUp(self):
+        self.rows = []
+        patches = [
+            mock.patch.object(EnvironmentalData.objects, 'using'),
+            mock.patch.object(EnvironmentalData.objects, 'bulk_create', side_effect=self.bulk_create),
+            mock.patch.object(EnvironmentalData.objects, 'bulk_update'),
+            mock.patch('apps.monitoring.ingest.record_changes'),
+        ]
+        using, _, _, self.record_changes = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+        using.return_value.filter.return_value.values_list.side_effect = lambda *fields: list(self.rows)
+
+    def bulk_create(self, readings, **kwargs):
+        for reading in readings:
+            self.rows.append((100 + len(self.rows), reading.location, reading.timestamp, reading.source))
+        return readings
+
+    def test_skipped_and_unrelated_rows_are_not_logged(self):
+        self.rows = [
+            # Another station reporting at the same instant from the same source.
+            (5, Point(36.9, -1.3, srid=4326), START, 'ground'),
+            (6, Point(36.8219, -1.2921, srid=4326), START + timedelta(hours=1), 'ground'),
+        ]
+
+        summary, written = upsert_readings([make_reading(0), make_reading(1)], mode='ignore')
+
+        self.assertEqual((summary['inserted'], summary['skipped']), (1, 1))
+        self.assertEqual([reading.pk for reading in written], [102])
+        self.record_changes.assert_called_once_with([102], 'upsert')
+
+    def test_update_logs_only_matched_rows(self):
+        self.rows = [
+            (5, Point(36.9, -1.3, srid=4326), START, 'ground'),
+            (6, Point(36.8219, -1.2921, srid=4326), START, 'ground'),
+        ]
+
+        summary, _ = upsert_readings([make_reading(0)], mode='update')
+
+        self.assertEqual(summary['updated'], 1)
+        self.record_changes.assert_called_once_with([6], 'upsert')
+
+
+class WriteChunkTests(SimpleTestCase):
+    """Chunks that fail validation must leave the part file alone."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.session = UploadSession(
+            id=uuid.uuid4(), file_name='readings.csv', file_type='csv', total_size=8,
+            received_ranges=[[0, 4]], received_bytes=4, status='active',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.path = part_path(self.session)
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as handle:
+            handle.write(b'good\0\0\0\0')
+
+    def test_corrupt_resend_of_received_range_is_rejected(self):
+        digest = hashlib.sha256(b'good').digest()
+        with self.assertRaises(ChunkError) as raised:
+            write_chunk(self.session, io.BytesIO(b'gxod'), 0, 4, digest)
+        self.assertEqual(raised.exception.status, 422)
+        with open(self.path, 'rb') as handle:
+            self.assertEqual(handle.read(4), b'good')
+
+    def test_chunk_after_part_file_moved_is_a_conflict(self):
+        os.remove(self.path)
+        with self.assertRaises(ChunkError) as raised:
+            write_chunk(self.session, io.BytesIO(b'data'), 4, 8, hashlib.sha256(b'data').digest())
+        self.assertEqual(raised.exception.status, 409)
+
+
+class ChangeLogTests(TestCase):
+    """Which entries record_changes hands to the database once the transaction commits."""
+
+    def setUp(self):
+        patch = mock.patch('apps.monitoring.changes._write')
+        self.write = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_savepoint_rollback_discards_its_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_changes([1], 'upsert')
+            try:
+                with transaction.atomic():
+                    record_changes([2], 'delete')
+                    raise RuntimeError('rolled back')
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                record_changes([3], 'upsert')
+
+        self.assertEqual(self.write.call_args_list, [
+            mock.call([1], 'upsert', 'default'),
+            mock.call([3], 'upsert', 'default'),
+        ])
+
+    def test_nothing_is_written_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            record_changes([1, 1, None], 'upsert')
+            self.write.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.write.assert_called_once_with([1], 'upsert', 'default')
+
+    def test_suppressed_writes_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with suppress_change_log():
+                record_changes([1], 'delete')
+        self.assertEqual(callbacks, [])
+        self.write.assert_not_called()
+
+
+class RetentionTests(SimpleTestCase):
+    def test_merge_stats_is_additive(self):
+        target = {'rainfall': {'count': 2, 'sum': 10.0, 'min': 4.0, 'max': 6.0}}
+        merge_stats(target, {
+            'rainfall': {'count': 1, 'sum': 1.0, 'min': 1.0, 'max': 1.0},
+            'humidity': {'count': 3, 'sum': 150.0, 'min': 40.0, 'max': 60.0},
+            'wind_speed': {'count': 0, 'sum': 0.0, 'min': None, 'max': None},
+        })
+        self.assertEqual(target['rainfall'], {'count': 3, 'sum': 11.0, 'min': 1.0, 'max': 6.0})
+        self.assertEqual(target['humidity']['count'], 3)
+        self.assertNotIn('wind_speed', target)
+
+    def test_combined_statistics_weights_by_sample_count(self):
+        raw = {'data_points': 2, 'low': 0.2, 'high': 0.4,
+               'avg_vegetation_count': 2, 'avg_vegetation_sum': 1.0,
+               'avg_soil_moisture_count': 2, 'avg_soil_moisture_sum': 80.0,
+               'avg_rainfall_count': 0, 'avg_rainfall_sum': None,
+               'avg_degradation_count': 2, 'avg_degradation_sum': 0.6}
+        compacted = {'data_points': 6, 'low': 0.1, 'high': 0.9,
+                     'avg_vegetation_count': 6, 'avg_vegetation_sum': 1.8,
+                     'avg_soil_moisture_count': 6, 'avg_soil_moisture_sum': 240.0,
+                     'avg_rainfall_count': None, 'avg_rainfall_sum': None,
+                     'avg_degradation_count': 6, 'avg_degradation_sum': 3.0}
+
+        stats = _combine_statistics([raw, compacted])
+
+        self.assertEqual(stats['data_points'], 8)
+        self.assertAlmostEqual(stats['avg_vegetation'], 0.35)
+        self.assertAlmostEqual(stats['avg_degradation'], 0.45)
+        self.assertIsNone(stats['avg_rainfall'])
+        self.assertEqual((stats['min_degradation'], stats['max_degradation']), (0.1, 0.9))
+
+    @override_settings(DATA_RETENTION={
+        'satellite': {'raw_days': 90, 'hourly_days': None, 'daily_days': 730},
+    })
+    def test_run_compaction_batches_until_a_short_batch(self):
+        raw = mock.Mock(side_effect=[10, 10, 3])
+        daily = mock.Mock(return_value=0)
+        with mock.patch('apps.monitoring.retention._compact_raw_batch', raw), \
+                mock.patch('apps.monitoring.retention._compact_hourly_batch') as hourly, \
+                mock.patch('apps.monitoring.retention._expire_daily_batch', daily):
+            summary = run_compaction(batch_size=10, pause=0, now=START)
+
+        self.assertEqual(summary, {'satellite': {'raw': 23, 'hourly': 0, 'daily': 0}})
+        self.assertEqual(raw.call_count, 3)
+        raw.assert_called_with('satellite', START - timedelta(days=90), 10)
+        hourly.assert_not_called()
+        daily.assert_called_once_with('satellite', START - timedelta(days=730), 10)
+
+
+class RedisBrokerTests(SimpleTestCase):
+    def test_listener_resubscribes_after_connection_loss(self):
+        dropped = mock.Mock()
+        dropped.listen.side_effect = ConnectionError('redis restarted')
+        healthy = mock.Mock()
+        healthy.listen.return_value = iter([{'data': '[{"id": 1}]'}])
+
+        broker = RedisBroker.__new__(RedisBroker)
+        broker.channel = 'dmas:readings'
+        broker.client = mock.Mock()
+        broker.client.pubsub.side_effect = [dropped, healthy]
+        broker.hub = mock.Mock()
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch('apps.monitoring.streaming.time.sleep', side_effect=[None, Stop]) as sleep:
+            with self.assertRaises(Stop):
+                broker._listen()
+
+        broker.hub.dispatch.assert_called_once_with([{'id': 1}])
+        self.assertEqual(sleep.call_args_list, [mock.call(1), mock.call(1)])
+        dropped.close.assert_called_once()
+
+
+class SurfaceTests(SimpleTestCase):
+    def test_polygon_mask_excludes_holes(self):
+        square = Polygon(((0, 0), (4, 0), (4, 4), (0, 4), (0, 0)),
+                         ((1, 1), (2, 1), (2, 2), (1, 2), (1, 1)))
+        xs, ys = np.meshgrid(np.arange(4) + 0.5, 4 - (np.arange(4) + 0.5))
+
+        mask = polygon_mask(xs, ys, square)
+
+        expected = np.ones((4, 4), dtype=bool)
+        expected[2, 1] = False
+        self.assertEqual(mask.tolist(), expected.tolist())
+
+    def test_polygon_mask_matches_geos_on_a_concave_ring(self):
+        shape = Polygon(((0, 0), (6, 0), (6, 6), (3, 2), (0, 6), (0, 0)))
+        xs, ys = np.meshgrid(np.linspace(0.1, 5.9, 30), np.linspace(5.9, 0.1, 30))
+
+        mask = polygon_mask(xs, ys, shape)
+
+        expected = [[shape.contains(Point(x, y)) for x, y in zip(row_x, row_y)]
+                    for row_x, row_y in zip(xs, ys)]
+        self.assertEqual(mask.tolist(), expected)
+
+    def test_idw_honours_readings_and_weights_by_distance(self):
+        points = np.array([[0.0, 0.0], [2.0, 0.0]])
+        values = np.array([1.0, 3.0])
+        queries = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.0]])
+
+        result = idw(points, values, queries)
+        with mock.patch('apps.monitoring.surface.cKDTree', None):
+            brute_force = idw(points, values, queries)
+
+        self.assertEqual(result[:2].tolist(), [1.0, 2.0])
+        self.assertAlmostEqual(result[2], (1.0 / 0.25 + 3.0 / 2.25) / (1 / 0.25 + 1 / 2.25))
+        np.testing.assert_allclose(brute_force, result)
+
+    def test_png_is_transparent_outside_the_surface(self):
+        content = encode_png(np.array([[0.0, 1.0], [np.nan, 0.5]], dtype=np.float32), (0.0, 1.0))
+
+        self.assertEqual(content[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(struct.unpack('>II', content[16:24]), (2, 2))
+        length = struct.unpack('>I', content[33:37])[0]
+        rows = zlib.decompress(content[41:41 + length])
+        self.assertEqual(list(rows[1:9]), [26, 150, 65, 255, 215, 25, 28, 255])
+        self.assertEqual(rows[13], 0)
+        self.assertEqual(list(rows[14:18]), [255, 255, 191, 255])
+
+    @override_settings(SURFACE_TIME_BUCKET=3600)
+    def test_cache_key_is_stable_within_a_bucket_and_follows_versions(self):
+        region = Region(id=1, name='Nairobi', code='NBO')
+        with mock.patch('apps.monitoring.surface.timezone.now', return_value=START + timedelta(minutes=5)):
+            since = window_start(30)
+        with mock.patch('apps.monitoring.surface.timezone.now', return_value=START + timedelta(minutes=55)):
+            self.assertEqual(window_start(30), since)
+
+        with mock.patch('apps.monitoring.surface.region_versions', return_value={1: 7}):
+            key = surface_cache_key(region, 'rainfall', since, 256, 'png')
+        with mock.patch('apps.monitoring.surface.region_versions', return_value={1: 8}):
+            self.assertNotEqual(surface_cache_key(region, 'rainfall', since, 256, 'png'), key)
+
+
+SQUARE = {'type': 'Polygon', 'coordinates': [[[36.7, -1.4], [36.9, -1.4], [36.9, -1.2], [36.7, -1.2], [36.7, -1.4]]]}
+
+
+class WithinPolygonTests(SimpleTestCase):
+    def test_feature_is_unwrapped_to_its_polygon(self):
+        serializer = PolygonQuerySerializer(data={'geometry': {'type': 'Feature', 'geometry': SQUARE}})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        geometry = serializer.validated_data['geometry']
+        self.assertEqual((geometry.geom_type, geometry.srid), ('Polygon', 4326))
+
+    def test_points_and_self_intersecting_rings_are_rejected(self):
+        bowtie = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}
+        for geometry in ({'type': 'Point', 'coordinates': [36.8, -1.3]}, bowtie, 'not geojson'):
+            serializer = PolygonQuerySerializer(data={'geometry': geometry})
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('geometry', serializer.errors)
+
+    def test_statistics_are_aggregated_in_the_database(self):
+        request = APIRequestFactory().post('/', {
+            'geometry': SQUARE, 'start_date': '2024-01-01', 'sources': ['satellite'],
+        }, format='json')
+        force_authenticate(request, user=mock.Mock(is_authenticated=True))
+        queryset = mock.MagicMock()
+        queryset.filter.return_value = queryset
+        queryset.aggregate.return_value = {'data_points': 3, 'avg_rainfall': 4.0}
+
+        with mock.patch.object(EnvironmentalData.objects, 'filter', return_value=queryset) as covered:
+            response = EnvironmentalDataViewSet.as_view({'post': 'within_polygon'})(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'data_points': 3, 'avg_rainfall': 4.0})
+        self.assertEqual(covered.call_args.kwargs['location__coveredby'].geom_type, 'Polygon')
+        queryset.filter.assert_any_call(date__gte=datetime(2024, 1, 1).date())
+        queryset.filter.assert_any_call(source__in=['satellite'])
+        self.assertIn('max_degradation', queryset.aggregate.call_args.kwargs)
+
+    def test_invalid_geometry_is_a_bad_request(self):
+        request = APIRequestFactory().post('/', {'geometry': {'type': 'Point', 'coordinates': [0, 0]}}, format='json')
+        force_authenticate(request, user=mock.Mock(is_authenticated=True))
+        response = EnvironmentalDataViewSet.as_view({'post': 'within_polygon'})(request)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,213 @@
+"""
+Resumable chunked uploads.
+
+A client opens an UploadSession with the final size of the file. It then
+PUTs byte ranges in any order, each with ``Content-Range: bytes
+start-end/total`` and a ``Content-Digest: sha-256=:<base64>:`` header
+(RFC 9530). Every chunk is streamed from the request into a temporary file
+next to the part file while it is hashed, and only copied to its offset in
+the preallocated part file with ``os.pwrite`` once the checksum matches. A
+corrupt chunk, including a bad re-send of a range already received, never
+touches the part file. A client that loses its connection simply re-sends
+the ranges still listed as missing.
+
+When the last byte lands, the DataUpload row is created and, once that
+commits, the part file is renamed into ``data_uploads/`` (``os.replace``, no
+copy) and ingestion is queued.
+"""
+import base64
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import DataUpload, UploadSession
+from .tasks import process_data_upload
+
+READ_SIZE = 1024 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+CONTENT_DIGEST = re.compile(r'sha-256=:([A-Za-z0-9+/]+=*):')
+
+
+class ChunkError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 60 * 60 * 24))
+
+
+def part_path(session):
+    return default_storage.path(f'upload_sessions/{session.id}.part')
+
+
+def merge_range(ranges, start, end):
+    """Add ``[start, end)`` to a sorted list of disjoint ranges, merging neighbours."""
+    merged = []
+    for low, high in sorted([*ranges, [start, end]]):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def parse_content_range(header, total_size):
+    """Return ``(start, end)`` with ``end`` exclusive, raising ChunkError."""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise ChunkError('Content-Range must look like "bytes start-end/total"')
+    start, last, total = (int(value) for value in match.groups())
+    if total != total_size:
+        raise ChunkError(f'Content-Range total must be {total_size}')
+    if start > last or last >= total:
+        raise ChunkError('Content-Range is outside the file', status=416)
+    return start, last + 1
+
+
+def parse_content_digest(header):
+    match = CONTENT_DIGEST.search(header or '')
+    if not match:
+        raise ChunkError('Content-Digest with a sha-256 checksum is required')
+    return base64.b64decode(match.group(1))
+
+
+def start_session(user, region, file_name, file_type, total_size, conflict_mode='ignore'):
+    session = UploadSession.objects.create(
+        uploaded_by=user,
+        region=region,
+        file_name=file_name,
+        file_type=file_type,
+        total_size=total_size,
+        conflict_mode=conflict_mode,
+        expires_at=timezone.now() + _ttl(),
+    )
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Sparse preallocation: chunks can be written at any offset.
+    with open(path, 'wb') as handle:
+        handle.truncate(total_size)
+    return session
+
+
+def _check_active(session):
+    if session.status != 'active':
+        raise ChunkError(f'Upload session is {session.status}', status=409)
+    if session.expires_at <= timezone.now():
+        raise ChunkError('Upload session has expired', status=410)
+
+
+def write_chunk(session, stream, start, end, digest):
+    """Stream ``end - start`` bytes from ``stream`` into the part file and record the range."""
+    _check_active(session)
+    path = part_path(session)
+    checksum = hashlib.sha256()
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as spool:
+        remaining = end - start
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining)) if stream is not None else b''
+            if not data:
+                raise ChunkError('Request body is shorter than its Content-Range')
+            checksum.update(data)
+            spool.write(data)
+            remaining -= len(data)
+
+        if checksum.digest() != digest:
+            raise ChunkError('Chunk checksum does not match Content-Digest', status=422)
+
+        try:
+            fd = os.open(path, os.O_WRONLY)
+        except FileNotFoundError:
+            # Finalized (and the part file moved) or aborted since the check above.
+            raise ChunkError('Upload session is no longer active', status=409)
+        try:
+            spool.seek(0)
+            offset = start
+            while data := spool.read(READ_SIZE):
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        _check_active(session)
+        session.received_ranges = merge_range(session.received_ranges, start, end)
+        session.received_bytes = sum(high - low for low, high in session.received_ranges)
+        session.expires_at = timezone.now() + _ttl()
+        session.save(update_fields=['received_ranges', 'received_bytes', 'expires_at', 'updated_at'])
+
+    if session.is_complete:
+        finalize_session(session)
+        session.refresh_from_db()
+    return session
+
+
+def finalize_session(session):
+    """Move the assembled file into place and queue it for ingestion."""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == 'completed':
+            return session.upload
+        _check_active(session)
+        if not session.is_complete:
+            raise ChunkError(f'{session.total_size - session.received_bytes} bytes are still missing', status=409)
+
+        name = default_storage.get_available_name(
+            f'data_uploads/{session.id.hex[:8]}_{get_valid_filename(session.file_name)}',
+            max_length=DataUpload._meta.get_field('file').max_length,
+        )
+        upload = DataUpload.objects.create(
+            file=name,
+            file_type=session.file_type,
+            region=session.region,
+            uploaded_by=session.uploaded_by,
+            conflict_mode=session.conflict_mode,
+        )
+        session.upload = upload
+        session.status = 'completed'
+        session.save(update_fields=['upload', 'status', 'updated_at'])
+        # Move the file only once the rows exist: a rollback leaves it in place.
+        transaction.on_commit(lambda: _publish(session, upload))
+    return upload
+
+
+def _publish(session, upload):
+    destination = default_storage.path(upload.file.name)
+    try:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(part_path(session), destination)
+    except OSError as exc:
+        DataUpload.objects.filter(pk=upload.pk).update(
+            status='failed', errors=[{'row': None, 'error': f'Could not store the uploaded file: {exc}'}]
+        )
+        return
+    process_data_upload.delay(upload.id)
+
+
+def abort_session(session):
+    UploadSession.objects.filter(pk=session.pk, status='active').update(status='aborted')
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def prune_upload_sessions(now=None):
+    """Abort active sessions past their expiry and delete their part files."""
+    expired = UploadSession.objects.filter(status='active', expires_at__lte=now or timezone.now())
+    count = 0
+    for session in expired.iterator():
+        abort_session(session)
+        count += 1
+    return count
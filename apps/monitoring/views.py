@@ -1,16 +1,51 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.gis.geos import Polygon
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from django.db.models import Avg, Max, Min, Count
 from django.utils import timezone
 from datetime import timedelta
-from .models import Region, EnvironmentalData, DataUpload
+from apps.users.authentication import aauthenticate
+from myproject.routers import replica_safe
+from myproject.singleflight import singleflight
+from .models import Region, EnvironmentalData, EnvironmentalAggregate, DataUpload, UploadSession
+from .changes import changes_since, current_cursor
+from .retention import combined_statistics
+from .signals import readings_ingested
+from .streaming import get_hub, format_event
+from .surface import region_surface
+from .tasks import process_data_upload
+from .uploads import (
+    ChunkError, start_session, write_chunk, finalize_session,
+    abort_session, parse_content_range, parse_content_digest
+)
 from .serializers import (
     RegionSerializer, EnvironmentalDataSerializer, 
-    BoundingBoxSerializer, DataUploadSerializer
+    BoundingBoxSerializer, DataUploadSerializer,
+    SurfaceRequestSerializer, UploadSessionSerializer,
+    PolygonQuerySerializer
 )
 
+def time_range_start(time_range):
+    # Translate the ``time_range`` query parameter used by statistics endpoints.
+    days = {'7d': 7, '30d': 30, '1y': 365}.get(time_range)
+    return timezone.now() - timedelta(days=days) if days else None
+
+def statistics_aggregates():
+    return dict(
+        data_points=Count('id'),
+        avg_vegetation=Avg('vegetation_index'),
+        avg_soil_moisture=Avg('soil_moisture'),
+        avg_rainfall=Avg('rainfall'),
+        avg_degradation=Avg('land_degradation_index'),
+        max_degradation=Max('land_degradation_index'),
+        min_degradation=Min('land_degradation_index'),
+    )
+
 class RegionViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
@@ -21,31 +56,40 @@ class RegionViewSet(viewsets.ReadOnlyModelViewSet):
         region = self.get_object()
         time_range = request.query_params.get('time_range', '30d')
         
-        # Calculate time range
-        if time_range == '7d':
-            start_date = timezone.now() - timedelta(days=7)
-        elif time_range == '30d':
-            start_date = timezone.now() - timedelta(days=30)
-        elif time_range == '1y':
-            start_date = timezone.now() - timedelta(days=365)
-        else:
-            start_date = None
+        def compute():
+            # Older readings may have been compacted into aggregates; count both.
+            queryset = EnvironmentalData.objects.filter(region=region)
+            aggregates = EnvironmentalAggregate.objects.filter(region=region)
+            start_date = time_range_start(time_range)
+            if start_date:
+                queryset = queryset.filter(timestamp__gte=start_date)
+                aggregates = aggregates.filter(period_start__gte=start_date)
+            return combined_statistics(queryset, aggregates)
         
-        queryset = EnvironmentalData.objects.filter(region=region)
-        if start_date:
-            queryset = queryset.filter(timestamp__gte=start_date)
-        
-        stats = queryset.aggregate(
-            data_points=Count('id'),
-            avg_vegetation=Avg('vegetation_index'),
-            avg_soil_moisture=Avg('soil_moisture'),
-            avg_rainfall=Avg('rainfall'),
-            avg_degradation=Avg('land_degradation_index'),
-            max_degradation=Max('land_degradation_index'),
-            min_degradation=Min('land_degradation_index'),
-        )
+        # Dashboards poll this all at once; concurrent identical requests share one query
+        stats = singleflight(f'region-statistics:{region.pk}:{time_range}', compute)
         
         return Response(stats)
+    
+    @action(detail=True, methods=['get'])
+    def surface(self, request, pk=None):
+        region = self.get_object()
+        serializer = SurfaceRequestSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        surface = region_surface(region, **serializer.validated_data)
+        etag = f'"{surface["etag"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(surface['content'], content_type=surface['content_type'])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        response['X-Surface-Bounds'] = ','.join(str(value) for value in surface['bounds'])
+        response['X-Surface-Shape'] = ','.join(str(value) for value in surface['shape'])
+        response['X-Surface-Range'] = ','.join(str(value) for value in surface['value_range'])
+        return response
 
 class EnvironmentalDataViewSet(viewsets.ModelViewSet):
     queryset = EnvironmentalData.objects.all()
@@ -67,6 +111,11 @@ class EnvironmentalDataViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def perform_create(self, serializer):
+        reading = serializer.save()
+        readings_ingested.send(sender=EnvironmentalData, readings=[reading])
+    
+    @replica_safe
     @action(detail=False, methods=['post'])
     def within_bbox(self, request):
         serializer = BoundingBoxSerializer(data=request.data)
@@ -97,19 +146,60 @@ class EnvironmentalDataViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @replica_safe
+    @action(detail=False, methods=['post'])
+    def within_polygon(self, request):
+        serializer = PolygonQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        # coveredby is one of the lookups PostGIS supports on geography columns;
+        # the spatial index prefilters and the database aggregates. Compacted
+        # aggregates carry no locations, so this covers the raw retention
+        # window only (see DATA_RETENTION).
+        queryset = EnvironmentalData.objects.filter(location__coveredby=data['geometry'])
+        if data.get('start_date'):
+            queryset = queryset.filter(date__gte=data['start_date'])
+        if data.get('end_date'):
+            queryset = queryset.filter(date__lte=data['end_date'])
+        if data.get('sources'):
+            queryset = queryset.filter(source__in=data['sources'])
+        
+        return Response(queryset.aggregate(**statistics_aggregates()))
+    
     @action(detail=False, methods=['get'])
-    def latest(self, request):
-        # Get latest data for each region
-        regions = Region.objects.all()
-        latest_data = []
+    def changes(self, request):
+        # Without ``since`` only the current cursor is returned, for clients
+        # that have just done a full download.
+        max_limit = getattr(settings, 'CHANGE_FEED_MAX_PAGE_SIZE', 5000)
+        try:
+            since = request.query_params.get('since')
+            since = int(since) if since is not None else None
+            limit = min(int(request.query_params.get('limit', max_limit)), max_limit)
+            if (since is not None and since < 0) or limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'since and limit must be positive integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
         
-        for region in regions:
-            data = EnvironmentalData.objects.filter(region=region).order_by('-timestamp').first()
-            if data:
-                latest_data.append(data)
+        if since is None:
+            return Response({'cursor': current_cursor(), 'has_more': False, 'changes': []})
         
-        serializer = self.get_serializer(latest_data, many=True)
-        return Response(serializer.data)
+        changes, cursor, has_more = changes_since(since, limit)
+        for change in changes:
+            reading = change.pop('reading')
+            change['data'] = self.get_serializer(reading).data if reading is not None else None
+        return Response({'cursor': cursor, 'has_more': has_more, 'changes': changes})
+    
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        def compute():
+            # Latest data for each region
+            latest_data = EnvironmentalData.latest_per_region()
+            return list(self.get_serializer(latest_data, many=True).data)
+        
+        return Response(singleflight('environmental-data-latest', compute))
 
 class DataUploadViewSet(viewsets.ModelViewSet):
     queryset = DataUpload.objects.all()
@@ -123,8 +213,7 @@ class DataUploadViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         upload = serializer.save()
-        # Start async processing (we'll implement this later)
-        # process_data_upload.delay(upload.id)
+        transaction.on_commit(lambda: process_data_upload.delay(upload.id))
     
     @action(detail=True, methods=['get'])
     def status(self, request, pk=None):
@@ -133,5 +222,102 @@ class DataUploadViewSet(viewsets.ModelViewSet):
             'status': upload.status,
             'processed': upload.processed_records,
             'total': upload.total_records,
+            'inserted': upload.inserted_records,
+            'updated': upload.updated_records,
+            'skipped': upload.skipped_records,
             'errors': upload.errors
-        })
\ No newline at end of file
+        })
+    
+    def _get_session(self, session_id):
+        sessions = UploadSession.objects.select_related('upload')
+        if not self.request.user.is_admin():
+            sessions = sessions.filter(uploaded_by=self.request.user)
+        return get_object_or_404(sessions, pk=session_id)
+    
+    @action(detail=False, methods=['post'], url_path='sessions')
+    def create_session(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        session = start_session(
+            request.user, data['region'], data['file_name'], data['file_type'],
+            data['total_size'], data.get('conflict_mode', 'ignore')
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get', 'put', 'delete'], url_path=r'sessions/(?P<session_id>[0-9a-f-]{32,36})')
+    def session(self, request, session_id=None):
+        # PUT one chunk: Content-Range: bytes start-end/total plus
+        # Content-Digest: sha-256=:<base64>: of the chunk body
+        session = self._get_session(session_id)
+        
+        if request.method == 'DELETE':
+            abort_session(session)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        if request.method == 'PUT':
+            try:
+                start, end = parse_content_range(request.headers.get('Content-Range'), session.total_size)
+                digest = parse_content_digest(request.headers.get('Content-Digest'))
+                session = write_chunk(session, request.stream, start, end, digest)
+            except ChunkError as exc:
+                return Response({'error': str(exc)}, status=exc.status)
+        
+        return Response(UploadSessionSerializer(session).data)
+    
+    @action(detail=False, methods=['post'], url_path=r'sessions/(?P<session_id>[0-9a-f-]{32,36})/finalize')
+    def finalize(self, request, session_id=None):
+        session = self._get_session(session_id)
+        try:
+            upload = finalize_session(session)
+        except ChunkError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return Response(DataUploadSerializer(upload).data)
+
+async def reading_stream(request):
+    """
+    Server-Sent Events feed of new readings. Filter with ``region=1,2`` and/or
+    ``bbox=min_lng,min_lat,max_lng,max_lat``.
+    """
+    user = await aauthenticate(request, allow_query_token=True)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    
+    try:
+        region_ids = [int(v) for v in request.GET.get('region', '').split(',') if v]
+        bbox = request.GET.get('bbox')
+        if bbox:
+            bbox = tuple(float(v) for v in bbox.split(','))
+            if len(bbox) != 4:
+                raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Invalid region or bbox parameter'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    hub = get_hub()
+    subscription = hub.subscribe(region_ids=region_ids, bbox=bbox or None)
+    
+    async def events():
+        try:
+            yield 'retry: 3000\n\n'
+            async for batch in subscription.batches(
+                max_batch=getattr(settings, 'LIVE_FEED_MAX_BATCH', 500),
+                linger=getattr(settings, 'LIVE_FEED_LINGER', 0.25),
+                heartbeat=getattr(settings, 'LIVE_FEED_HEARTBEAT', 15),
+            ):
+                if subscription.dropped:
+                    yield format_event('lagged', {'dropped': subscription.dropped})
+                    subscription.dropped = 0
+                if batch:
+                    yield format_event('readings', batch)
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            hub.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
\ No newline at end of file
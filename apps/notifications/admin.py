@@ -1,3 +1,21 @@
 from django.contrib import admin
+from .models import AlertRule, Alert, OutboundNotification
 
-# Register your models here.
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'metric', 'kind', 'operator', 'threshold', 'region', 'is_active']
+    list_filter = ['metric', 'kind', 'is_active']
+    search_fields = ['name', 'user__email']
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ['rule', 'user', 'region', 'metric', 'value', 'reading_count', 'triggered_at']
+    list_filter = ['metric', 'triggered_at']
+    search_fields = ['rule__name', 'user__email']
+
+@admin.register(OutboundNotification)
+class OutboundNotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'channel', 'status', 'send_after', 'attempts', 'sent_at']
+    list_filter = ['status', 'channel']
+    search_fields = ['user__email']
+    readonly_fields = ['items', 'attempts', 'last_error', 'claimed_at', 'created_at', 'sent_at']
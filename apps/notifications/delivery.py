@@ -0,0 +1,221 @@
+"""
+Outbound notification queue.
+
+``enqueue_alerts`` folds freshly created alerts into one pending
+OutboundNotification per user and coalescing window, as configured by the
+user's ``notification_preferences``::
+
+    {"email": true, "frequency": "immediate" | "hourly" | "daily",
+     "coalesce_minutes": 15}
+
+``deliver_due_notifications`` claims due rows and sends them through a single
+backend connection per run, so SMTP handshakes are paid once per batch.
+"""
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.users.models import User
+from .models import OutboundNotification
+
+FREQUENCIES = ('immediate', 'hourly', 'daily')
+
+
+def _window(preferences, now):
+    """Return (coalesce_key, send_after) for the window ``now`` falls in."""
+    frequency = preferences.get('frequency', 'immediate')
+    if frequency not in FREQUENCIES:
+        frequency = 'immediate'
+
+    if frequency == 'daily':
+        local = timezone.localtime(now)
+        start = timezone.make_aware(datetime.combine(local.date(), dt_time.min))
+        end = start + timedelta(days=1)
+    elif frequency == 'hourly':
+        start = now.replace(minute=0, second=0, microsecond=0)
+        end = start + timedelta(hours=1)
+    else:
+        minutes = preferences.get('coalesce_minutes',
+                                  getattr(settings, 'NOTIFICATION_COALESCE_MINUTES', 15))
+        width = max(int(minutes), 1) * 60
+        epoch = int(now.timestamp())
+        start = datetime.fromtimestamp(epoch - epoch % width, tz=now.tzinfo)
+        end = start + timedelta(seconds=width)
+    return f'{frequency}:{start.isoformat()}', end
+
+
+def _alert_item(alert):
+    return {
+        'dedup_key': f'{alert.rule_id}:{alert.region_id}',
+        'alert_id': alert.id,
+        'rule_id': alert.rule_id,
+        'region_id': alert.region_id,
+        'metric': alert.metric,
+        'value': alert.value,
+        'baseline': alert.baseline,
+        'count': alert.reading_count,
+        'triggered_at': alert.triggered_at.isoformat(),
+    }
+
+
+def _merge_items(items, new_items):
+    by_key = {item['dedup_key']: item for item in items}
+    for item in new_items:
+        current = by_key.get(item['dedup_key'])
+        if current is None:
+            items.append(item)
+            by_key[item['dedup_key']] = item
+        else:
+            current['count'] += item['count']
+            current['value'] = item['value']
+            current['baseline'] = item['baseline']
+            current['triggered_at'] = item['triggered_at']
+    return items
+
+
+def enqueue_alerts(alerts, now=None):
+    if not alerts:
+        return 0
+    now = now or timezone.now()
+
+    per_user = defaultdict(list)
+    for alert in alerts:
+        per_user[alert.user_id].append(_alert_item(alert))
+
+    users = User.objects.filter(id__in=per_user, is_active=True).only('id', 'notification_preferences')
+    windows = {}
+    for user in users:
+        preferences = user.notification_preferences or {}
+        if not preferences.get('email', True):
+            continue
+        windows[user.id] = _window(preferences, now)
+
+    queued = 0
+    for user_id, (key, send_after) in windows.items():
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    pending = (OutboundNotification.objects.select_for_update()
+                               .filter(user_id=user_id, channel='email', coalesce_key=key, status='pending')
+                               .first())
+                    if pending is None:
+                        OutboundNotification.objects.create(
+                            user_id=user_id, channel='email', coalesce_key=key,
+                            items=_merge_items([], per_user[user_id]), send_after=send_after,
+                        )
+                    else:
+                        pending.items = _merge_items(pending.items, per_user[user_id])
+                        pending.save(update_fields=['items'])
+                queued += 1
+                break
+            except IntegrityError:
+                # Another worker opened the same window concurrently; merge into it.
+                if attempt:
+                    raise
+    return queued
+
+
+def _render(notification):
+    from apps.monitoring.models import Region
+    from .models import AlertRule
+
+    items = notification.items
+    rules = dict(AlertRule.objects.filter(id__in={i['rule_id'] for i in items}).values_list('id', 'name'))
+    regions = dict(Region.objects.filter(id__in={i['region_id'] for i in items}).values_list('id', 'name'))
+
+    if len(items) == 1:
+        item = items[0]
+        subject = f"DMAS alert: {rules.get(item['rule_id'], item['metric'])} in {regions.get(item['region_id'], '')}"
+    else:
+        subject = f"DMAS alert digest: {len(items)} alerts"
+
+    lines = [f"Hello {notification.user.get_full_name() or notification.user.email},", '']
+    for item in items:
+        line = (f"- {rules.get(item['rule_id'], 'Alert')}: {regions.get(item['region_id'], '')} "
+                f"{item['metric']} = {item['value']:.3f}")
+        if item.get('baseline') is not None:
+            line += f" (window average {item['baseline']:.3f})"
+        if item['count'] > 1:
+            line += f" across {item['count']} readings"
+        lines.append(line)
+    return subject, '\n'.join(lines)
+
+
+def _claim(batch_size, now):
+    stale = now - timedelta(seconds=getattr(settings, 'NOTIFICATION_CLAIM_TIMEOUT', 600))
+    ids = list(
+        OutboundNotification.objects
+        .filter(Q(status='pending', send_after__lte=now) | Q(status='sending', claimed_at__lt=stale))
+        .order_by('send_after')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    claimed = OutboundNotification.objects.filter(
+        Q(status='pending') | Q(status='sending', claimed_at__lt=stale), id__in=ids,
+    ).update(status='sending', claimed_at=now)
+    if not claimed:
+        return []
+    return list(OutboundNotification.objects.filter(id__in=ids, status='sending', claimed_at=now)
+                .select_related('user'))
+
+
+def deliver_due_notifications(batch_size=500, backend=None, now=None):
+    """Send every due notification over one backend connection. Returns (sent, failed)."""
+    now = now or timezone.now()
+    notifications = _claim(batch_size, now)
+    if not notifications:
+        return 0, 0
+
+    max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+    connection = get_connection(
+        backend=backend or getattr(settings, 'NOTIFICATIONS_EMAIL_BACKEND', None),
+        fail_silently=False,
+    )
+    sent = failed = 0
+    connection.open()
+    try:
+        for notification in notifications:
+            subject, body = _render(notification)
+            message = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL,
+                                   [notification.user.email], connection=connection)
+            notification.attempts += 1
+            try:
+                message.send()
+            except Exception as exc:
+                failed += 1
+                notification.last_error = str(exc)
+                if notification.attempts >= max_attempts:
+                    notification.status = 'failed'
+                else:
+                    notification.status = 'pending'
+                    notification.send_after = now + timedelta(minutes=2 ** notification.attempts)
+                notification.claimed_at = None
+                try:
+                    notification.save(update_fields=['status', 'attempts', 'last_error',
+                                                     'send_after', 'claimed_at'])
+                except IntegrityError:
+                    # A newer pending message already exists for this window;
+                    # fold the undelivered items into it instead.
+                    _requeue_into_pending(notification)
+            else:
+                sent += 1
+                notification.status = 'sent'
+                notification.sent_at = timezone.now()
+                notification.save(update_fields=['status', 'attempts', 'sent_at'])
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _requeue_into_pending(notification):
+    with transaction.atomic():
+        pending = (OutboundNotification.objects.select_for_update()
+                   .get(user_id=notification.user_id, channel=notification.channel,
+                        coalesce_key=notification.coalesce_key, status='pending'))
+        pending.items = _merge_items(pending.items, notification.items)
+        pending.save(update_fields=['items'])
+        notification.delete()
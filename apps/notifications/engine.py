@@ -0,0 +1,254 @@
+"""
+Alert rule evaluation.
+
+Active rules are compiled once per process into an index keyed by scope and
+metric. A scope is a region id, a coarse grid cell for bounding-box rules, or
+``None`` for rules without a spatial filter. Inside each bucket the rules are
+sorted by threshold, so matching a value is a bisect rather than a scan and
+the cost per reading depends on the number of rules that actually fire, not
+on the number of subscriptions.
+
+The compiled index is rebuilt lazily whenever the rule version stored in the
+cache changes (see ``bump_rules_version``), so every worker picks up edits.
+That only reaches other processes through a shared cache; with a per-process
+cache the version is derived from the rules table instead.
+"""
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max
+
+from apps.monitoring.models import EnvironmentalData
+from myproject.caching import cache_is_shared
+from .models import Alert, AlertRule
+
+RULES_VERSION_KEY = 'notifications:alert_rules_version'
+
+# Bounding-box rules are registered in every 1x1 degree cell they cover; very
+# large boxes go to a per-metric list that is checked linearly instead.
+GRID_SIZE = 1.0
+MAX_CELLS_PER_RULE = 400
+
+
+def bump_rules_version():
+    try:
+        cache.incr(RULES_VERSION_KEY)
+    except ValueError:
+        cache.set(RULES_VERSION_KEY, 1, None)
+
+
+def _cell(lng, lat):
+    return (math.floor(lng / GRID_SIZE), math.floor(lat / GRID_SIZE))
+
+
+class CompiledRule:
+    __slots__ = ('id', 'user_id', 'metric', 'kind', 'operator', 'threshold',
+                 'window_days', 'region_id', 'bbox')
+
+    def __init__(self, rule):
+        self.id = rule.id
+        self.user_id = rule.user_id
+        self.metric = rule.metric
+        self.kind = rule.kind
+        self.operator = rule.operator
+        self.threshold = rule.threshold
+        self.window_days = rule.window_days
+        self.region_id = rule.region_id
+        self.bbox = rule.bbox
+
+    def contains(self, lng, lat):
+        if self.bbox is None:
+            return True
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lng <= lng <= max_lng and min_lat <= lat <= max_lat
+
+
+class ThresholdSet:
+    """Rules sharing a metric and trigger kind, sorted by threshold per operator."""
+
+    def __init__(self):
+        self._pending = defaultdict(list)
+        self._sorted = {}
+
+    def add(self, rule):
+        self._pending[rule.operator].append(rule)
+
+    def freeze(self):
+        for operator, rules in self._pending.items():
+            rules.sort(key=lambda r: r.threshold)
+            self._sorted[operator] = ([r.threshold for r in rules], rules)
+        self._pending = None
+
+    def match(self, value):
+        for operator, (thresholds, rules) in self._sorted.items():
+            if operator == 'gt':
+                yield from rules[:bisect_left(thresholds, value)]
+            elif operator == 'gte':
+                yield from rules[:bisect_right(thresholds, value)]
+            elif operator == 'lt':
+                yield from rules[bisect_right(thresholds, value):]
+            elif operator == 'lte':
+                yield from rules[bisect_left(thresholds, value):]
+
+
+class RuleIndex:
+    def __init__(self, rules):
+        # (scope, metric) -> {trigger: ThresholdSet}, trigger is 'threshold'
+        # or ('change', window_days).
+        self._buckets = defaultdict(lambda: defaultdict(ThresholdSet))
+        self.change_windows = set()
+        self.size = 0
+
+        for rule in rules:
+            compiled = CompiledRule(rule)
+            trigger = 'threshold'
+            if compiled.kind == 'change':
+                trigger = ('change', compiled.window_days)
+                self.change_windows.add((compiled.metric, compiled.window_days))
+            for scope in self._scopes(compiled):
+                self._buckets[(scope, compiled.metric)][trigger].add(compiled)
+            self.size += 1
+
+        for triggers in self._buckets.values():
+            for threshold_set in triggers.values():
+                threshold_set.freeze()
+        self._buckets = dict(self._buckets)
+
+    def _scopes(self, rule):
+        if rule.region_id is not None:
+            return [('region', rule.region_id)]
+        if rule.bbox is None:
+            return [None]
+        min_x, min_y = _cell(rule.bbox[0], rule.bbox[1])
+        max_x, max_y = _cell(rule.bbox[2], rule.bbox[3])
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > MAX_CELLS_PER_RULE:
+            return [None]
+        return [('cell', (x, y)) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    def __bool__(self):
+        return self.size > 0
+
+    def candidates(self, reading):
+        lng, lat = reading.location.x, reading.location.y
+        scopes = (('region', reading.region_id), ('cell', _cell(lng, lat)), None)
+        for scope in scopes:
+            for metric in AlertRule.METRIC_CHOICES:
+                triggers = self._buckets.get((scope, metric[0]))
+                if triggers:
+                    yield metric[0], triggers, lng, lat
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def _rules_version():
+    if cache_is_shared():
+        return cache.get(RULES_VERSION_KEY, 0)
+    # Rules are edited in the web process but evaluated in Celery workers,
+    # which never see a bump in a per-process cache.
+    state = AlertRule.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    return state['updated'], state['count']
+
+
+def get_rule_index():
+    global _index, _index_version
+    version = _rules_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _index_lock:
+        if _index is None or _index_version != version:
+            rules = AlertRule.objects.filter(is_active=True)
+            _index = RuleIndex(rules.iterator(chunk_size=2000))
+            _index_version = version
+    return _index
+
+
+def _reference_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _window_baselines(index, readings):
+    """
+    Average of each (metric, window) per region over the window before each
+    reading's day. Backfills can span weeks, so the anchor is the start of the
+    day a reading belongs to rather than the earliest reading in the batch.
+    """
+    if not index.change_windows:
+        return {}
+    regions_by_day = defaultdict(set)
+    for reading in readings:
+        regions_by_day[_reference_day(reading.timestamp)].add(reading.region_id)
+    baselines = {}
+    for metric, window_days in index.change_windows:
+        for reference, region_ids in regions_by_day.items():
+            rows = (
+                EnvironmentalData.objects
+                .filter(region_id__in=region_ids,
+                        timestamp__gte=reference - timedelta(days=window_days),
+                        timestamp__lt=reference)
+                .values('region_id')
+                .annotate(avg=Avg(metric))
+                .order_by()
+            )
+            for row in rows:
+                if row['avg'] is not None:
+                    baselines[(row['region_id'], reference, metric, window_days)] = row['avg']
+    return baselines
+
+
+def evaluate_readings(readings):
+    """
+    Evaluate a batch of readings against all active rules in one pass and
+    record at most one Alert per (rule, region) for the batch.
+    """
+    readings = [reading for reading in readings if reading.location is not None]
+    index = get_rule_index()
+    if not index or not readings:
+        return []
+
+    baselines = _window_baselines(index, readings)
+    hits = {}
+
+    for reading in readings:
+        for metric, triggers, lng, lat in index.candidates(reading):
+            value = getattr(reading, metric)
+            if value is None:
+                continue
+            for trigger, threshold_set in triggers.items():
+                baseline = None
+                observed = value
+                if trigger != 'threshold':
+                    baseline = baselines.get(
+                        (reading.region_id, _reference_day(reading.timestamp), metric, trigger[1])
+                    )
+                    if baseline is None:
+                        continue
+                    observed = value - baseline
+                for rule in threshold_set.match(observed):
+                    if not rule.contains(lng, lat):
+                        continue
+                    key = (rule.id, reading.region_id)
+                    hit = hits.get(key)
+                    if hit is None:
+                        hits[key] = [rule, reading, observed, baseline, 1]
+                        continue
+                    hit[4] += 1
+                    # Keep the reading furthest past the threshold.
+                    if (observed - hit[2]) * (1 if rule.operator in ('gt', 'gte') else -1) > 0:
+                        hit[1], hit[2], hit[3] = reading, observed, baseline
+
+    alerts = [
+        Alert(
+            rule_id=rule.id, user_id=rule.user_id, region_id=reading.region_id,
+            reading_id=reading.pk, metric=rule.metric, value=observed,
+            baseline=baseline, reading_count=count,
+        )
+        for rule, reading, observed, baseline, count in hits.values()
+    ]
+    return Alert.objects.bulk_create(alerts)
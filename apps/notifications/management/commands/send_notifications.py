@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.notifications.delivery import deliver_due_notifications
+
+class Command(BaseCommand):
+    help = 'Send due notifications from the outbound queue'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--backend', default=None,
+                            help='Email backend dotted path, overrides NOTIFICATIONS_EMAIL_BACKEND')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue')
+        parser.add_argument('--interval', type=float, default=10.0)
+    
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_due_notifications(
+                batch_size=options['batch_size'], backend=options['backend'],
+            )
+            if sent or failed:
+                self.stdout.write(f'sent={sent} failed={failed}')
+            if not options['loop']:
+                break
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
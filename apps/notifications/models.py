@@ -1,3 +1,123 @@
 from django.db import models
+from django.utils import timezone
+from apps.monitoring.models import Region, EnvironmentalData
+from apps.users.models import User
 
-# Create your models here.
+class AlertRule(models.Model):
+    METRIC_CHOICES = (
+        ('vegetation_index', 'Vegetation Index (NDVI)'),
+        ('soil_moisture', 'Soil Moisture'),
+        ('rainfall', 'Rainfall'),
+        ('land_degradation_index', 'Land Degradation Index'),
+        ('temperature', 'Temperature'),
+        ('wind_speed', 'Wind Speed'),
+        ('humidity', 'Humidity'),
+    )
+
+    OPERATOR_CHOICES = (
+        ('gt', '>'),
+        ('gte', '>='),
+        ('lt', '<'),
+        ('lte', '<='),
+    )
+
+    KIND_CHOICES = (
+        ('threshold', 'Threshold'),
+        ('change', 'Change over window'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_rules')
+    name = models.CharField(max_length=255)
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='threshold')
+    operator = models.CharField(max_length=5, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField(help_text="Threshold on the value, or on the change versus the window average for change rules")
+    window_days = models.PositiveIntegerField(default=7, help_text="Look-back window for change rules")
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True, related_name='alert_rules')
+    min_lng = models.FloatField(null=True, blank=True)
+    min_lat = models.FloatField(null=True, blank=True)
+    max_lng = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'metric']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.metric} {self.get_operator_display()} {self.threshold})"
+
+    @property
+    def bbox(self):
+        if None in (self.min_lng, self.min_lat, self.max_lng, self.max_lat):
+            return None
+        return (self.min_lng, self.min_lat, self.max_lng, self.max_lat)
+
+class Alert(models.Model):
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='alerts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alerts')
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    reading = models.ForeignKey(EnvironmentalData, on_delete=models.SET_NULL, null=True, blank=True)
+    metric = models.CharField(max_length=30)
+    value = models.FloatField(help_text="Most extreme value (or change) seen in the batch")
+    baseline = models.FloatField(null=True, blank=True, help_text="Window average for change rules")
+    reading_count = models.IntegerField(default=1, help_text="Readings in the batch that matched")
+    triggered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-triggered_at']
+        indexes = [
+            models.Index(fields=['user', 'triggered_at']),
+        ]
+
+    def __str__(self):
+        return f"Alert {self.rule.name} - {self.region} ({self.value:.2f})"
+
+class OutboundNotification(models.Model):
+    """
+    One pending message per user and coalescing window. Alerts landing in the
+    same window are folded into ``items`` (deduplicated by ``dedup_key``), so
+    the number of messages sent depends on users notified, not on readings.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    CHANNEL_CHOICES = (
+        ('email', 'Email'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='outbound_notifications')
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES, default='email')
+    coalesce_key = models.CharField(max_length=100)
+    items = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['send_after']
+        indexes = [
+            models.Index(fields=['status', 'send_after']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'channel', 'coalesce_key'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_notification_window',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.user} ({self.status}, {len(self.items)} items)"
@@ -0,0 +1,32 @@
+from rest_framework import serializers
+from .models import AlertRule, Alert
+
+class AlertRuleSerializer(serializers.ModelSerializer):
+    region_name = serializers.CharField(source='region.name', read_only=True)
+    
+    class Meta:
+        model = AlertRule
+        fields = '__all__'
+        read_only_fields = ['user', 'created_at', 'updated_at']
+    
+    def validate(self, attrs):
+        bbox = [attrs.get(f, getattr(self.instance, f, None))
+                for f in ('min_lng', 'min_lat', 'max_lng', 'max_lat')]
+        if any(v is not None for v in bbox):
+            if any(v is None for v in bbox):
+                raise serializers.ValidationError("Bounding box needs min_lng, min_lat, max_lng and max_lat")
+            if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise serializers.ValidationError("Bounding box minimum must not exceed maximum")
+        return attrs
+    
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
+        return super().create(validated_data)
+
+class AlertSerializer(serializers.ModelSerializer):
+    rule_name = serializers.CharField(source='rule.name', read_only=True)
+    region_name = serializers.CharField(source='region.name', read_only=True)
+    
+    class Meta:
+        model = Alert
+        fields = '__all__'
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.monitoring.models import EnvironmentalData
+from apps.monitoring.signals import readings_ingested
+from .delivery import enqueue_alerts
+from .engine import bump_rules_version, evaluate_readings
+from .models import AlertRule
+
+@receiver(readings_ingested, sender=EnvironmentalData)
+def evaluate_alert_rules(sender, readings, **kwargs):
+    alerts = evaluate_readings(readings)
+    enqueue_alerts(alerts)
+
+@receiver([post_save, post_delete], sender=AlertRule)
+def invalidate_rule_index(sender, **kwargs):
+    bump_rules_version()
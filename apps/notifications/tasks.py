@@ -0,0 +1,7 @@
+from celery import shared_task
+from .delivery import deliver_due_notifications
+
+@shared_task
+def deliver_notifications():
+    sent, failed = deliver_due_notifications()
+    return {'sent': sent, 'failed': failed}
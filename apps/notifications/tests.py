@@ -1,3 +1,137 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from myproject.caching import cache_is_shared
+
+from .delivery import _alert_item, _merge_items, _window
+from .engine import RULES_VERSION_KEY, ThresholdSet, _rules_version, _window_baselines, bump_rules_version
+
+START = datetime(2024, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+
+
+def rule(rule_id, operator, threshold):
+    return SimpleNamespace(id=rule_id, operator=operator, threshold=threshold)
+
+
+class ThresholdSetTests(SimpleTestCase):
+    def setUp(self):
+        self.rules = ThresholdSet()
+        for rule_id, operator, threshold in [
+            (1, 'gt', 0.5), (2, 'gt', 0.7), (3, 'gte', 0.7),
+            (4, 'lt', 0.2), (5, 'lte', 0.2), (6, 'lt', 0.4),
+        ]:
+            self.rules.add(rule(rule_id, operator, threshold))
+        self.rules.freeze()
+
+    def matched(self, value):
+        return sorted(r.id for r in self.rules.match(value))
+
+    def test_strict_and_inclusive_bounds(self):
+        self.assertEqual(self.matched(0.7), [1, 3])
+        self.assertEqual(self.matched(0.2), [5, 6])
+
+    def test_values_between_thresholds(self):
+        self.assertEqual(self.matched(0.8), [1, 2, 3])
+        self.assertEqual(self.matched(0.45), [])
+        self.assertEqual(self.matched(0.3), [6])
+        self.assertEqual(self.matched(0.1), [4, 5, 6])
+
+    def test_unsorted_insertion_order(self):
+        rules = ThresholdSet()
+        for rule_id, threshold in [(1, 0.9), (2, 0.1), (3, 0.5)]:
+            rules.add(rule(rule_id, 'gt', threshold))
+        rules.freeze()
+        self.assertEqual(sorted(r.id for r in rules.match(0.6)), [2, 3])
+
+
+class WindowBaselineTests(SimpleTestCase):
+    def test_each_day_uses_its_own_window(self):
+        index = SimpleNamespace(change_windows={('rainfall', 7)})
+        readings = [
+            SimpleNamespace(region_id=1, timestamp=START),
+            SimpleNamespace(region_id=1, timestamp=START + timedelta(hours=2)),
+            SimpleNamespace(region_id=1, timestamp=START + timedelta(days=20)),
+        ]
+        anchors = []
+
+        def rows(**filters):
+            anchors.append(filters['timestamp__lt'])
+            queryset = mock.MagicMock()
+            queryset.values.return_value.annotate.return_value.order_by.return_value = [
+                {'region_id': 1, 'avg': float(len(anchors))},
+            ]
+            return queryset
+
+        with mock.patch('apps.notifications.engine.EnvironmentalData') as model:
+            model.objects.filter.side_effect = rows
+            baselines = _window_baselines(index, readings)
+
+        first_day = datetime(2024, 3, 10, tzinfo=dt_timezone.utc)
+        later_day = first_day + timedelta(days=20)
+        self.assertEqual(sorted(anchors), [first_day, later_day])
+        self.assertEqual(len(baselines), 2)
+        self.assertIn((1, first_day, 'rainfall', 7), baselines)
+        self.assertIn((1, later_day, 'rainfall', 7), baselines)
+
+
+def alert(rule_id, region_id, value, count=1):
+    return SimpleNamespace(id=rule_id * 100 + region_id, rule_id=rule_id, region_id=region_id,
+                           metric='rainfall', value=value, baseline=None,
+                           reading_count=count, triggered_at=START)
+
+
+class CoalescingTests(SimpleTestCase):
+    @override_settings(NOTIFICATION_COALESCE_MINUTES=15)
+    def test_immediate_alerts_share_a_window(self):
+        key, send_after = _window({}, START)
+        self.assertEqual(_window({}, START + timedelta(minutes=14, seconds=59))[0], key)
+        self.assertEqual(send_after, START.replace(minute=45))
+        self.assertNotEqual(_window({}, START + timedelta(minutes=15))[0], key)
+
+    def test_hourly_and_daily_windows(self):
+        key, send_after = _window({'frequency': 'hourly'}, START)
+        self.assertEqual(send_after, START.replace(hour=16, minute=0))
+        self.assertEqual(_window({'frequency': 'hourly'}, START.replace(minute=59))[0], key)
+
+        daily, _ = _window({'frequency': 'daily'}, START)
+        self.assertEqual(_window({'frequency': 'daily'}, START + timedelta(hours=1))[0], daily)
+        self.assertNotEqual(daily, key)
+
+    def test_unknown_frequency_falls_back_to_immediate(self):
+        self.assertEqual(_window({'frequency': 'weekly'}, START), _window({}, START))
+
+
+class DedupTests(SimpleTestCase):
+    def test_repeat_alerts_fold_into_one_item(self):
+        items = _merge_items([], [_alert_item(alert(1, 7, 0.8))])
+        items = _merge_items(items, [_alert_item(alert(1, 7, 0.9, count=3)),
+                                     _alert_item(alert(2, 7, 0.1))])
+
+        self.assertEqual([item['dedup_key'] for item in items], ['1:7', '2:7'])
+        self.assertEqual(items[0]['count'], 4)
+        self.assertEqual(items[0]['value'], 0.9)
+
+    def test_same_rule_in_other_region_is_separate(self):
+        items = _merge_items([], [_alert_item(alert(1, 7, 0.8)), _alert_item(alert(1, 8, 0.8))])
+        self.assertEqual(len(items), 2)
+
+
+class RulesVersionTests(SimpleTestCase):
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_falls_back_to_the_rules_table(self):
+        self.assertFalse(cache_is_shared())
+        with mock.patch('apps.notifications.engine.AlertRule') as model:
+            model.objects.aggregate.return_value = {'updated': START, 'count': 3}
+            self.assertEqual(_rules_version(), (START, 3))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache_uses_the_bumped_counter(self):
+        cache.delete(RULES_VERSION_KEY)
+        with mock.patch('apps.notifications.engine.cache_is_shared', return_value=True):
+            bump_rules_version()
+            bump_rules_version()
+            self.assertEqual(_rules_version(), 2)
@@ -1,3 +1,23 @@
-from django.shortcuts import render
+from rest_framework import viewsets, permissions
+from .models import AlertRule, Alert
+from .serializers import AlertRuleSerializer, AlertSerializer
 
-# Create your views here.
+class AlertRuleViewSet(viewsets.ModelViewSet):
+    queryset = AlertRule.objects.all()
+    serializer_class = AlertRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ['metric', 'kind', 'region', 'is_active']
+    
+    def get_queryset(self):
+        if self.request.user.is_admin():
+            return AlertRule.objects.select_related('region')
+        return AlertRule.objects.filter(user=self.request.user).select_related('region')
+
+class AlertViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Alert.objects.all()
+    serializer_class = AlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ['rule', 'region', 'metric']
+    
+    def get_queryset(self):
+        return Alert.objects.filter(user=self.request.user).select_related('rule', 'region')
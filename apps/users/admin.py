@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import User, RevokedToken
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
 class CustomUserAdmin(UserAdmin):
@@ -30,4 +30,10 @@ class CustomUserAdmin(UserAdmin):
     
     ordering = ('email',)
 
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(User, CustomUserAdmin)
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'token_type', 'user', 'expires_at', 'revoked_at')
+    list_filter = ('token_type',)
+    search_fields = ('jti', 'user__email')
\ No newline at end of file
@@ -0,0 +1,154 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import TOKEN_VERSION_CLAIM
+
+USER_STAMP_PREFIX = 'auth-user-stamp:'
+
+def _stamp_key(user_id):
+    return f'{USER_STAMP_PREFIX}{user_id}'
+
+def user_stamp(user_id):
+    """
+    Shared stamp of ``user_id`` in the Django cache. It changes on every save
+    or delete of the user, in any process, so cached copies from before the
+    change stop matching. Like the region data versions it starts from the
+    current time, so an evicted stamp never repeats an older value.
+    """
+    key = _stamp_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), None)
+        stamp = cache.get(key)
+    return stamp
+
+def _bump_stamp(user_id):
+    try:
+        cache.incr(_stamp_key(user_id))
+    except ValueError:
+        cache.add(_stamp_key(user_id), time.time_ns(), None)
+
+def bump_user_stamp(user_id):
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: _bump_stamp(user_id))
+
+class UserCache:
+    """
+    Per-process TTL/LRU cache of authenticated users keyed by user id. Each
+    entry remembers the token version and the shared user stamp it was
+    resolved for; a mismatch on either is a miss.
+    """
+    
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id, version, stamp):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, cached_version, cached_stamp, expires = entry
+            if expires < time.monotonic() or cached_version != version or cached_stamp != stamp:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+    
+    def set(self, user_id, version, stamp, user):
+        with self._lock:
+            self._entries[user_id] = (user, version, stamp, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+    max_size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000),
+)
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves users from ``user_cache`` instead of
+    querying the users table on every request.
+    
+    Every hit is checked against the shared user stamp, which costs one
+    cache round trip instead of a users query. Saving or deleting a User
+    bumps the stamp, so role, status and password changes take effect in all
+    processes as soon as they commit, provided CACHES is a shared backend.
+    Cached users are read-only snapshots: views that write a user re-fetch it
+    first.
+    
+    With REVOCATION_CHECK_ACCESS_TOKENS on, access tokens are also checked
+    against the revocation store; a miss costs one bloom-filter lookup.
+    """
+    
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if getattr(settings, 'REVOCATION_CHECK_ACCESS_TOKENS', False):
+            from .revocation import revocation_store
+            if revocation_store.is_revoked(validated_token[api_settings.JTI_CLAIM]):
+                raise AuthenticationFailed(_('Token has been revoked.'), code='token_revoked')
+        return validated_token
+    
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        
+        # Read the stamp before the user: a change committed in between then
+        # leaves a stale entry under an already outdated stamp.
+        stamp = user_stamp(user_id)
+        user = user_cache.get(user_id, version, stamp)
+        if user is None:
+            user = super().get_user(validated_token)
+            if user.token_version != version:
+                raise AuthenticationFailed(_('Token has been revoked.'), code='token_revoked')
+            user_cache.set(user_id, version, stamp, user)
+        # Hand out a copy so per-request mutations never leak into the cache.
+        return copy.copy(user)
+
+
+async def aauthenticate(request, allow_query_token=False):
+    """
+    Authenticate a plain Django async view with the same JWT rules as the API,
+    returning the active user or None. EventSource clients cannot set headers,
+    so streaming views may accept the access token as ``?token=``.
+    """
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else None
+    if raw_token is None and allow_query_token:
+        raw_token = request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        validated_token = await sync_to_async(authenticator.get_validated_token)(raw_token)
+        user = await sync_to_async(authenticator.get_user)(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
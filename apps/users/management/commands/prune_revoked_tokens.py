@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from apps.users.revocation import revocation_store
+
+class Command(BaseCommand):
+    help = 'Delete revoked tokens that have already expired'
+    
+    def handle(self, *args, **options):
+        deleted = revocation_store.prune_expired()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired revoked tokens'))
@@ -46,6 +46,7 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True)
     notification_preferences = models.JSONField(default=dict)
     email_verified = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0, help_text="Bumped to revoke all issued tokens")
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']  # Remove 'username' from REQUIRED_FIELDS
@@ -59,6 +60,10 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} ({self.role})"
     
+    def revoke_tokens(self):
+        # Every token issued before this call stops authenticating once saved.
+        self.token_version += 1
+    
     def has_role(self, role):
         return self.role == role
     
@@ -66,4 +71,27 @@ class User(AbstractUser):
         return self.role == 'admin'
     
     def is_researcher(self):
-        return self.role in ['admin', 'researcher']
\ No newline at end of file
+        return self.role in ['admin', 'researcher']
+
+
+class RevokedToken(models.Model):
+    """
+    Source of truth for revoked JWTs; apps.users.revocation keeps a bloom
+    filter of the unexpired rows in memory so checks rarely reach the DB.
+    """
+    TOKEN_TYPES = (
+        ('refresh', 'Refresh'),
+        ('access', 'Access'),
+    )
+    
+    jti = models.CharField(max_length=255, unique=True)
+    token_type = models.CharField(max_length=10, choices=TOKEN_TYPES, default='refresh')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='revoked_tokens')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'revoked_tokens'
+    
+    def __str__(self):
+        return f"{self.token_type} {self.jti}"
@@ -0,0 +1,123 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RevocationStore:
+    """
+    In-memory view of RevokedToken. Unknown jtis are rejected by the bloom
+    filter without touching the database; only filter hits (real revocations
+    or rare false positives) are confirmed with a query. New rows are pulled
+    in incrementally every ``sync_interval`` seconds, and the filter is
+    rebuilt from the unexpired rows every ``rebuild_interval`` seconds.
+    Expired rows are deleted by the prune_revoked_tokens beat task, never on
+    the request path.
+    """
+
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._count = 0
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def _rebuild(self):
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        count = last_id = 0
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('id', 'jti')
+        for row_id, jti in rows.iterator(chunk_size=5000):
+            bloom.add(jti)
+            count += 1
+            last_id = max(last_id, row_id)
+        self._bloom, self._count, self._last_id = bloom, count, last_id
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._bloom is not None and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if self._bloom is not None and now - self._synced_at < self.sync_interval:
+                return
+            if self._bloom is None or now - self._rebuilt_at >= self.rebuild_interval:
+                self._rebuilt_at = now
+                self._rebuild()
+            else:
+                rows = RevokedToken.objects.filter(id__gt=self._last_id).values_list('id', 'jti')
+                for row_id, jti in rows:
+                    self._bloom.add(jti)
+                    self._count += 1
+                    self._last_id = max(self._last_id, row_id)
+                if self._count > self.capacity:
+                    # Grow before the false-positive rate degrades.
+                    self.capacity *= 2
+                    self._rebuild()
+            self._synced_at = now
+
+    def is_revoked(self, jti):
+        self._refresh()
+        if jti not in self._bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, token, user=None):
+        """
+        Record ``token`` as revoked. Returns False if it already was, which
+        lets callers reject a refresh token being rotated twice concurrently.
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(
+                    jti=jti, token_type=token.get(api_settings.TOKEN_TYPE_CLAIM, 'refresh'),
+                    user=user, expires_at=expires_at,
+                )
+        except IntegrityError:
+            return False
+        self._refresh()
+        with self._lock:
+            self._bloom.add(jti)
+        return True
+
+    def prune_expired(self):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+revocation_store = RevocationStore(
+    capacity=getattr(settings, 'REVOCATION_BLOOM_CAPACITY', 100000),
+    error_rate=getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.001),
+    sync_interval=getattr(settings, 'REVOCATION_SYNC_INTERVAL', 5),
+    rebuild_interval=getattr(settings, 'REVOCATION_REBUILD_INTERVAL', 3600),
+)
@@ -9,6 +9,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'first_name', 'last_name', 'role', 
                  'organization', 'phone', 'date_joined']
         read_only_fields = ['date_joined']
+    
+    def update(self, instance, validated_data):
+        # Only write the submitted columns so concurrent changes to the others survive.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
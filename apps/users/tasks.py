@@ -0,0 +1,6 @@
+from celery import shared_task
+from .revocation import revocation_store
+
+@shared_task
+def prune_revoked_tokens():
+    return revocation_store.prune_expired()
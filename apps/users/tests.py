@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
 
-# Create your tests here.
+from .authentication import CachedJWTAuthentication, user_cache, user_stamp
+from .models import User
+from .revocation import revocation_store
+from .tokens import TOKEN_VERSION_CLAIM, VersionedRefreshToken
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            email='researcher@example.com', password='password123',
+            first_name='Ada', last_name='Lovelace', role='researcher'
+        )
+        self.authenticator = CachedJWTAuthentication()
+
+    def authenticate(self, token):
+        validated = self.authenticator.get_validated_token(str(token.access_token))
+        return self.authenticator.get_user(validated)
+
+    def cache_as_other_process(self, user, version, stamp):
+        # Another worker still holds the entry it resolved before the change.
+        user_cache.set(user.pk, version, stamp, user)
+
+    def test_cache_hit_skips_database(self):
+        token = VersionedRefreshToken.for_user(self.user)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(token).pk, self.user.pk)
+
+    def test_stale_token_version_rejected_after_password_change(self):
+        token = VersionedRefreshToken.for_user(self.user)
+        stale = self.authenticate(token)
+        stamp = user_stamp(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+            self.user.save(update_fields=['token_version'])
+        self.cache_as_other_process(stale, token[TOKEN_VERSION_CLAIM], stamp)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_role_change_visible_through_stale_entry(self):
+        token = VersionedRefreshToken.for_user(self.user)
+        stale = self.authenticate(token)
+        stamp = user_stamp(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'public'
+            self.user.save(update_fields=['role'])
+        self.cache_as_other_process(stale, token[TOKEN_VERSION_CLAIM], stamp)
+
+        self.assertEqual(self.authenticate(token).role, 'public')
+
+    def test_revoked_access_token_accepted_by_default(self):
+        access = VersionedRefreshToken.for_user(self.user).access_token
+        revocation_store.revoke(access, user=self.user)
+        validated = self.authenticator.get_validated_token(str(access))
+        self.assertEqual(self.authenticator.get_user(validated).pk, self.user.pk)
+
+    @override_settings(REVOCATION_CHECK_ACCESS_TOKENS=True)
+    def test_revoked_access_token_rejected_when_checked(self):
+        access = VersionedRefreshToken.for_user(self.user).access_token
+        revocation_store.revoke(access, user=self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticator.get_validated_token(str(access))
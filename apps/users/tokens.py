@@ -0,0 +1,12 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claim carrying User.token_version; access tokens inherit it from their
+# refresh token, and bumping the version revokes every token issued before.
+TOKEN_VERSION_CLAIM = 'ver'
+
+class VersionedRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
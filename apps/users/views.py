@@ -3,8 +3,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import login
+from django.db import transaction
 from .models import User
+from .revocation import revocation_store
+from .tokens import TOKEN_VERSION_CLAIM, VersionedRefreshToken
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, 
     LoginSerializer, ChangePasswordSerializer
@@ -17,7 +21,7 @@ class RegisterView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = VersionedRefreshToken.for_user(user)
             
             return Response({
                 'user': UserSerializer(user).data,
@@ -35,7 +39,7 @@ class LoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             login(request, user)
-            refresh = RefreshToken.for_user(user)
+            refresh = VersionedRefreshToken.for_user(user)
             
             return Response({
                 'user': UserSerializer(user).data,
@@ -53,7 +57,9 @@ class ProfileView(APIView):
         return Response(serializer.data)
     
     def put(self, request):
-        serializer = UserSerializer(request.user, data=request.data, partial=True)
+        # request.user may be a cached snapshot; never write it back.
+        user = User.objects.get(pk=request.user.pk)
+        serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -65,9 +71,18 @@ class ChangePasswordView(APIView):
     def post(self, request):
         serializer = ChangePasswordSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            request.user.set_password(serializer.validated_data['new_password'])
-            request.user.save()
-            return Response({'message': 'Password changed successfully'})
+            with transaction.atomic():
+                user = User.objects.select_for_update().get(pk=request.user.pk)
+                user.set_password(serializer.validated_data['new_password'])
+                user.revoke_tokens()
+                user.save(update_fields=['password', 'token_version'])
+            # Old tokens are revoked by the version bump; hand out fresh ones.
+            refresh = VersionedRefreshToken.for_user(user)
+            return Response({
+                'message': 'Password changed successfully',
+                'access': str(refresh.access_token),
+                'refresh': str(refresh)
+            })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
@@ -76,8 +91,28 @@ def refresh_token_view(request):
     try:
         refresh_token = request.data.get('refresh')
         token = RefreshToken(refresh_token)
-        return Response({
-            'access': str(token.access_token)
-        })
     except Exception as e:
-        return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if revocation_store.is_revoked(token[jwt_settings.JTI_CLAIM]):
+        return Response({'error': 'Token has been revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    # Refresh tokens issued before a password change or deactivation are dead too.
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    user = User.objects.filter(id=user_id).first() if user_id else None
+    if user is None or not user.is_active or user.token_version != token.get(TOKEN_VERSION_CLAIM, 0):
+        return Response({'error': 'Token has been revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    data = {'access': str(token.access_token)}
+    
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        if jwt_settings.BLACKLIST_AFTER_ROTATION:
+            if not revocation_store.revoke(token, user=user):
+                # Lost a race with a concurrent rotation of the same token.
+                return Response({'error': 'Token has been revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+        token.set_jti()
+        token.set_exp()
+        token.set_iat()
+        data['refresh'] = str(token)
+    
+    return Response(data)
\ No newline at end of file
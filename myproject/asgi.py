@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# Sync ORM calls run on per-request threads under ASGI, so connections kept
+# open with CONN_MAX_AGE are never reused; close them after each request.
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,18 @@
+"""
+Helpers for code that coordinates processes through the Django cache.
+
+Version counters and shared results only work when every process talks to
+the same cache. The default LocMemCache (and DummyCache) is private to each
+process, so callers use ``cache_is_shared`` to fall back to another
+mechanism instead of silently coordinating with nobody.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias='default'):
+    """True when ``alias`` is visible to every worker process (Redis, Memcached, database, file)."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
@@ -0,0 +1,170 @@
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .routers import pin_to_primary
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Pins database reads to the primary for write requests and, for
+    REPLICA_STICKY_SECONDS after a client's last write, for that client's
+    reads too, so users always see their own changes despite replica lag.
+    Clients are identified by their Authorization header (falling back to the
+    session cookie or address); use a shared cache backend in multi-process
+    deployments so stickiness holds across workers.
+    """
+
+    def _client_key(self, request):
+        identity = (request.META.get('HTTP_AUTHORIZATION')
+                    or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+                    or request.META.get('REMOTE_ADDR', ''))
+        return 'db:sticky:' + hashlib.sha1(identity.encode()).hexdigest()
+
+    def _is_read_only(self, request, view_func):
+        if request.method in SAFE_METHODS or getattr(view_func, 'replica_safe', False):
+            return True
+        actions = getattr(view_func, 'actions', None) or {}
+        action_name = actions.get(request.method.lower())
+        handler = getattr(getattr(view_func, 'cls', None), action_name or '', None)
+        return getattr(handler, 'replica_safe', False)
+
+    def process_request(self, request):
+        pin_to_primary(False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._replica_read_only = self._is_read_only(request, view_func)
+        if not request._replica_read_only or cache.get(self._client_key(request)):
+            pin_to_primary()
+
+    def process_response(self, request, response):
+        if not getattr(request, '_replica_read_only', request.method in SAFE_METHODS):
+            cache.set(self._client_key(request), 1, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+        pin_to_primary(False)
+        return response
+
+
+# Only data formats are compressed. HTML pages carry CSRF tokens next to
+# reflected input, which is what BREACH exploits; these API payloads carry
+# neither (credentials travel in the Authorization header). Server-Sent Events
+# are left out too, since they must reach the client unbuffered.
+COMPRESSIBLE_TYPES = ('application/json', 'application/geo+json', 'text/csv', 'application/octet-stream')
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class _GzipStream:
+    encoding = 'gzip'
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    encoding = 'br'
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4))
+
+    def process(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli (when installed and accepted) or gzip.
+    Only COMPRESSION_CONTENT_TYPES are compressed, so HTML (including the
+    browsable API) is never exposed to BREACH-style length oracles. Regular
+    responses are only compressed from COMPRESSION_MIN_SIZE bytes. Streaming
+    responses are compressed chunk by chunk as they are produced.
+    """
+
+    def _compressor(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return None
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in getattr(settings, 'COMPRESSION_CONTENT_TYPES', COMPRESSIBLE_TYPES):
+            return None
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return None
+        accepted = _accepted_encodings(request)
+        if brotli is not None and 'br' in accepted:
+            return _BrotliStream()
+        if 'gzip' in accepted:
+            return _GzipStream()
+        return None
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressor = self._compressor(request, response)
+        if compressor is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(compressor, response.streaming_content)
+            else:
+                response.streaming_content = self._compress_iter(compressor, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compressor.process(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Compressed bodies differ byte for byte from the uncompressed ones.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = compressor.encoding
+        return response
+
+    @staticmethod
+    def _compress_iter(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def _compress_async(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
@@ -0,0 +1,62 @@
+"""
+JSON rendering for large API payloads.
+
+``FastJSONRenderer`` is a drop-in JSONRenderer. When orjson is installed, it
+serializes dates, datetimes, UUIDs and NumPy arrays natively in C, and
+converts Decimals and GEOS geometries through ``default``. Without orjson,
+or when indented output is requested (e.g. by the browsable API), it falls
+back to DRF's encoder extended with the same geometry handling.
+"""
+from decimal import Decimal
+
+from django.contrib.gis.geos import GEOSGeometry
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def geometry_to_geojson(geometry):
+    if geometry.geom_type == 'GeometryCollection':
+        return {'type': 'GeometryCollection', 'geometries': [geometry_to_geojson(part) for part in geometry]}
+    return {'type': geometry.geom_type, 'coordinates': geometry.coords}
+
+
+class GeoJSONEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, GEOSGeometry):
+            return geometry_to_geojson(obj)
+        return super().default(obj)
+
+
+def _orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, GEOSGeometry):
+        return geometry_to_geojson(obj)
+    # Lazy translations, querysets, timedeltas and the like.
+    return GeoJSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = GeoJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Non-finite floats come out as null, where the stdlib would emit NaN.
+        return orjson.dumps(
+            data, default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+
+def render_json(data):
+    """Render ``data`` the way the API does, for views outside DRF."""
+    return FastJSONRenderer().render(data)
@@ -0,0 +1,58 @@
+"""
+Database routing between the primary and read replicas.
+
+Reads go to a randomly chosen ``replica*`` alias unless the current context
+is pinned to the primary: inside a transaction on the primary, while serving
+a write request, or for a short while after a client's last write
+(read-your-writes stickiness, see myproject.middleware.ReplicaRoutingMiddleware).
+Writes and migrations always target ``default``.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary(pinned=True):
+    _pinned_to_primary.set(pinned)
+
+
+@contextmanager
+def use_primary():
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def replica_safe(view_method):
+    """Mark a non-GET viewset action as read-only so it may use a replica."""
+    view_method.replica_safe = True
+    return view_method
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or _pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -75,10 +75,12 @@ MAPBOX_LOCATION_FIELD = {
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'myproject.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myproject.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -103,18 +105,52 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myproject.wsgi.application'
 
-# Database - Using SQLite for development
+# Database - Using SQLite for development. WAL journaling lets readers run
+# alongside a writer, busy timeouts make writers queue instead of failing with
+# "database is locked", and connections are kept open between requests.
+# SQLITE_OPTIONS only applies to the sqlite3 and spatialite backends. Under
+# ASGI, myproject.asgi defaults CONN_MAX_AGE to 0: each request runs its
+# queries on a different thread, so persistent connections would pile up.
+SQLITE_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA busy_timeout=20000;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=134217728;'
+    ),
+}
+
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='django.db.backends.sqlite3')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': DATABASE_ENGINE,
+        'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_OPTIONS if DATABASE_ENGINE.endswith(('.sqlite3', '.spatialite')) else {},
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=/data/replica1.sqlite3,/data/replica2.sqlite3
+# Safe (read-only) requests are routed to them by myproject.routers.ReplicaRouter.
+for _index, _name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'NAME': _name,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['myproject.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -122,10 +158,23 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'myproject.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
 }
 
+# Response compression (myproject.middleware.CompressionMiddleware): brotli when
+# the brotli package is installed and accepted, gzip otherwise. Only data
+# formats are compressed; never add text/html here, as compressed pages that
+# mix CSRF tokens with reflected input are open to BREACH.
+COMPRESSION_CONTENT_TYPES = ('application/json', 'application/geo+json', 'text/csv', 'application/octet-stream')
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -134,6 +183,21 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Per-process cache of users resolved from JWTs (see apps.users.authentication).
+# Hits are checked against a per-user stamp in CACHES, bumped on every User save.
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+
+# Token revocation store (see apps.users.revocation). Rotated refresh tokens
+# are always checked; access tokens only when REVOCATION_CHECK_ACCESS_TOKENS.
+# Expired rows are deleted by the prune_revoked_tokens beat task
+# (CELERY_BEAT_SCHEDULE below).
+REVOCATION_CHECK_ACCESS_TOKENS = config('REVOCATION_CHECK_ACCESS_TOKENS', default=False, cast=bool)
+REVOCATION_BLOOM_CAPACITY = 100000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+REVOCATION_SYNC_INTERVAL = 5
+REVOCATION_REBUILD_INTERVAL = 3600
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -152,4 +216,126 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache. Data versions and cached analyses are only shared between web and
+# worker processes with a shared backend (e.g. django.core.cache.backends.redis.RedisCache).
+# LocMemCache is per process. Cross-process coordination (data versions, user
+# stamps, alert rule versions, single-flight results) needs a shared backend
+# such as django.core.cache.backends.redis.RedisCache in production.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+COMPARATIVE_CACHE_TIMEOUT = 60 * 60
+SURFACE_CACHE_TIMEOUT = 60 * 60 * 24
+# Surface windows start on a SURFACE_TIME_BUCKET boundary, so cached rasters are at most this stale.
+SURFACE_TIME_BUCKET = 60 * 60
+
+# Single-flight sharing of identical in-flight computations (myproject.singleflight).
+# With SINGLEFLIGHT_ACROSS_PROCESSES, workers on one host also coordinate
+# through lock files and share results via the cache for SINGLEFLIGHT_RESULT_TTL.
+# That needs a shared CACHE_BACKEND (e.g. Redis); with the default LocMemCache
+# it is ignored and sharing stays within each process.
+SINGLEFLIGHT_ACROSS_PROCESSES = config('SINGLEFLIGHT_ACROSS_PROCESSES', default=False, cast=bool)
+SINGLEFLIGHT_LOCK_DIR = config('SINGLEFLIGHT_LOCK_DIR', default='')
+SINGLEFLIGHT_RESULT_TTL = 2
+SINGLEFLIGHT_TIMEOUT = 30
+
+# Generated report files are shared between identical requests and evicted
+# least recently used first beyond REPORT_CACHE_MAX_BYTES.
+REPORT_CACHE_MAX_BYTES = config('REPORT_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+REPORT_BUILD_TIMEOUT = 300
+
+# Trained risk model (apps.analytics.risk_model). Workers look for a newly
+# activated version at most every RISK_MODEL_CHECK_INTERVAL seconds; the
+# confidence is the chance the realized risk is within the tolerance.
+RISK_MODEL_CHECK_INTERVAL = 10
+RISK_CONFIDENCE_TOLERANCE = 0.1
+RISK_PREDICTION_BATCH_MAX = 1000
+
+# Celery
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'compact-environmental-data': {
+        'task': 'apps.monitoring.tasks.compact_environmental_data',
+        'schedule': 60 * 60,
+    },
+    'prune-revoked-tokens': {
+        'task': 'apps.users.tasks.prune_revoked_tokens',
+        'schedule': 60 * 60,
+    },
+    'deliver-notifications': {
+        'task': 'apps.notifications.tasks.deliver_notifications',
+        'schedule': 60,
+    },
+}
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+
+# Upload ingestion: rows are upserted INGEST_BATCH_SIZE at a time, and
+# coordinates are snapped to INGEST_COORD_PRECISION decimals (~0.1 m) so
+# re-uploaded readings match the stored ones.
+INGEST_BATCH_SIZE = config('INGEST_BATCH_SIZE', default=1000, cast=int)
+INGEST_COORD_PRECISION = 6
+
+# EnvironmentalData change feed (environmental-data/changes/?since=<cursor>).
+# Entries younger than CHANGE_FEED_SETTLE_SECONDS are held back so concurrent
+# commits cannot be skipped past.
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+CHANGE_FEED_SETTLE_SECONDS = 1
+
+# Resumable chunked uploads (DataUploadViewSet sessions/ actions): sessions
+# expire UPLOAD_SESSION_TTL seconds after their last chunk.
+UPLOAD_SESSION_TTL = 60 * 60 * 24
+UPLOAD_SESSION_MAX_SIZE = config('UPLOAD_SESSION_MAX_SIZE', default=20 * 1024 ** 3, cast=int)
+
+# Quality scoring keeps a running mean/variance per station over roughly the
+# last QUALITY_STATION_WINDOW readings in the cache.
+QUALITY_STATION_WINDOW = 500
+QUALITY_STATION_TTL = 60 * 60 * 24 * 30
+
+# Data retention per EnvironmentalData source: raw rows older than raw_days are
+# compacted into hourly aggregates, hourly aggregates older than hourly_days
+# into daily ones, and daily aggregates older than daily_days are dropped.
+# None keeps a tier forever; sources without a policy are never compacted.
+# compact_environmental_data runs from CELERY_BEAT_SCHEDULE. Region statistics
+# and the dashboard merge the aggregates; raw listings and within_polygon only
+# cover the raw window.
+DATA_RETENTION = {
+    'satellite': {'raw_days': 90, 'hourly_days': 365, 'daily_days': None},
+}
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=5000, cast=int)
+RETENTION_BATCH_PAUSE = config('RETENTION_BATCH_PAUSE', default=0.5, cast=float)
+
+# Notifications: alerts are coalesced per user into windows of
+# NOTIFICATION_COALESCE_MINUTES (or hourly/daily digests per
+# notification_preferences) and sent through NOTIFICATIONS_EMAIL_BACKEND.
+# Use django.core.mail.backends.filebased.EmailBackend with EMAIL_FILE_PATH,
+# or a local SMTP stand-in on EMAIL_HOST/EMAIL_PORT, for testing. Due messages
+# are sent by deliver_notifications every minute (CELERY_BEAT_SCHEDULE).
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='alerts@dmas.local')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
+NOTIFICATIONS_EMAIL_BACKEND = config('NOTIFICATIONS_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+NOTIFICATION_COALESCE_MINUTES = config('NOTIFICATION_COALESCE_MINUTES', default=15, cast=int)
+NOTIFICATION_MAX_ATTEMPTS = 5
+
+# Live reading feed (Server-Sent Events at /api/monitoring/stream/). Uploads
+# are ingested by Celery workers, so batches have to cross processes: the feed
+# uses apps.monitoring.streaming.RedisBroker whenever Celery runs against Redis.
+# LocalBroker only reaches subscribers when tasks run eagerly in the web process.
+LIVE_FEED_BROKER = config(
+    'LIVE_FEED_BROKER',
+    default='apps.monitoring.streaming.RedisBroker'
+    if CELERY_BROKER_URL.startswith(('redis://', 'rediss://')) and not CELERY_TASK_ALWAYS_EAGER
+    else 'apps.monitoring.streaming.LocalBroker',
+)
+LIVE_FEED_REDIS_URL = config('LIVE_FEED_REDIS_URL', default=CELERY_BROKER_URL)
+LIVE_FEED_QUEUE_SIZE = 1000
+LIVE_FEED_MAX_BATCH = 500
+LIVE_FEED_LINGER = 0.25
+LIVE_FEED_HEARTBEAT = 15
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Single-flight execution of expensive, idempotent computations.
+
+Callers that ask for the same key while a computation is running wait for
+it and share its result, so load grows with the number of distinct keys and
+not with the number of concurrent callers. Within a process this uses one
+``threading.Event`` per in-flight key.
+
+With ``across_processes`` (default: SINGLEFLIGHT_ACROSS_PROCESSES), workers
+also serialize on an ``fcntl`` lock file per key in SINGLEFLIGHT_LOCK_DIR.
+The first worker publishes its result in the cache for
+SINGLEFLIGHT_RESULT_TTL seconds, and workers that were queued on the lock
+pick it up from there. Results must then be picklable. This needs a cache
+shared by the workers: with a per-process backend such as the default
+LocMemCache, and on platforms without ``fcntl``, sharing falls back to
+in-process only rather than serializing workers that then recompute anyway.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from myproject.caching import cache_is_shared
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+CACHE_PREFIX = 'singleflight:'
+LOCK_POLL_INTERVAL = 0.05
+_MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout=None, across_processes=None):
+        """
+        Return ``func()``, sharing one execution among concurrent callers of
+        ``key``. Followers that wait longer than ``timeout`` seconds run
+        ``func`` themselves. Exceptions propagate to every waiting caller.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'SINGLEFLIGHT_TIMEOUT', 30)
+        if across_processes is None:
+            across_processes = getattr(settings, 'SINGLEFLIGHT_ACROSS_PROCESSES', False)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                return func()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if across_processes and fcntl is not None and cache_is_shared():
+                call.result = self._do_shared(key, func, timeout)
+            else:
+                call.result = func()
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _do_shared(self, key, func, timeout):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        result_key = CACHE_PREFIX + digest
+        result = cache.get(result_key, _MISSING)
+        if result is not _MISSING:
+            return result
+
+        with _file_lock(digest, timeout) as acquired:
+            if acquired:
+                # Whoever held the lock before us may have left the result.
+                result = cache.get(result_key, _MISSING)
+                if result is not _MISSING:
+                    return result
+            result = func()
+            cache.set(result_key, result, getattr(settings, 'SINGLEFLIGHT_RESULT_TTL', 2))
+            return result
+
+
+def _lock_dir():
+    path = getattr(settings, 'SINGLEFLIGHT_LOCK_DIR', None) or os.path.join(tempfile.gettempdir(), 'singleflight')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _file_lock(digest, timeout):
+    """Hold an exclusive lock on the key's lock file; yields False on timeout."""
+    fd = os.open(os.path.join(_lock_dir(), f'{digest}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+        yield acquired
+    finally:
+        if acquired:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+group = SingleFlight()
+
+
+def singleflight(key, func, timeout=None, across_processes=None):
+    """Run ``func`` through the process-wide SingleFlight group."""
+    return group.do(key, func, timeout=timeout, across_processes=across_processes)
@@ -0,0 +1,116 @@
+import asyncio
+import gzip
+import json
+import math
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .middleware import CompressionMiddleware, _accepted_encodings
+from .renderers import FastJSONRenderer, orjson
+
+PAYLOAD = {'results': [{'id': i, 'region': 'Nairobi'} for i in range(200)]}
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = CompressionMiddleware(lambda request: None)
+        patch = mock.patch('myproject.middleware.brotli', None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def process(self, response, accept='gzip'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept)
+        return self.middleware.process_response(request, response)
+
+    def test_accept_encoding_parsing(self):
+        def accepted(header):
+            return _accepted_encodings(self.factory.get('/', HTTP_ACCEPT_ENCODING=header))
+
+        self.assertEqual(accepted('gzip, deflate, br'), {'gzip', 'deflate', 'br'})
+        self.assertEqual(accepted('GZIP;q=0.5, br;q=0'), {'gzip'})
+        self.assertEqual(accepted('gzip;q=0.0, identity'), {'identity'})
+        self.assertEqual(accepted('gzip;q=high'), set())
+
+    def test_large_json_is_gzipped(self):
+        response = self.process(JsonResponse(PAYLOAD))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), PAYLOAD)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_refused_encoding_and_small_bodies_are_left_alone(self):
+        self.assertFalse(self.process(JsonResponse(PAYLOAD), accept='gzip;q=0').has_header('Content-Encoding'))
+        self.assertFalse(self.process(JsonResponse({'id': 1})).has_header('Content-Encoding'))
+
+    def test_html_is_never_compressed(self):
+        response = self.process(HttpResponse('<p>token</p>' * 500, content_type='text/html'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_server_sent_events_stream_unbuffered(self):
+        response = StreamingHttpResponse(iter([b'data: 1\n\n']), content_type='text/event-stream')
+        response = self.process(response)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), b'data: 1\n\n')
+
+    def test_streaming_json_is_compressed_per_chunk(self):
+        chunks = [json.dumps(PAYLOAD).encode()] * 3
+        response = self.process(StreamingHttpResponse(iter(chunks), content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+    def test_async_streaming_is_compressed(self):
+        async def chunks():
+            yield b'{"results": ['
+            yield b'1, 2, 3]}'
+
+        response = self.process(StreamingHttpResponse(chunks(), content_type='application/json'))
+
+        async def collect():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(gzip.decompress(asyncio.run(collect())), b'{"results": [1, 2, 3]}')
+
+    def test_strong_etag_is_weakened(self):
+        response = JsonResponse(PAYLOAD)
+        response['ETag'] = '"abc"'
+        self.assertEqual(self.process(response)['ETag'], 'W/"abc"')
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def render(self, data, **context):
+        return json.loads(FastJSONRenderer().render(data, 'application/json', context))
+
+    def test_native_types(self):
+        data = {
+            'when': datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc),
+            'amount': Decimal('1.50'),
+            'location': Point(36.8, -1.3, srid=4326),
+            'series': np.array([0.5, 1.5]),
+        }
+        rendered = self.render(data)
+        self.assertTrue(rendered['when'].startswith('2024-01-01T12:00:00'))
+        self.assertEqual(float(rendered['amount']), 1.5)
+        self.assertEqual(rendered['location'], {'type': 'Point', 'coordinates': [36.8, -1.3]})
+        self.assertEqual(rendered['series'], [0.5, 1.5])
+
+    def test_non_finite_floats_become_null(self):
+        if orjson is None:
+            self.skipTest('orjson is not installed')
+        self.assertEqual(self.render({'value': math.nan}), {'value': None})
+
+    def test_indented_output_uses_the_fallback_encoder(self):
+        content = FastJSONRenderer().render({'location': Point(1.0, 2.0)}, 'application/json; indent=2', {})
+        self.assertIn(b'\n  ', content)
+        self.assertEqual(json.loads(content)['location']['coordinates'], [1.0, 2.0])
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
@@ -24,6 +24,7 @@ urlpatterns = [
     path('api/auth/', include('apps.users.urls')),
     path('api/monitoring/', include('apps.monitoring.urls')),
     path('api/analytics/', include('apps.analytics.urls')),
+    path('api/notifications/', include('apps.notifications.urls')),
     
     # Documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),